@@ -39,10 +39,12 @@ if os.name == 'nt':
     win32api.SetErrorMode(win32con.SEM_FAILCRITICALERRORS |
                           win32con.SEM_NOGPFAULTERRORBOX | win32con.SEM_NOOPENFILEERRORBOX)
 
-if 1 == len(sys.argv):
-    import bleachbit.GUI
-    app = bleachbit.GUI.Bleachbit()
-    sys.exit(app.run(sys.argv))
-else:
-    import bleachbit.CLI
-    bleachbit.CLI.process_cmd_line()
+if __name__ == '__main__':
+    # Worker processes may import this module, and they must not run it.
+    if 1 == len(sys.argv):
+        import bleachbit.GUI
+        app = bleachbit.GUI.Bleachbit()
+        sys.exit(app.run(sys.argv))
+    else:
+        import bleachbit.CLI
+        bleachbit.CLI.process_cmd_line()
@@ -23,8 +23,10 @@
 Actions that perform cleaning
 """
 
+import bleachbit
 from bleachbit import Command, FileUtilities, General, Special, DeepScan
-from bleachbit import _, fs_scan_re_flags
+from bleachbit import _
+from bleachbit.FileUtilities import FileRecord
 
 import glob
 import logging
@@ -37,6 +39,17 @@ if 'posix' == os.name:
 logger = logging.getLogger(__name__)
 
 
+def action_attributes(action_node):
+    """Return the attributes of an <action> as a mapping
+
+    Providers accept either a DOM element or a mapping of attribute
+    names to values, such as a dict or ElementTree attributes.
+    """
+    if hasattr(action_node, 'getAttribute'):
+        return dict(action_node.attributes.items())
+    return action_node
+
+
 def has_glob(s):
     """Checks whether the string contains any glob characters"""
     return re.search('[?*\[\]]', s) is not None
@@ -61,9 +74,9 @@ def expand_multi_var(s, variables):
     if not var_keys_used:
         # No matching variables used, so return input string unmodified.
         return (s,)
-    # filter the dictionary to the keys used
-    vars_used = {key: value for key,
-                 value in variables.items() if key in var_keys_used}
+    # filter the dictionary to the keys used, so a lazy mapping
+    # expands only these
+    vars_used = {key: variables[key] for key in var_keys_used}
     # create a product of combinations
     from itertools import product
     vars_product = (dict(zip(vars_used, x))
@@ -102,17 +115,40 @@ class ActionProvider(metaclass=PluginMount):
     """Abstract base class for performing individual cleaning actions"""
 
     def __init__(self, action_node, path_vars=None):
-        """Create ActionProvider from CleanerML <action>"""
+        """Create ActionProvider from CleanerML <action>
+
+        action_node is the DOM element or a mapping of its attributes.
+        """
         pass
 
     def get_deep_scan(self):
         """Return a dictionary used to construct a deep scan"""
         raise StopIteration
 
+    def get_walks(self):
+        """Yield a (search, path) key for each walk that get_commands()
+        takes from FileUtilities.scan_cache"""
+        return ()
+
     def get_commands(self):
         """Yield each command (which can be previewed or executed)"""
         pass
 
+    def probe(self):
+        """Return whether get_commands() may have anything to do
+
+        It stops at the first result. Cleaner.auto_hide() uses it to
+        hide cleaners with nothing to clean."""
+        for cmd in self.get_commands():
+            for dummy in cmd.execute(False):
+                return True
+        return False
+
+    def probe_roots(self):
+        """Return the paths whose modification times decide probe(),
+        or None if its result cannot be kept"""
+        return None
+
 
 #
 # base class
@@ -121,58 +157,111 @@ class FileActionProvider(ActionProvider):
 
     """Base class for providers which work on individual files"""
     action_key = '_file'
-    CACHEABLE_SEARCHERS = ('walk.files',)
-    # global cache <search_type, path, list_of_entries>
-    cache = ('nothing', '', tuple())
+    # searches to keep in FileUtilities.scan_cache
+    CACHEABLE_SEARCHERS = ('glob', 'walk.all', 'walk.files', 'walk.top')
+    # searches which Worker may walk ahead of time
+    PLANNABLE_SEARCHERS = ('walk.all', 'walk.files', 'walk.top')
 
     def __init__(self, action_element, path_vars=None):
         """Initialize file search"""
         ActionProvider.__init__(self, action_element, path_vars)
-        self.regex = action_element.getAttribute('regex')
+        attrs = action_attributes(action_element)
+        self.regex = attrs.get('regex', '')
         assert(isinstance(self.regex, (str, type(None))))
-        self.nregex = action_element.getAttribute('nregex')
+        self.nregex = attrs.get('nregex', '')
         assert(isinstance(self.nregex, (str, type(None))))
-        self.wholeregex = action_element.getAttribute('wholeregex')
+        self.wholeregex = attrs.get('wholeregex', '')
         assert(isinstance(self.wholeregex, (str, type(None))))
-        self.nwholeregex = action_element.getAttribute('nwholeregex')
+        self.nwholeregex = attrs.get('nwholeregex', '')
         assert(isinstance(self.nwholeregex, (str, type(None))))
-        self.search = action_element.getAttribute('search')
-        self.object_type = action_element.getAttribute('type')
-        self._set_paths(action_element.getAttribute('path'), path_vars)
+        # subdirectories with matching names are not walked
+        if 'deep' == attrs.get('search', '') and 'prune' not in attrs:
+            self.prune = bleachbit.deep_scan_prune
+        else:
+            self.prune = attrs.get('prune', '')
+        assert(isinstance(self.prune, (str, type(None))))
+        self.search = attrs.get('search', '')
+        self.object_type = attrs.get('type', '')
+        # $$foo$$ variables are expanded when the paths are first needed
+        self.raw_path = attrs.get('path', '')
+        self.path_vars = path_vars
         self.ds = None
         if 'deep' == self.search:
-            self.ds = (self.paths[0], DeepScan.Search(
-                command=action_element.getAttribute('command'),
+            self.ds = DeepScan.Search(
+                command=attrs.get('command', ''),
                 regex=self.regex, nregex=self.nregex,
-                wholeregex=self.wholeregex, nwholeregex=self.nwholeregex))
-            if not len(self.paths) == 1:
-                logger.warning(
-                    # TRANSLATORS: Multi-value variables are explained in the online documentation.
-                    # Basically, they are like an environment variable, but each multi-value variable
-                    # can have multiple values. They're a way to make CleanerML files more concise.
-                    _("Deep scan does not support multi-value variable."))
+                wholeregex=self.wholeregex, nwholeregex=self.nwholeregex,
+                prune=self.prune)
         if not any([self.object_type, self.regex, self.nregex,
                     self.wholeregex, self.nwholeregex]):
             # If the filter is not needed, bypass it for speed.
             self.get_paths = self._get_paths
 
-    def _set_paths(self, raw_path, path_vars):
-        """Set the list of paths to work on"""
-        self.paths = []
+    def expand_paths(self):
+        """Return the list of paths to work on"""
+        paths = []
         # expand special $$foo$$ which may give multiple values
-        for path2 in expand_multi_var(raw_path, path_vars):
+        for path2 in expand_multi_var(self.raw_path, self.path_vars):
             path3 = os.path.expanduser(os.path.expandvars(path2))
             if os.name == 'nt' and path3:
                 # convert forward slash to backslash for compatibility with getsize()
                 # and for display.  Do not convert an empty path, or it will become
                 # the current directory (.).
                 path3 = os.path.normpath(path3)
-            self.paths.append(path3)
+            paths.append(path3)
+        return paths
 
     def get_deep_scan(self):
         if self.ds is None:
             return
-        yield self.ds
+        paths = self.expand_paths()
+        if not len(paths) == 1:
+            logger.warning(
+                # TRANSLATORS: Multi-value variables are explained in the online documentation.
+                # Basically, they are like an environment variable, but each multi-value variable
+                # can have multiple values. They're a way to make CleanerML files more concise.
+                _("Deep scan does not support multi-value variable."))
+        yield (paths[0], self.ds)
+
+    def get_walks(self):
+        """Yield a (search, path) key for each walk that get_paths()
+        takes from FileUtilities.scan_cache
+
+        Worker walks these ahead of time together with the deep scans,
+        so a tree is read once for all of them."""
+        if self.search in self.PLANNABLE_SEARCHERS and not self.prune:
+            for input_path in self.expand_paths():
+                yield (self.search, input_path)
+
+    def probe(self):
+        """Return whether any path matches, without computing sizes"""
+        if self.ds is not None:
+            return True
+        paths = self.get_paths()
+        try:
+            for dummy in paths:
+                return True
+        finally:
+            paths.close()
+        return False
+
+    def probe_roots(self):
+        """Return the directories whose modification times change when
+        a matching path appears or disappears at the top
+
+        Files added deep inside a walked tree do not change the time of
+        its root, so a kept verdict may be stale until the root changes."""
+        if self.ds is not None:
+            return []
+        roots = []
+        for input_path in self.expand_paths():
+            if has_glob(input_path):
+                roots.append(FileUtilities.ScanCache.root(input_path))
+            elif 'file' == self.search:
+                roots.append(os.path.dirname(input_path))
+            else:
+                roots.append(input_path)
+        return roots
 
     def get_paths(self):
         """Process the filters: regex, nregex, type
@@ -186,25 +275,27 @@ class FileActionProvider(ActionProvider):
         wholeregex = self.wholeregex
         nwholeregex = self.nwholeregex
         basename = os.path.basename
+        isfile = os.path.isfile
+        isdir = os.path.isdir
         object_type = self.object_type
+        compile_regex = FileUtilities.compile_regex
         if self.regex:
-            regex_c_search = re.compile(self.regex, fs_scan_re_flags).search
+            regex_c_search = compile_regex(self.regex).search
         else:
             regex_c_search = None
 
         if self.nregex:
-            nregex_c_search = re.compile(self.nregex, fs_scan_re_flags).search
+            nregex_c_search = compile_regex(self.nregex).search
         else:
             nregex_c_search = None
 
         if self.wholeregex:
-            wholeregex_c_search = re.compile(self.wholeregex, fs_scan_re_flags).search
+            wholeregex_c_search = compile_regex(self.wholeregex).search
         else:
             wholeregex_c_search = None
 
         if self.nwholeregex:
-            nwholeregex_c_search = re.compile(
-                self.nwholeregex, fs_scan_re_flags).search
+            nwholeregex_c_search = compile_regex(self.nwholeregex).search
         else:
             nwholeregex_c_search = None
 
@@ -222,9 +313,13 @@ class FileActionProvider(ActionProvider):
                 continue
 
             if object_type:
-                if 'f' == object_type and not os.path.isfile(path):
+                # A FileRecord from a walk already knows its type.
+                is_record = isinstance(path, FileRecord)
+                if 'f' == object_type and not \
+                        (path.is_file() if is_record else isfile(path)):
                     continue
-                elif 'd' == object_type and not os.path.isdir(path):
+                elif 'd' == object_type and not \
+                        (path.is_dir() if is_record else isdir(path)):
                     continue
 
             yield path
@@ -232,15 +327,28 @@ class FileActionProvider(ActionProvider):
     def _get_paths(self):
         """Return a filtered list of files"""
 
+        scan_cache = FileUtilities.scan_cache
+        if scan_cache is None:
+            lexists = os.path.lexists
+            iglob = glob.iglob
+        else:
+            # Answer from one listing per directory for all providers.
+            lexists = scan_cache.lexists
+            iglob = scan_cache.iglob
+        prune = None
+        if self.prune:
+            prune = FileUtilities.compile_regex(self.prune).search
+
         def get_file(path):
-            if os.path.lexists(path):
+            if lexists(path):
                 yield path
 
         def get_walk_all(top):
             """Delete files and directories inside a directory but not the top directory"""
-            for expanded in glob.iglob(top):
+            for expanded in iglob(top):
                 path = None  # sentinel value
-                for path in FileUtilities.children_in_directory(expanded, True):
+                for path in FileUtilities.children_in_directory(
+                        expanded, True, bleachbit.walk_workers, prune):
                     yield path
                 # This condition executes when there are zero iterations
                 # in the loop above.
@@ -258,8 +366,9 @@ class FileActionProvider(ActionProvider):
 
         def get_walk_files(top):
             """Delete files inside a directory but not any directories"""
-            for expanded in glob.iglob(top):
-                for path in FileUtilities.children_in_directory(expanded, False):
+            for expanded in iglob(top):
+                for path in FileUtilities.children_in_directory(
+                        expanded, False, bleachbit.walk_workers, prune):
                     yield path
 
         def get_top(top):
@@ -274,7 +383,7 @@ class FileActionProvider(ActionProvider):
         elif 'file' == self.search:
             func = get_file
         elif 'glob' == self.search:
-            func = glob.iglob
+            func = iglob
         elif 'walk.all' == self.search:
             func = get_walk_all
         elif 'walk.files' == self.search:
@@ -284,8 +393,7 @@ class FileActionProvider(ActionProvider):
         else:
             raise RuntimeError("invalid search='%s'" % self.search)
 
-        cache = self.__class__.cache
-        for input_path in self.paths:
+        for input_path in self.expand_paths():
             if self.search == 'glob' and not has_glob(input_path):
                 # TRANSLATORS: This is a lint-style warning that the CleanerML file
                 # specified a search for glob, but the path specified didn't have any
@@ -294,25 +402,12 @@ class FileActionProvider(ActionProvider):
                 # expect or support wildcards in the path.
                 logger.debug(_('path="%s" is not a glob pattern'), input_path)
 
-            # use cache
-            if self.search in self.CACHEABLE_SEARCHERS and cache[0] == self.search and cache[1] == input_path:
-                #logger.debug(_('using cached walk for path %s'), input_path)
-                for x in cache[2]:
-                    yield x
-                return
-            else:
-                # if self.search in self.CACHEABLE_SEARCHERS:
-                #    logger.debug('not using cache because it has (%s,%s) and we want (%s,%s)',
-                #                 cache[0], cache[1], self.search, input_path)
-                self.__class__.cache = ('cleared by', input_path, tuple())
-
-            # build new cache
-            #logger.debug('%s walking %s', id(self), input_path)
-
-            if self.search in self.CACHEABLE_SEARCHERS:
-                cache = self.__class__.cache = (self.search, input_path, [])
-                for path in func(input_path):
-                    cache[2].append(path)
+            if scan_cache is not None and self.search in self.CACHEABLE_SEARCHERS:
+                # Other providers may walk the same path in this run.
+                key = (self.search, input_path)
+                if self.prune:
+                    key += (self.prune,)
+                for path in scan_cache.cached(key, func):
                     yield path
             else:
                 for path in func(input_path):
@@ -445,7 +540,32 @@ class Delete(FileActionProvider):
     """Action to delete files"""
     action_key = 'delete'
 
+    def deletes_trees(self):
+        """Return whether whole trees are deleted without get_paths()"""
+        return self.search in ('walk.all', 'walk.top') and \
+            FileUtilities.delete_tree_supported and not any(
+                [self.object_type, self.regex, self.nregex,
+                 self.wholeregex, self.nwholeregex, self.prune])
+
+    def get_walks(self):
+        if self.deletes_trees():
+            return
+        for key in FileActionProvider.get_walks(self):
+            yield key
+
     def get_commands(self):
+        if self.deletes_trees():
+            # Delete whole trees relative to directory file descriptors.
+            include_top = 'walk.top' == self.search
+            scan_cache = FileUtilities.scan_cache
+            iglob = glob.iglob if scan_cache is None else scan_cache.iglob
+            for input_path in self.expand_paths():
+                for expanded in iglob(input_path):
+                    if os.path.isdir(expanded):
+                        yield Command.DeleteTree(expanded, include_top)
+                    elif include_top:
+                        yield Command.Delete(expanded)
+            return
         for path in self.get_paths():
             yield Command.Delete(path)
 
@@ -457,8 +577,9 @@ class Ini(FileActionProvider):
 
     def __init__(self, action_element, path_vars=None):
         FileActionProvider.__init__(self, action_element, path_vars)
-        self.section = action_element.getAttribute('section')
-        self.parameter = action_element.getAttribute('parameter')
+        attrs = action_attributes(action_element)
+        self.section = attrs.get('section', '')
+        self.parameter = attrs.get('parameter', '')
         if self.parameter == "":
             self.parameter = None
 
@@ -486,7 +607,8 @@ class Json(FileActionProvider):
 
     def __init__(self, action_element, path_vars=None):
         FileActionProvider.__init__(self, action_element, path_vars)
-        self.address = action_element.getAttribute('address')
+        attrs = action_attributes(action_element)
+        self.address = attrs.get('address', '')
 
     def get_commands(self):
         for path in self.get_paths():
@@ -525,10 +647,11 @@ class Process(ActionProvider):
 
     def __init__(self, action_element, path_vars=None):
         ActionProvider.__init__(self, action_element, path_vars)
-        self.cmd = os.path.expandvars(action_element.getAttribute('cmd'))
+        attrs = action_attributes(action_element)
+        self.cmd = os.path.expandvars(attrs.get('cmd', ''))
         # by default, wait
         self.wait = True
-        wait = action_element.getAttribute('wait')
+        wait = attrs.get('wait', '')
         if wait and wait.lower()[0] in ('f', 'n'):
             # false or no
             self.wait = False
@@ -612,8 +735,9 @@ class Winreg(ActionProvider):
 
     def __init__(self, action_element, path_vars=None):
         ActionProvider.__init__(self, action_element, path_vars)
-        self.keyname = action_element.getAttribute('path')
-        self.name = action_element.getAttribute('name')
+        attrs = action_attributes(action_element)
+        self.keyname = attrs.get('path', '')
+        self.name = attrs.get('name', '')
 
     def get_commands(self):
         yield Command.Winreg(self.keyname, self.name)
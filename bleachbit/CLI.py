@@ -22,7 +22,7 @@
 Command line interface
 """
 
-from bleachbit.Cleaner import backends, create_simple_cleaner, register_cleaners
+from bleachbit.Cleaner import backends, cleaner_index, create_simple_cleaner, register_cleaners
 from bleachbit import _, APP_VERSION
 from bleachbit import Diagnostic, Options, Worker
 
@@ -60,10 +60,9 @@ class CliCallback:
 
 def cleaners_list():
     """Yield each cleaner-option pair"""
-    list(register_cleaners())
-    for key in sorted(backends):
-        c_id = backends[key].get_id()
-        for (o_id, o_name) in backends[key].get_options():
+    index = cleaner_index()
+    for c_id in sorted(index):
+        for o_id in index[c_id]:
             yield "%s.%s" % (c_id, o_id)
 
 
@@ -82,16 +81,19 @@ def preview_or_clean(operations, really_clean):
 
 
 def args_to_operations(args, preset):
-    """Read arguments and return list of operations"""
-    list(register_cleaners())
+    """Read arguments and return list of operations
+
+    Only the cleaners named in the arguments are registered."""
     operations = {}
     if preset:
         # restore presets from the GUI
-        for key in sorted(backends):
-            c_id = backends[key].get_id()
-            for (o_id, o_name) in backends[key].get_options():
+        index = cleaner_index()
+        for c_id in sorted(index):
+            for o_id in index[c_id]:
                 if Options.options.get_tree(c_id, o_id):
                     args.append('.'.join([c_id, o_id]))
+    cleaner_ids = set(arg.split('.')[0] for arg in args)
+    list(register_cleaners(cleaner_ids=cleaner_ids))
     for arg in args:
         if 2 != len(arg.split('.')):
             logger.warning(_("not a valid cleaner: %s"), arg)
@@ -26,7 +26,10 @@ import logging
 import os.path
 import re
 import sys
+import time
+import weakref
 
+import bleachbit
 from bleachbit import _
 from bleachbit.FileUtilities import children_in_directory
 from bleachbit.Options import options
@@ -56,6 +59,137 @@ elif 'nt' == os.name:
 backends = {}
 
 
+# Cleaner -> (modification times of the probed roots, verdict) of
+# Cleaner.auto_hide(). A cleaner built again for changed actions has
+# no verdict, even with the same ID.
+auto_hide_verdicts = weakref.WeakKeyDictionary()
+
+
+def root_mtimes(roots):
+    """Return a tuple of (path, modification time) for the paths
+
+    The time is None for a path that does not exist."""
+    ret = []
+    for root in roots:
+        try:
+            mtime = os.stat(root).st_mtime_ns
+        except OSError:
+            mtime = None
+        ret.append((root, mtime))
+    return tuple(ret)
+
+
+class AutoHideProbes:
+
+    """Run auto_hide() of cleaners in background threads
+
+    The threads are daemons, so a probe in the middle of a long walk
+    does not delay quitting, and cancel() stops the probes that have
+    not started."""
+
+    def __init__(self, cleaners, cb_hide, workers=None):
+        import collections
+        import threading
+        self.cb_hide = cb_hide
+        self.cleaners = collections.deque(cleaners)
+        self.cancelled = threading.Event()
+        workers = min(workers or bleachbit.probe_workers, len(self.cleaners))
+        self.threads = [threading.Thread(target=self.run, daemon=True)
+                        for dummy in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def run(self):
+        """Probe cleaners until none are left or the probes are cancelled"""
+        while not self.cancelled.is_set():
+            try:
+                cleaner = self.cleaners.popleft()
+            except IndexError:
+                return
+            if cleaner.auto_hide() and not self.cancelled.is_set():
+                self.cb_hide(cleaner)
+
+    def cancel(self):
+        """Stop probing after the probes in progress"""
+        self.cancelled.set()
+
+    def join(self):
+        """Wait for the threads to finish"""
+        for thread in self.threads:
+            thread.join()
+
+
+def auto_hide_async(cleaners, cb_hide, workers=None):
+    """Run auto_hide() of the cleaners in background threads
+
+    cb_hide(cleaner) is called from a background thread for each
+    cleaner to hide. Returns the AutoHideProbes, so the caller can
+    cancel the probes that have not started."""
+    return AutoHideProbes(cleaners, cb_hide, workers)
+
+
+class ProcessSnapshot:
+
+    """Running processes captured once and shared by all cleaners
+
+    Worker captures a new snapshot at the start of each run, so checking
+    whether dozens of cleaners are running reads the process table once.
+    A snapshot older than max_age seconds is captured again on the next
+    query, even during a long run."""
+
+    max_age = 10
+
+    def __init__(self):
+        self.scan_time = None
+        # process ID -> executable name
+        self.pids = {}
+        self.exenames = set()
+        # pathname pattern -> boolean whether a matching file exists
+        self.pathnames = {}
+
+    def refresh(self):
+        """Capture the running processes again"""
+        self.scan_time = time.time()
+        if 'nt' == os.name:
+            self.pids = Windows.running_processes()
+        else:
+            self.pids = Unix.running_processes()
+        self.exenames = set(self.pids.values())
+        self.pathnames = {}
+
+    def check_age(self):
+        """Refresh the snapshot if it is missing or too old"""
+        if self.scan_time is None or \
+                (time.time() - self.scan_time) > self.max_age:
+            self.refresh()
+
+    def exe_running(self, exename):
+        """Return boolean whether a process named exename is running"""
+        self.check_age()
+        if 'nt' == os.name:
+            exename = exename.lower()
+        return exename in self.exenames
+
+    def pathname_exists(self, pathname):
+        """Return the first existing file that matches the pattern
+
+        A pathname such as a lock file indicates the program is running.
+        The result is kept until the next refresh."""
+        self.check_age()
+        if pathname not in self.pathnames:
+            found = None
+            expanded = os.path.expanduser(os.path.expandvars(pathname))
+            for globbed in glob.iglob(expanded):
+                if os.path.exists(globbed):
+                    found = globbed
+                    break
+            self.pathnames[pathname] = found
+        return self.pathnames[pathname]
+
+
+processes = ProcessSnapshot()
+
+
 class Cleaner:
 
     """Base class for a cleaner"""
@@ -68,7 +202,6 @@ class Cleaner:
         self.options = {}
         self.running = []
         self.warnings = {}
-        self.regexes_compiled = []
 
     def add_action(self, option_id, action):
         """Register 'action' (instance of class Action) to be executed
@@ -86,19 +219,75 @@ class Cleaner:
 
     def auto_hide(self):
         """Return boolean whether it is OK to automatically hide this
-        cleaner"""
+        cleaner
+
+        The verdict is kept in auto_hide_verdicts while the
+        modification times of the probed roots stay the same."""
+        roots = self.probe_roots()
+        key = None if roots is None else root_mtimes(roots)
+        if key is not None:
+            cached = auto_hide_verdicts.get(self)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+        verdict = True
         for (option_id, __name) in self.get_options():
             try:
-                for cmd in self.get_commands(option_id):
-                    for dummy in cmd.execute(False):
-                        return False
-                for ds in self.get_deep_scan(option_id):
-                    return False
+                if self.probe(option_id):
+                    verdict = False
+                    break
             except Exception:
                 logger = logging.getLogger(__name__)
                 logger.exception('exception in auto_hide(), cleaner=%s, option=%s',
                                  self.name, option_id)
-        return True
+        if key is not None:
+            auto_hide_verdicts[self] = (key, verdict)
+        return verdict
+
+    def cached_auto_hide(self):
+        """Return the verdict of auto_hide() if it is still valid,
+        or None"""
+        cached = auto_hide_verdicts.get(self)
+        if cached is None:
+            return None
+        roots = self.probe_roots()
+        if roots is None or cached[0] != root_mtimes(roots):
+            return None
+        return cached[1]
+
+    def probe(self, option_id):
+        """Return whether the option may have something to clean
+
+        Each action stops at its first match and does not compute
+        sizes."""
+        for (action_option_id, provider) in self.actions:
+            if option_id == action_option_id and provider.probe():
+                return True
+        return False
+
+    def probe_commands(self, option_id):
+        """Return whether previewing the option yields anything
+
+        This is for cleaners that do not work through actions. It
+        previews the commands, so it is slower than probe()."""
+        for cmd in self.get_commands(option_id):
+            for dummy in cmd.execute(False):
+                return True
+        for ds in self.get_deep_scan(option_id):
+            return True
+        return False
+
+    def probe_roots(self):
+        """Return the paths whose modification times decide probe(),
+        or None if the verdict cannot be kept"""
+        roots = []
+        for (option_id, provider) in self.actions:
+            if option_id not in self.options:
+                continue
+            provider_roots = provider.probe_roots()
+            if provider_roots is None:
+                return None
+            roots.extend(provider_roots)
+        return roots
 
     def get_commands(self, option_id):
         """Get list of Command instances for option 'option_id'"""
@@ -121,6 +310,13 @@ class Cleaner:
         if option_id not in self.options:
             raise RuntimeError("Unknown option '%s'" % option_id)
 
+    def get_walks(self, option_id):
+        """Get the (search, path) keys of the walks for option 'option_id'"""
+        for action in self.actions:
+            if option_id == action[0]:
+                for key in action[1].get_walks():
+                    yield key
+
     def get_description(self):
         """Brief description of the cleaner"""
         return self.description
@@ -158,21 +354,16 @@ class Cleaner:
         for running in self.running:
             test = running[0]
             pathname = running[1]
-            if 'exe' == test and 'posix' == os.name:
-                if Unix.is_running(pathname):
-                    logger.debug("process '%s' is running", pathname)
-                    return True
-            elif 'exe' == test and 'nt' == os.name:
-                if Windows.is_process_running(pathname):
+            if 'exe' == test:
+                if processes.exe_running(pathname):
                     logger.debug("process '%s' is running", pathname)
                     return True
             elif 'pathname' == test:
-                expanded = os.path.expanduser(os.path.expandvars(pathname))
-                for globbed in glob.iglob(expanded):
-                    if os.path.exists(globbed):
-                        logger.debug(
-                            "file '%s' exists indicating '%s' is running", globbed, self.name)
-                        return True
+                globbed = processes.pathname_exists(pathname)
+                if globbed:
+                    logger.debug(
+                        "file '%s' exists indicating '%s' is running", globbed, self.name)
+                    return True
             else:
                 raise RuntimeError(
                     "Unknown running-detection test '%s'" % test)
@@ -210,6 +401,12 @@ class OpenOfficeOrg(Cleaner):
             self.prefixes = [
                 "$APPDATA\\OpenOffice.org\\3", "$APPDATA\\OpenOffice.org2"]
 
+    def probe(self, option_id):
+        return self.probe_commands(option_id)
+
+    def probe_roots(self):
+        return None
+
     def get_commands(self, option_id):
         # paths for which to run expand_glob_join
         egj = []
@@ -349,6 +546,13 @@ class System(Cleaner):
         self.description = _("The system in general")
         self.id = 'system'
         self.name = _("System")
+        self.whitelist_matcher = None
+
+    def probe(self, option_id):
+        return self.probe_commands(option_id)
+
+    def probe_roots(self):
+        return None
 
     def get_commands(self, option_id):
         # cache
@@ -494,11 +698,12 @@ class System(Cleaner):
             dirnames = ['/tmp', '/var/tmp']
             for dirname in dirnames:
                 for path in children_in_directory(dirname, True):
-                    is_open = FileUtilities.openfiles.is_open(path)
-                    ok = not is_open and os.path.isfile(path) and \
-                        not os.path.islink(path) and \
+                    # The FileRecord from the walk already knows the type,
+                    # so check it before the more expensive tests.
+                    ok = path.is_file() and not path.is_symlink() and \
                         FileUtilities.ego_owner(path) and \
-                        not self.whitelisted(path)
+                        not self.whitelisted(path) and \
+                        not FileUtilities.openfiles.is_open(path)
                     if ok:
                         yield Command.Delete(path)
 
@@ -623,7 +828,10 @@ class System(Cleaner):
                 yield wu
 
     def init_whitelist(self):
-        """Initialize the whitelist only once for performance"""
+        """Initialize the whitelist only once for performance
+
+        The regular expressions are combined into one PathMatcher, so
+        each path is matched once instead of once per expression."""
         regexes = [
             '^/tmp/.X0-lock$',
             '^/tmp/.truecrypt_aux_mnt.*/(control|volume)$',
@@ -654,42 +862,73 @@ class System(Cleaner):
             # Linux Bluetooth daemon obexd directory is typically empty, so be careful
             # not to delete the empty directory.
             '^' + os.path.expanduser('~/.cache/obexd($|/)')]
-        for regex in regexes:
-            self.regexes_compiled.append(re.compile(regex))
+        self.whitelist_matcher = FileUtilities.PathMatcher(regexes=regexes)
 
     def whitelisted(self, pathname):
         """Return boolean whether file is whitelisted"""
         if os.name == 'nt':
             # Whitelist is specific to POSIX
             return False
-        if not self.regexes_compiled:
+        if self.whitelist_matcher is None:
             self.init_whitelist()
-        for regex in self.regexes_compiled:
-            if regex.match(pathname) is not None:
-                return True
-        return False
+        return self.whitelist_matcher.match(pathname)
+
+
+# "hard coded" (non-CleanerML) cleaners by ID
+builtin_cleaners = (('openofficeorg', OpenOfficeOrg),
+                    ('system', System))
+
 
+def cleaner_index():
+    """Return {cleaner ID: sorted option IDs} of all known cleaners
 
-def register_cleaners(cb_progress=lambda x: None, cb_done=lambda: None):
-    """Register all known cleaners: system, CleanerML, and Winapp2"""
+    CleanerML cleaners are listed from their parsed definitions, so
+    none of their actions are created."""
+    ret = {}
+    for (cleaner_id, cleaner_class) in builtin_cleaners:
+        ret[cleaner_id] = [option_id for (option_id, __name)
+                           in cleaner_class().get_options()]
+    from bleachbit import CleanerML
+    ret.update(CleanerML.cleaner_index())
+    if 'nt' == os.name:
+        from bleachbit import Winapp
+        ret.update(Winapp.cleaner_index())
+    return ret
+
+
+def register_cleaners(cb_progress=lambda x: None, cb_done=lambda: None, cleaner_ids=None):
+    """Register all known cleaners: system, CleanerML, and Winapp2
+
+    If cleaner_ids is given, register only the cleaners with those IDs.
+    Cleaners whose source is unchanged since the previous registration
+    are registered again as the same objects."""
     global backends
 
     # wipe out any registrations
     # Because this is a global variable, cannot use backends = {}
+    # CleanerML and Winapp2 reuse the cleaners of unchanged files, and
+    # the "hard coded" cleaners are reused too.
+    previous = dict(backends)
     backends.clear()
 
     # initialize "hard coded" (non-CleanerML) backends
-    backends["openofficeorg"] = OpenOfficeOrg()
-    backends["system"] = System()
+    for (cleaner_id, cleaner_class) in builtin_cleaners:
+        if cleaner_ids is None or cleaner_id in cleaner_ids:
+            cleaner = previous.get(cleaner_id)
+            if type(cleaner) is not cleaner_class:
+                cleaner = cleaner_class()
+            backends[cleaner_id] = cleaner
 
     # register CleanerML cleaners
     from bleachbit import CleanerML
     cb_progress(_('Loading native cleaners.'))
-    for ret in CleanerML.load_cleaners(cb_progress):
+    for ret in CleanerML.load_cleaners(cb_progress, cleaner_ids):
         yield ret
 
-    # register Winapp2.ini cleaners
-    if 'nt' == os.name:
+    # register Winapp2.ini cleaners, whose IDs are known only after
+    # reading winapp2.ini
+    if 'nt' == os.name and \
+            (cleaner_ids is None or not set(cleaner_ids).issubset(backends)):
         cb_progress(_('Importing cleaners from Winapp2.ini.'))
         from bleachbit import Winapp
         for ret in Winapp.load_cleaners(cb_progress):
@@ -718,7 +957,10 @@ def create_simple_cleaner(paths):
                         'expected path as string but got %s' % str(path))
                 if not os.path.isabs(path):
                     path = os.path.abspath(path)
-                if os.path.isdir(path):
+                if os.path.isdir(path) and not os.path.islink(path) and \
+                        FileUtilities.delete_tree_supported:
+                    yield Command.DeleteTree(path, include_top=True, shred=True)
+                elif os.path.isdir(path):
                     for child in children_in_directory(path, True):
                         yield Command.Shred(child)
                     yield Command.Shred(path)
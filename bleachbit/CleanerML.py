@@ -25,14 +25,17 @@ Create cleaners from CleanerML (markup language)
 import bleachbit
 from bleachbit.Action import ActionProvider
 from bleachbit import _
-from bleachbit.General import boolstr_to_bool, getText
+from bleachbit.General import boolstr_to_bool
 from bleachbit.FileUtilities import expand_glob_join, listdir
-from bleachbit import Cleaner
+from bleachbit import Cleaner, FileUtilities
 
+import collections.abc
+import json
 import logging
 import os
 import sys
-import xml.dom.minidom
+import weakref
+import xml.dom
 
 logger = logging.getLogger(__name__)
 
@@ -53,24 +56,87 @@ def default_vars():
     return ret
 
 
+class CachedElement:
+
+    """Stand-in for a DOM element rebuilt from a parsed definition
+
+    The locale cleaner reads only the name, attributes and child
+    elements of the <localizations> nodes.
+    """
+
+    ELEMENT_NODE = xml.dom.Node.ELEMENT_NODE
+    TEXT_NODE = xml.dom.Node.TEXT_NODE
+    nodeType = ELEMENT_NODE
+
+    def __init__(self, name, attrs, children=()):
+        self.nodeName = name
+        self.attrs = attrs
+        self.childNodes = [CachedElement(*child) for child in children]
+
+    def getAttribute(self, name):
+        """Return the attribute value, or '' like minidom"""
+        return self.attrs.get(name, '')
+
+    def hasAttribute(self, name):
+        """Return whether the attribute is set"""
+        return name in self.attrs
+
+
+def element_definition(element):
+    """Return [tag, attributes, children] for an ElementTree element"""
+    return [element.tag, dict(element.attrib),
+            [element_definition(child) for child in element]]
+
+
+def element_text(element):
+    """Return the text directly inside an ElementTree element"""
+    return (element.text or '') + ''.join(child.tail or '' for child in element)
+
+
+def iter_cleanerml(pathname):
+    """Yield the root element of a CleanerML file and then its children
+
+    The root element comes at its start tag, so only its attributes
+    are set. Each child comes complete, in document order, and is
+    cleared afterwards, so memory stays bounded by the largest
+    <option> rather than the whole file.
+    """
+    import xml.etree.ElementTree as ET
+    depth = 0
+    for (event, element) in ET.iterparse(pathname, events=('start', 'end')):
+        if 'start' == event:
+            depth += 1
+            if 1 == depth:
+                yield element
+            continue
+        depth -= 1
+        if 1 == depth:
+            yield element
+            element.clear()
+
+
 class CleanerML:
 
     """Create a cleaner from CleanerML"""
 
-    def __init__(self, pathname, xlate_cb=None):
+    def __init__(self, pathname, xlate_cb=None, build=True):
         """Create cleaner from XML in pathname.
 
         If xlate_cb is set, use it as a callback for each
         translate-able string.
+
+        If build is False, only parse the definition and leave
+        self.cleaner as None.
+
+        The parsed cleaner is kept in self.definition, which holds
+        only lists, dictionaries and strings so it can be cached.
+        Messages are stored untranslated, and variables and actions
+        are stored as written so build_cleaner() can expand them
+        when the cleaner is created.
         """
 
-        self.action = None
-        self.cleaner = Cleaner.Cleaner()
-        self.option_id = None
-        self.option_name = None
-        self.option_description = None
-        self.option_warning = None
-        self.vars = default_vars()
+        self.definition = None
+        self.option = None
         self.xlate_cb = xlate_cb
         if self.xlate_cb is None:
             self.xlate_mode = False
@@ -78,9 +144,10 @@ class CleanerML:
         else:
             self.xlate_mode = True
 
-        dom = xml.dom.minidom.parse(pathname)
-
-        self.handle_cleaner(dom.getElementsByTagName('cleaner')[0])
+        self.handle_cleaner(iter_cleanerml(pathname))
+        self.cleaner = None
+        if build:
+            self.cleaner = build_cleaner(self.definition)
 
     def get_cleaner(self):
         """Return the created cleaner"""
@@ -115,116 +182,122 @@ class CleanerML:
         # Compare current OS against required OS.
         return os_str in current_os
 
-    def handle_cleaner(self, cleaner):
-        """<cleaner> element"""
-        if not self.os_match(cleaner.getAttribute('os')):
+    def handle_cleaner(self, elements):
+        """<cleaner> element followed by its children"""
+        cleaner = next(elements)
+        if 'cleaner' != cleaner.tag:
+            raise RuntimeError("Invalid root '%s', expected '<cleaner>'" % cleaner.tag)
+        if not self.os_match(cleaner.get('os', '')):
             return
-        self.cleaner.id = cleaner.getAttribute('id')
-        self.handle_cleaner_label(cleaner.getElementsByTagName('label')[0])
-        description = cleaner.getElementsByTagName('description')
-        if description and description[0].parentNode == cleaner:
-            self.handle_cleaner_description(description[0])
-        for var in cleaner.getElementsByTagName('var'):
-            self.handle_cleaner_var(var)
-        for option in cleaner.getElementsByTagName('option'):
-            try:
-                self.handle_cleaner_option(option)
-            except:
-                exc_msg = _(
-                    "Error in handle_cleaner_option() for cleaner id = {cleaner_id}, option XML={option_xml}")
-                logger.exception(exc_msg.format(
-                    cleaner_id=exc_dict, option_xml=option.toxml()))
-        self.handle_cleaner_running(cleaner.getElementsByTagName('running'))
-        self.handle_localizations(
-            cleaner.getElementsByTagName('localizations'))
+        self.definition = {'id': cleaner.get('id', ''),
+                           'label': None,
+                           'description': None,
+                           'vars': [],
+                           'options': [],
+                           'running': [],
+                           'localizations': []}
+        for element in elements:
+            if 'label' == element.tag:
+                self.handle_cleaner_label(element)
+            elif 'description' == element.tag:
+                self.handle_cleaner_description(element)
+            elif 'var' == element.tag:
+                self.handle_cleaner_var(element)
+            elif 'option' == element.tag:
+                try:
+                    self.handle_cleaner_option(element)
+                except:
+                    import xml.etree.ElementTree as ET
+                    exc_msg = _(
+                        "Error in handle_cleaner_option() for cleaner id = {cleaner_id}, option XML={option_xml}")
+                    logger.exception(exc_msg.format(
+                        cleaner_id=self.definition['id'],
+                        option_xml=ET.tostring(element, encoding='unicode')))
+            elif 'running' == element.tag:
+                self.handle_cleaner_running(element)
+            elif 'localizations' == element.tag:
+                self.handle_localizations(element)
+        if self.definition['label'] is None:
+            raise RuntimeError(
+                "Cleaner '%s' has no <label>" % self.definition['id'])
 
     def handle_cleaner_label(self, label):
         """<label> element under <cleaner>"""
-        self.cleaner.name = _(getText(label.childNodes))
-        translate = label.getAttribute('translate')
+        self.definition['label'] = element_text(label)
+        translate = label.get('translate', '')
         if translate and boolstr_to_bool(translate):
-            self.xlate_cb(self.cleaner.name)
+            self.xlate_cb(self.definition['label'])
 
     def handle_cleaner_description(self, description):
         """<description> element under <cleaner>"""
-        self.cleaner.description = _(getText(description.childNodes))
-        translators = description.getAttribute('translators')
-        self.xlate_cb(self.cleaner.description, translators)
+        self.definition['description'] = element_text(description)
+        translators = description.get('translators', '')
+        self.xlate_cb(self.definition['description'], translators)
 
-    def handle_cleaner_running(self, running_elements):
+    def handle_cleaner_running(self, running):
         """<running> element under <cleaner>"""
         # example: <running type="command">opera</running>
-        for running in running_elements:
-            if not self.os_match(running.getAttribute('os')):
-                continue
-            detection_type = running.getAttribute('type')
-            value = getText(running.childNodes)
-            self.cleaner.add_running(detection_type, value)
+        if not self.os_match(running.get('os', '')):
+            return
+        detection_type = running.get('type', '')
+        value = element_text(running)
+        self.definition['running'].append([detection_type, value])
 
     def handle_cleaner_option(self, option):
         """<option> element"""
-        self.option_id = option.getAttribute('id')
-        self.option_description = None
-        self.option_name = None
-
-        self.handle_cleaner_option_label(
-            option.getElementsByTagName('label')[0])
-        description = option.getElementsByTagName('description')
-        self.handle_cleaner_option_description(description[0])
-        warning = option.getElementsByTagName('warning')
-        if warning:
-            self.handle_cleaner_option_warning(warning[0])
-            if self.option_warning:
-                self.cleaner.set_warning(self.option_id, self.option_warning)
-
-        for action in option.getElementsByTagName('action'):
-            self.handle_cleaner_option_action(action)
-
-        self.cleaner.add_option(
-            self.option_id, self.option_name, self.option_description)
+        self.option = {'id': option.get('id', ''),
+                       'label': None,
+                       'description': None,
+                       'warning': None,
+                       'actions': []}
+
+        for element in option:
+            if 'label' == element.tag and self.option['label'] is None:
+                self.handle_cleaner_option_label(element)
+            elif 'description' == element.tag and self.option['description'] is None:
+                self.handle_cleaner_option_description(element)
+            elif 'warning' == element.tag and self.option['warning'] is None:
+                self.handle_cleaner_option_warning(element)
+            elif 'action' == element.tag:
+                self.handle_cleaner_option_action(element)
+        if self.option['label'] is None or self.option['description'] is None:
+            raise RuntimeError('<option> needs <label> and <description>')
+
+        self.definition['options'].append(self.option)
 
     def handle_cleaner_option_label(self, label):
         """<label> element under <option>"""
-        self.option_name = _(getText(label.childNodes))
-        translate = label.getAttribute('translate')
-        translators = label.getAttribute('translators')
+        self.option['label'] = element_text(label)
+        translate = label.get('translate', '')
+        translators = label.get('translators', '')
         if not translate or boolstr_to_bool(translate):
-            self.xlate_cb(self.option_name, translators)
+            self.xlate_cb(self.option['label'], translators)
 
     def handle_cleaner_option_description(self, description):
         """<description> element under <option>"""
-        self.option_description = _(getText(description.childNodes))
-        translators = description.getAttribute('translators')
-        self.xlate_cb(self.option_description, translators)
+        self.option['description'] = element_text(description)
+        translators = description.get('translators', '')
+        self.xlate_cb(self.option['description'], translators)
 
     def handle_cleaner_option_warning(self, warning):
         """<warning> element under <option>"""
-        self.option_warning = _(getText(warning.childNodes))
-        self.xlate_cb(self.option_warning)
+        self.option['warning'] = element_text(warning)
+        self.xlate_cb(self.option['warning'])
 
-    def handle_cleaner_option_action(self, action_node):
+    def handle_cleaner_option_action(self, action_element):
         """<action> element under <option>"""
-        if not self.os_match(action_node.getAttribute('os')):
+        if not self.os_match(action_element.get('os', '')):
             return
-        command = action_node.getAttribute('command')
-        provider = None
-        for actionplugin in ActionProvider.plugins:
-            if actionplugin.action_key == command:
-                provider = actionplugin(action_node, self.vars)
-        if provider is None:
+        command = action_element.get('command', '')
+        if not any(actionplugin.action_key == command
+                   for actionplugin in ActionProvider.plugins):
             raise RuntimeError("Invalid command '%s'" % command)
-        self.cleaner.add_action(self.option_id, provider)
+        self.option['actions'].append(dict(action_element.attrib))
 
-    def handle_localizations(self, localization_nodes):
+    def handle_localizations(self, localizations):
         """<localizations> element under <cleaner>"""
-        if not 'posix' == os.name:
-            return
-        from bleachbit import Unix
-        for localization_node in localization_nodes:
-            for child_node in localization_node.childNodes:
-                Unix.locales.add_xml(child_node)
-        # Add a dummy action so the file isn't reported as unusable
-        self.cleaner.add_action('localization', ActionProvider(None))
+        for child in localizations:
+            self.definition['localizations'].append(element_definition(child))
 
     def handle_cleaner_var(self, var):
         """Handle one <var> element under <cleaner>.
@@ -237,22 +310,133 @@ class CleanerML:
          <value>%AppData\foo</value>
          </var>
         """
-        var_name = var.getAttribute('name')
-        for value_element in var.getElementsByTagName('value'):
-            if not self.os_match(value_element.getAttribute('os')):
+        var_name = var.get('name', '')
+        for value_element in var.iter('value'):
+            if not self.os_match(value_element.get('os', '')):
                 continue
-            value_str = getText(value_element.childNodes)
-            is_glob = value_element.getAttribute('search') == 'glob'
+            value_str = element_text(value_element)
+            is_glob = value_element.get('search', '') == 'glob'
+            self.definition['vars'].append([var_name, value_str, is_glob])
+
+
+class PathVars(collections.abc.Mapping):
+
+    """Multi-value variables of a cleaner, expanded when first used
+
+    All actions of a cleaner share one PathVars. A variable is
+    expanded, including its globs, on its first lookup during a Worker
+    run and then reused until the run ends. Outside a run, such as when
+    probing for auto_hide, each lookup expands the globs again.
+    """
+
+    def __init__(self, var_specs):
+        # name -> list of (value, is_glob) in document order
+        self.specs = {}
+        for var_name, value_str, is_glob in var_specs:
+            self.specs.setdefault(var_name, []).append((value_str, is_glob))
+        self.defaults = default_vars()
+        self.values = {}
+        # weak reference to the FileUtilities.scan_cache of the run
+        self.run = None
+
+    def expand(self, var_name):
+        """Return the list of values of one variable"""
+        ret = self.defaults.get(var_name, [])
+        for value_str, is_glob in self.specs[var_name]:
             if is_glob:
                 value_list = expand_glob_join(value_str, '')
             else:
                 value_list = [value_str, ]
-            if var_name in self.vars:
-                # append
-                self.vars[var_name] = value_list + self.vars[var_name]
-            else:
-                # initialize
-                self.vars[var_name] = value_list
+            # later values come first
+            ret = value_list + ret
+        return ret
+
+    def __getitem__(self, var_name):
+        if var_name not in self.specs:
+            return self.defaults[var_name]
+        scan_cache = FileUtilities.scan_cache
+        if scan_cache is None:
+            # Nothing tells when the globs match other paths.
+            return self.expand(var_name)
+        run = weakref.ref(scan_cache)
+        if run != self.run:
+            # a new run, so the globs may match other paths
+            self.values = {}
+            self.run = run
+        if var_name not in self.values:
+            self.values[var_name] = self.expand(var_name)
+        return self.values[var_name]
+
+    def __iter__(self):
+        yield from self.specs
+        for var_name in self.defaults:
+            if var_name not in self.specs:
+                yield var_name
+
+    def __len__(self):
+        return len(self.specs.keys() | self.defaults.keys())
+
+
+def create_action_provider(attrs, path_vars):
+    """Return the ActionProvider for the attributes of an <action>"""
+    command = attrs.get('command', '')
+    provider = None
+    for actionplugin in ActionProvider.plugins:
+        if actionplugin.action_key == command:
+            provider = actionplugin(attrs, path_vars)
+    if provider is None:
+        raise RuntimeError("Invalid command '%s'" % command)
+    return provider
+
+
+def build_cleaner(definition):
+    """Create a Cleaner from a CleanerML definition
+
+    The definition is CleanerML.definition, either freshly parsed or
+    read back from the cache. None means the cleaner is not for this
+    operating system.
+    """
+    cleaner = Cleaner.Cleaner()
+    if definition is None:
+        return cleaner
+    cleaner.id = definition['id']
+    cleaner.name = _(definition['label'])
+    if definition['description'] is not None:
+        cleaner.description = _(definition['description'])
+    path_vars = PathVars(definition['vars'])
+    for option in definition['options']:
+        option_id = option['id']
+        try:
+            providers = [create_action_provider(attrs, path_vars)
+                         for attrs in option['actions']]
+        except:
+            logger.exception("Error in actions for cleaner id = %s, option id = %s",
+                             cleaner.id, option_id)
+            continue
+        if option['warning'] is not None:
+            warning = _(option['warning'])
+            if warning:
+                cleaner.set_warning(option_id, warning)
+        for provider in providers:
+            cleaner.add_action(option_id, provider)
+        cleaner.add_option(
+            option_id, _(option['label']), _(option['description']))
+    for detection_type, value in definition['running']:
+        cleaner.add_running(detection_type, value)
+    if 'posix' == os.name:
+        add_localizations(definition)
+        # Add a dummy action so the file isn't reported as unusable
+        cleaner.add_action('localization', ActionProvider(None))
+    return cleaner
+
+
+def add_localizations(definition):
+    """Add the <localizations> of a definition to the locale cleaner"""
+    if not definition['localizations']:
+        return
+    from bleachbit import Unix
+    for localization in definition['localizations']:
+        Unix.locales.add_xml(CachedElement(*localization))
 
 
 def list_cleanerml_files(local_only=False):
@@ -277,23 +461,216 @@ def list_cleanerml_files(local_only=False):
         yield pathname
 
 
-def load_cleaners(cb_progress=lambda x: None):
-    """Scan for CleanerML and load them"""
+def load_cache():
+    """Return cached CleanerML entries keyed by pathname
+
+    Each entry is [mtime_ns, size, definition]. The cache is dropped
+    when it was written by another version or for another platform.
+    """
+    if not bleachbit.cleanerml_cache_file:
+        return {}
+    try:
+        with open(bleachbit.cleanerml_cache_file, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or \
+            cache.get('version') != bleachbit.APP_VERSION or \
+            cache.get('platform') != sys.platform:
+        return {}
+    return cache.get('cleaners', {})
+
+
+def save_cache(entries):
+    """Write CleanerML entries to the cache"""
+    if not bleachbit.cleanerml_cache_file:
+        return
+    cache = {'version': bleachbit.APP_VERSION,
+             'platform': sys.platform,
+             'cleaners': entries}
+    # Write beside the cache and rename so concurrent readers see
+    # either the old or the new cache.
+    tmp_path = '%s.%d' % (bleachbit.cleanerml_cache_file, os.getpid())
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, separators=(',', ':'))
+        os.replace(tmp_path, bleachbit.cleanerml_cache_file)
+    except OSError as e:
+        logger.debug('Cannot write CleanerML cache %s: %s',
+                     bleachbit.cleanerml_cache_file, e)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+# Fewest unparsed CleanerML files for each worker process
+cleanerml_files_per_worker = 32
+
+
+def parse_definition(pathname):
+    """Return the definition parsed from a CleanerML file"""
+    return CleanerML(pathname, build=False).definition
+
+
+def parse_definitions_parallel(pathnames):
+    """Start parsing CleanerML files in worker processes
+
+    Returns the executor and a dictionary of futures by pathname, or
+    (None, {}) when there are too few files to be worth the processes.
+    """
+    workers = min(bleachbit.cleanerml_workers, os.cpu_count() or 1,
+                  len(pathnames) // cleanerml_files_per_worker)
+    if workers < 2 or hasattr(sys, 'frozen'):
+        # Frozen executables cannot start worker processes from here.
+        return (None, {})
+    import multiprocessing
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        # Spawned workers would import the launcher again and run it
+        # with the same command line, so use them only when forked.
+        return (None, {})
+    import concurrent.futures
+    try:
+        try:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context('fork'))
+        except TypeError:
+            # Python before 3.7 has no mp_context, and it forks by
+            # default where it can.
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+        futures = {pathname: executor.submit(parse_definition, pathname)
+                   for pathname in pathnames}
+    except (OSError, NotImplementedError) as e:
+        logger.debug('Cannot parse CleanerML in parallel: %s', e)
+        return (None, {})
+    return (executor, futures)
+
+
+def load_definitions(cb_progress=lambda x: None):
+    """Yield (pathname, definition) for each CleanerML file
+
+    Definitions of files whose modification time and size are
+    unchanged come from the cache. The other files are parsed, in
+    worker processes when there are many, and the cache is updated
+    once all files are read. Definitions are yielded in sorted order
+    of pathname either way.
+    """
     cleanerml_files = list(list_cleanerml_files())
     cleanerml_files.sort()
     if not cleanerml_files:
         logger.debug('No CleanerML files to load.')
         return
-    total_files = len(cleanerml_files)
-    cb_progress(0.0)
-    files_done = 0
+    cached = load_cache()
+    keys = {}
     for pathname in cleanerml_files:
         try:
-            xmlcleaner = CleanerML(pathname)
-        except:
+            st = os.stat(pathname)
+        except OSError:
             logger.exception(_("Error reading cleaner: %s"), pathname)
             continue
-        cleaner = xmlcleaner.get_cleaner()
+        keys[pathname] = [st.st_mtime_ns, st.st_size]
+
+    def cached_definition(pathname):
+        entry = cached.get(pathname)
+        if isinstance(entry, list) and len(entry) == 3 and \
+                entry[:2] == keys[pathname]:
+            return entry
+        return None
+    (executor, futures) = parse_definitions_parallel(
+        [pathname for pathname in keys if cached_definition(pathname) is None])
+    if executor is not None:
+        from concurrent.futures.process import BrokenProcessPool
+    entries = {}
+    total_files = len(cleanerml_files)
+    cb_progress(0.0)
+    files_done = 0
+    try:
+        for pathname in cleanerml_files:
+            files_done += 1
+            if pathname not in keys:
+                continue
+            try:
+                entry = cached_definition(pathname)
+                if entry is not None:
+                    definition = entry[2]
+                elif pathname in futures:
+                    try:
+                        definition = futures[pathname].result()
+                    except BrokenProcessPool as e:
+                        # parse this and the remaining files here
+                        logger.debug(
+                            'Cannot parse CleanerML in parallel: %s', e)
+                        futures = {}
+                        definition = parse_definition(pathname)
+                else:
+                    definition = parse_definition(pathname)
+            except:
+                logger.exception(_("Error reading cleaner: %s"), pathname)
+                continue
+            entries[pathname] = keys[pathname] + [definition]
+            cb_progress(1.0 * files_done / total_files)
+            yield (pathname, definition)
+    finally:
+        if executor is not None:
+            for future in futures.values():
+                future.cancel()
+            executor.shutdown(wait=False)
+    if entries != cached:
+        save_cache(entries)
+
+
+def is_usable_definition(definition):
+    """Return whether build_cleaner() makes a usable cleaner"""
+    if definition is None:
+        return False
+    if 'posix' == os.name:
+        # build_cleaner() adds the localization action
+        return True
+    return any(option['actions'] for option in definition['options'])
+
+
+def cleaner_index():
+    """Return {cleaner ID: sorted option IDs} without creating cleaners"""
+    ret = {}
+    for (_pathname, definition) in load_definitions():
+        if is_usable_definition(definition):
+            ret[definition['id']] = sorted(
+                set(option['id'] for option in definition['options']))
+    return ret
+
+
+# pathname -> (definition, Cleaner) of the cleaners load_cleaners() created
+registered = {}
+
+
+def load_cleaners(cb_progress=lambda x: None, cleaner_ids=None):
+    """Scan for CleanerML and load them
+
+    If cleaner_ids is given, create only the cleaners with those IDs.
+
+    A file whose definition is unchanged since the previous call
+    registers the same Cleaner again instead of building a new one.
+    """
+    seen = set()
+    for (pathname, definition) in load_definitions(cb_progress):
+        seen.add(pathname)
+        if cleaner_ids is not None and \
+                (definition is None or definition['id'] not in cleaner_ids):
+            # The system cleaner uses the localizations of other cleaners.
+            if definition is not None and 'posix' == os.name:
+                add_localizations(definition)
+            continue
+        previous = registered.get(pathname)
+        if previous is not None and previous[0] == definition:
+            cleaner = previous[1]
+        else:
+            try:
+                cleaner = build_cleaner(definition)
+            except:
+                registered.pop(pathname, None)
+                logger.exception(_("Error reading cleaner: %s"), pathname)
+                continue
+            registered[pathname] = (definition, cleaner)
         if cleaner.is_usable():
             Cleaner.backends[cleaner.id] = cleaner
         else:
@@ -302,9 +679,10 @@ def load_cleaners(cb_progress=lambda x: None):
                 # "Not usable" means the whole cleaner will be ignored.
                 # The substituted variable is a pathname.
                 _("Cleaner is not usable on this OS because it has no actions: %s"), pathname)
-        files_done += 1
-        cb_progress(1.0 * files_done / total_files)
         yield True
+    # forget cleaners whose files were removed
+    for pathname in set(registered) - seen:
+        del registered[pathname]
 
 
 def pot_fragment(msgid, pathname, translators=None):
@@ -56,7 +56,10 @@ class Delete:
     preference regarding shredding."""
 
     def __init__(self, path):
-        """Create a Delete instance to delete 'path'"""
+        """Create a Delete instance to delete 'path'
+
+        If the path is a FileUtilities.FileRecord from a walk, its
+        cached lstat() gives the size instead of asking again."""
         self.path = path
         self.shred = False
 
@@ -69,6 +72,9 @@ class Delete:
         if FileUtilities.whitelisted(self.path):
             yield whitelist(self.path)
             return
+        if FileUtilities.shred_pending(self.path):
+            # An earlier command already shredded it.
+            return
         ret = {
             # TRANSLATORS: This is the label in the log indicating will be
             # deleted (for previews) or was actually deleted
@@ -101,6 +107,42 @@ class Delete:
         yield ret
 
 
+class DeleteTree(Delete):
+
+    """Delete the contents of a directory, and optionally the directory
+
+    The tree is deleted relative to directory file descriptors by
+    FileUtilities.delete_tree(), and there is one result per file and
+    directory. Obey the user preference regarding shredding."""
+
+    def __init__(self, path, include_top=False, shred=False):
+        """Create an instance to delete the tree at 'path'"""
+        Delete.__init__(self, path)
+        self.include_top = include_top
+        self.shred = shred
+
+    def __str__(self):
+        return 'Command to %s tree %s' % \
+            ('shred' if self.shred else 'delete', self.path)
+
+    def execute(self, really_delete):
+        """Make changes and yield the results"""
+        from bleachbit.Options import options
+        shred = self.shred or options.get('shred')
+        for (path, st, whitelisted) in FileUtilities.delete_tree(
+                self.path, self.include_top, shred, really_delete,
+                FileUtilities.whitelisted):
+            if whitelisted:
+                yield whitelist(path)
+                continue
+            yield {
+                'label': _('Delete'),
+                'n_deleted': 1,
+                'n_special': 0,
+                'path': path,
+                'size': st.st_blocks * 512}
+
+
 class Function:
 
     """Execute a simple Python function"""
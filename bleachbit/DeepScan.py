@@ -29,8 +29,14 @@ import platform
 import re
 import unicodedata
 from collections import namedtuple
+import bleachbit
 from bleachbit import fs_scan_re_flags
-from . import Command
+from . import Command, FileUtilities
+
+# Deep scan matches found ahead of time by WalkPlan during a Worker run,
+# mapping each top to (roots, list of (full path, command))
+planned = None
+
 
 def normalized_walk(top, **kwargs):
     """
@@ -54,7 +60,7 @@ def normalized_walk(top, **kwargs):
             yield result
 
 
-Search = namedtuple('Search', ['command', 'regex', 'nregex', 'wholeregex', 'nwholeregex'])
+Search = namedtuple('Search', ['command', 'regex', 'nregex', 'wholeregex', 'nwholeregex', 'prune'])
 Search.__new__.__defaults__ = (None,) * len(Search._fields)
 
 class CompiledSearch:
@@ -63,7 +69,7 @@ class CompiledSearch:
         self.command = search.command
 
         def re_compile(regex):
-            return re.compile(regex, fs_scan_re_flags) if regex else None
+            return FileUtilities.compile_regex(regex) if regex else None
 
         self.regex = re_compile(search.regex)
         self.nregex = re_compile(search.nregex)
@@ -87,39 +93,574 @@ class CompiledSearch:
 
         return full_path
 
+def literal_suffixes(regex, max_suffixes=64):
+    """Return the literal suffixes that any match of 'regex' must end with
+
+    The regex must be anchored with a trailing $, and the suffix is
+    built from the literal characters and simple character classes
+    such as [nop] before it.  Return None when there is no such
+    suffix, so the caller must run the regex."""
+    if not regex or not regex.endswith('$') or '|' in regex:
+        return None
+    # Split into tokens: an escape pair, a character class, or a character.
+    tokens = re.findall(r'\\.|\[[^\]\\]*\]|.', regex[:-1], re.DOTALL)
+    if not tokens or tokens[-1] == '\\':
+        return None
+    suffixes = suffixes_prev = ['']
+    for token in reversed(tokens):
+        if 2 == len(token) and '\\' == token[0] and not token[1].isalnum():
+            chars = token[1]
+        elif 1 == len(token) and (token.isalnum() or token in '_-~ ,;:\'@#%&=!<>"/'):
+            chars = token
+        elif token.startswith('[') and len(token) > 2 and \
+                not re.search(r'[\^\-\\\[]', token[1:-1]):
+            chars = token[1:-1]
+        else:
+            break
+        suffixes = [c + suffix for c in chars for suffix in suffixes]
+        if len(suffixes) > max_suffixes:
+            suffixes = suffixes_prev
+            break
+        suffixes_prev = suffixes
+    if suffixes == ['']:
+        return None
+    return suffixes
+
+
+class MultiSearch:
+    """All the searches for one root compiled into one matcher
+
+    Each filename is matched once against a single alternation of the
+    basename regexes with a named group per search, after a cheap test
+    of the literal suffixes that the regexes require.  The full path is
+    built only when a search has a wholeregex or nwholeregex."""
+
+    def __init__(self, searches):
+        self.searches = [CompiledSearch(search) for search in searches]
+        # searches without a basename regex are checked for every file
+        self.always = [c for c in self.searches if not c.regex]
+        with_regex = [c for c in self.searches if c.regex]
+        self.combined = None
+        self.groups = {}
+        sources = [c.regex.pattern for c in with_regex]
+        if with_regex and \
+                not any(re.search(r'\\[1-9]|\(\?P=', source) for source in sources):
+            alternation = '|'.join('(?P<_bb%d>%s)' % (i, source)
+                                   for (i, source) in enumerate(sources))
+            try:
+                self.combined = re.compile(alternation, fs_scan_re_flags)
+            except re.error:
+                # for example, inline flags which are not at the start
+                pass
+            else:
+                self.groups = {'_bb%d' % i: c for (i, c)
+                               in enumerate(with_regex)}
+        self.with_regex = with_regex
+        self.suffixes = None
+        self.ignorecase = False
+        if not self.always:
+            suffixes = []
+            for c in with_regex:
+                these = None
+                if not c.regex.flags & re.VERBOSE:
+                    these = literal_suffixes(c.regex.pattern)
+                if not these and not c.regex.flags & (re.MULTILINE | re.VERBOSE):
+                    # such as (?s:.*\.tmp)\Z from fnmatch.translate()
+                    literals = FileUtilities.regex_literals(c.regex.pattern)
+                    if literals is not None and literals[2]:
+                        these = list(literals[0])
+                if not these:
+                    suffixes = None
+                    break
+                if c.regex.flags & re.IGNORECASE:
+                    self.ignorecase = True
+                suffixes.extend(these)
+            if suffixes:
+                if self.ignorecase:
+                    suffixes = [suffix.lower() for suffix in suffixes]
+                self.suffixes = tuple(set(suffixes))
+
+    def match(self, dirpath, filename):
+        """Return (full path, command) for a filename, or None"""
+        if self.suffixes is not None:
+            name = filename.lower() if self.ignorecase else filename
+            if not name.endswith(self.suffixes) and not name.endswith('\n'):
+                return None
+        candidates = self.always
+        if self.with_regex:
+            if self.combined is not None:
+                m = self.combined.search(filename)
+                if m is None:
+                    if not candidates:
+                        return None
+                else:
+                    # The alternation reports one search, and the others
+                    # may match elsewhere in the name, so check those too.
+                    first = self.groups[m.lastgroup]
+                    candidates = candidates + [first] + \
+                        [c for c in self.with_regex
+                         if c is not first and c.regex.search(filename)]
+            else:
+                candidates = candidates + \
+                    [c for c in self.with_regex if c.regex.search(filename)]
+        full_path = None
+        command = None
+        for c in candidates:
+            if c.nregex and c.nregex.search(filename):
+                continue
+            if c.wholeregex or c.nwholeregex:
+                if full_path is None:
+                    full_path = os.path.join(dirpath, filename)
+                if c.wholeregex and not c.wholeregex.search(full_path):
+                    continue
+                if c.nwholeregex and c.nwholeregex.search(full_path):
+                    continue
+            if 'shred' == c.command:
+                command = c.command
+                break
+            if command is None and 'delete' == c.command:
+                command = c.command
+        if command is None:
+            return None
+        if full_path is None:
+            full_path = os.path.join(dirpath, filename)
+        return (full_path, command)
+
+
+def normalize_root(root):
+    """Return the absolute path of a deep scan root
+
+    An empty root means the home directory.  Symlinks are kept, so the
+    paths under the root have the names the user configured, which the
+    whitelist may use."""
+    return os.path.abspath(os.path.expanduser(root or '~'))
+
+
+def consolidate_roots(searches):
+    """Merge the roots of deep scans into the fewest trees to walk
+
+    The argument maps each root to a list of searches.  Return a
+    dictionary mapping each top to walk to a dictionary of the roots
+    under it and their searches.  A root which is equal to or inside
+    another root is walked only as part of the outer root.
+
+    Roots are compared by their real paths.  A root inside another root
+    is given by its path under the name of the outer root, where the
+    walk reaches it."""
+    by_root = {}
+    for (root, root_searches) in searches.items():
+        root = normalize_root(root)
+        by_root.setdefault(root, []).extend(root_searches)
+    real = {root: os.path.realpath(root) for root in by_root}
+    tops = {}
+    top = None
+    # Sorted by components, every root follows the root which contains it.
+    for root in sorted(by_root, key=lambda r: (os.path.normcase(real[r]).split(os.sep), r)):
+        if top is None or not is_under(real[root], real[top]):
+            top = root
+            tops[top] = {}
+            path = root
+        else:
+            path = os.path.normpath(
+                os.path.join(top, os.path.relpath(real[root], real[top])))
+        tops[top].setdefault(path, []).extend(by_root[root])
+    return tops
+
+
+def is_under(path, root):
+    """Return whether 'path' is 'root' or inside it"""
+    path = os.path.normcase(path)
+    root = os.path.normcase(root)
+    if path == root:
+        return True
+    if not root.endswith(os.sep):
+        root += os.sep
+    return path.startswith(root)
+
+
+def match_walk(top, roots, walk, excluded=None):
+    """Match the files of a walk under 'top' against the searches
+
+    Yield a list of (full path, command) for each directory, which may
+    be empty.  The directories and files are sorted, so the order of
+    matches does not depend on the file system.
+
+    A subdirectory whose name matches the prune regex of every search
+    that applies there is removed from the walk, so it is never
+    listed.  If only some searches prune it, they are excluded beneath
+    it.  The dictionary 'excluded' maps directories to the searches
+    excluded there, and it is updated during the walk."""
+    if excluded is None:
+        excluded = {}
+    # one matcher for each set of searches
+    matchers = {}
+    prunes = {}
+    nested = len(roots) > 1 or top not in roots
+    for (dirpath, dirnames, filenames) in walk:
+        # os.walk() descends in the order of dirnames
+        dirnames.sort()
+        if nested:
+            active = tuple(root for root in roots if is_under(dirpath, root))
+        else:
+            active = (top,)
+        skip = excluded.pop(dirpath, frozenset())
+        searches = tuple(s for root in active for s in roots[root]
+                         if s not in skip)
+        matcher = matchers.get(searches)
+        if matcher is None:
+            matcher = MultiSearch(searches)
+            matchers[searches] = matcher
+        pruning = [s for s in searches if s.prune]
+        if dirnames and (pruning or skip):
+            for s in pruning:
+                if s not in prunes:
+                    prunes[s] = FileUtilities.compile_regex(s.prune)
+            keep = []
+            for dirname in dirnames:
+                pruned = skip.union(
+                    s for s in pruning if prunes[s].search(dirname))
+                if pruned:
+                    path = os.path.join(dirpath, dirname)
+                    if all(s in pruned for s in searches) and not \
+                            (nested and any(is_under(root, path) for root in roots)):
+                        # no search looks beneath, so do not list it
+                        continue
+                    excluded[path] = pruned
+                keep.append(dirname)
+            dirnames[:] = keep
+        matches = []
+        for filename in sorted(filenames):
+            found = matcher.match(dirpath, filename)
+            if found is not None:
+                matches.append(found)
+        yield matches
+
+
 class DeepScan:
 
     """Advanced directory tree scan"""
 
-    def __init__(self, searches):
+    # Number of directories with matches that each worker may queue
+    queue_size = 64
+
+    def __init__(self, searches, workers=None):
+        """Create a scan for 'searches', a dictionary mapping each root
+        to a list of searches
+
+        With more than one worker, each top-level subdirectory of a root
+        is walked and matched in a pool of threads.  By default the
+        number of workers is bleachbit.deep_scan_workers."""
         self.roots = []
         self.searches = searches
+        self.workers = workers
 
     def scan(self):
-        """Perform requested searches and yield each match"""
+        """Perform requested searches and yield each match
+
+        Overlapping roots are walked once, and each search applies only
+        under its own root.  Matches come in the same order whether or
+        not the scan is parallel."""
         logging.getLogger(__name__).debug(
             'DeepScan.scan: searches=%s', str(self.searches))
         import time
         yield_time = time.time()
+        workers = self.workers
+        if workers is None:
+            workers = bleachbit.deep_scan_workers
 
-        for (top, searches) in self.searches.items():
-            compiled_searches = []
-            for s in searches:
-                compiled_searches.append(CompiledSearch(s))
-
-            for (dirpath, dirnames, filenames) in normalized_walk(top):
-                for c in compiled_searches:
-                    # fixme, don't match filename twice
-                    for filename in filenames:
-                        full_name = c.match(dirpath, filename)
-                        if full_name is not None:
-                            # fixme: support other commands
-                            if c.command == 'delete':
-                                yield Command.Delete(full_name)
-                            elif c.command == 'shred':
-                                yield Command.Shred(full_name)
+        for (top, roots) in consolidate_roots(self.searches).items():
+            if planned is not None and top in planned and \
+                    planned[top][0] == roots:
+                # The tree was walked ahead of time, and some matches may
+                # have been deleted or queued for shredding since, so
+                # check each one just before its command.
+                results = [(match for match in planned[top][1]
+                            if os.path.lexists(match[0]) and
+                            not FileUtilities.shred_pending(match[0]))]
+            elif workers > 1:
+                results = self.match_parallel(top, roots, workers)
+            else:
+                results = match_walk(top, roots, normalized_walk(top))
+            for matches in results:
+                # fixme: support other commands
+                for (full_name, command) in matches:
+                    if command == 'delete':
+                        yield Command.Delete(full_name)
+                    elif command == 'shred':
+                        yield Command.Shred(full_name)
 
                 if time.time() - yield_time > 0.25:
                     # allow GTK+ to process the idle loop
                     yield True
                     yield_time = time.time()
+
+    def match_parallel(self, top, roots, workers):
+        """Implement match_walk() for 'top' with a pool of threads
+
+        Each worker walks one top-level subdirectory and streams its
+        matches through a bounded queue.  The subdirectories are read
+        back in sorted order, so the results are in the same order as
+        match_walk().  While waiting, this yields empty lists, and
+        closing the generator stops the workers."""
+        import queue
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        walk = normalized_walk(top)
+        try:
+            (dirpath, dirnames, filenames) = next(walk)
+        except StopIteration:
+            return
+        walk.close()
+        excluded = {}
+        for matches in match_walk(top, roots, [(top, dirnames, filenames)],
+                                  excluded):
+            yield matches
+        # The walk does not follow symlinks, so do not walk them here.
+        subdirs = [os.path.join(top, dirname) for dirname in dirnames
+                   if not os.path.islink(os.path.join(top, dirname))]
+        if not subdirs:
+            return
+
+        stop = threading.Event()
+
+        def put(results, item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def walk_subdir(subdir, results):
+            try:
+                subdir_excluded = {}
+                if subdir in excluded:
+                    subdir_excluded[subdir] = excluded[subdir]
+                for matches in match_walk(top, roots, normalized_walk(subdir),
+                                          subdir_excluded):
+                    if stop.is_set():
+                        return
+                    if matches:
+                        put(results, matches)
+            finally:
+                # tell the reader that this subdirectory is done
+                put(results, None)
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        tasks = []
+        try:
+            for subdir in subdirs:
+                results = queue.Queue(maxsize=self.queue_size)
+                tasks.append(
+                    (executor.submit(walk_subdir, subdir, results), results))
+            for (future, results) in tasks:
+                while True:
+                    try:
+                        matches = results.get(timeout=0.25)
+                    except queue.Empty:
+                        # let the caller keep the GUI responsive
+                        yield []
+                        continue
+                    if matches is None:
+                        break
+                    yield matches
+                # raise any exception from the worker
+                future.result()
+        finally:
+            stop.set()
+            for (future, results) in tasks:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+class WalkPlan:
+
+    """Walk each shared tree once for the walks and deep scans of a run
+
+    Worker registers the (search, path) keys of the walk searches and
+    the deep scan searches.  Where they share a tree, run() reads the
+    tree once.  It puts the walks into FileUtilities.scan_cache, where
+    the providers find them, and it keeps the deep scan matches for
+    DeepScan.scan() in the module variable planned.  The commands
+    still come from the providers and the deep scan in the usual order.
+    A tree with only one walk is left alone."""
+
+    def __init__(self, walks, deepscans, workers=1):
+        """Create a plan for the list of (search, path) keys 'walks' and
+        for 'deepscans', a dictionary mapping each root to a list of
+        searches"""
+        self.walks = walks
+        self.deepscans = deepscans
+        self.workers = workers
+        # directory -> list_directory() result, for directories in walks
+        self.listings = {}
+        # walk roots which were read by run()
+        self.planned_roots = set()
+        # deep scan top -> (roots, list of (full path, command))
+        self.matches = {}
+
+    @staticmethod
+    def walk_root(path):
+        """Return the root to plan for a walk of 'path', or None
+
+        The walk must give the same paths as walking 'path' itself, so
+        the path must not pass through a symlink."""
+        normalized = os.path.normpath(os.path.abspath(path))
+        if path not in (normalized, normalized + os.sep) or \
+                normalized != os.path.realpath(path) or \
+                not os.path.isdir(normalized):
+            return None
+        return normalized
+
+    def run(self, scan_cache):
+        """Walk the shared trees, yielding True to keep the GUI alive"""
+        import time
+        yield_time = time.time()
+        walk_roots = {}
+        for key in self.walks:
+            for expanded in scan_cache.iglob(key[1]):
+                root = self.walk_root(expanded)
+                if root is not None:
+                    walk_roots.setdefault(root, []).append(key)
+        deep_tops = consolidate_roots(self.deepscans)
+        subscribers = {root: list(keys) for (root, keys) in walk_roots.items()}
+        for (top, roots) in deep_tops.items():
+            subscribers.setdefault(top, []).append(('deep', top))
+        for (top, roots) in consolidate_roots(subscribers).items():
+            keys = [key for root_keys in roots.values() for key in root_keys]
+            if len(keys) < 2 or all('deep' == key[0] for key in keys):
+                continue
+            these_walk_roots = [root for root in roots if root in walk_roots]
+            these_deep_tops = [root for root in roots if root in deep_tops]
+            deep_roots = {}
+            for deep_top in these_deep_tops:
+                deep_roots.update(deep_tops[deep_top])
+            excluded = {}
+            walk = self.walk(top, these_walk_roots, deep_roots, excluded)
+            if deep_roots:
+                results = match_walk(top, deep_roots, walk, excluded)
+            else:
+                results = ([] for dummy in walk)
+            matches = []
+            for found in results:
+                matches.extend(found)
+                if time.time() - yield_time > 0.25:
+                    yield True
+                    yield_time = time.time()
+            self.planned_roots.update(these_walk_roots)
+            for deep_top in these_deep_tops:
+                self.matches[deep_top] = (
+                    deep_tops[deep_top],
+                    [match for match in matches if is_under(match[0], deep_top)])
+        # Fill the scan cache for the keys with a planned root.
+        for key in self.walks:
+            if any(key in walk_roots[root] for root in self.planned_roots):
+                for dummy in scan_cache.cached(key, self.walk_func(key[0], scan_cache)):
+                    pass
+        yield True
+
+    def walk(self, top, walk_roots, deep_roots, excluded):
+        """Walk 'top' like os.walk() with sorted directories
+
+        Yield (dirpath, dirnames, filenames).  After the caller prunes
+        dirnames, descend into the directories which a walk or a deep
+        scan needs.  Keep the listings of directories under a walk.
+
+        A directory which the deep scan pruned but a walk needs is
+        walked with every deep search in 'excluded', as in match_walk()."""
+        list_directory = FileUtilities.list_directory
+        executor = None
+        if self.workers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(max_workers=self.workers)
+
+        def submit(path):
+            if executor is None:
+                return path
+            # list the directory while the caller works on others
+            return executor.submit(list_directory, path)
+
+        def needed(path, roots):
+            return any(is_under(path, root) or is_under(root, path)
+                       for root in roots)
+
+        darwin = 'Darwin' == platform.system()
+        every_search = frozenset(
+            s for searches in deep_roots.values() for s in searches)
+        # directories beneath a pruned directory
+        dead = set()
+        stack = [(top, submit(top))]
+        try:
+            while stack:
+                (dirpath, pending) = stack.pop()
+                if executor is None:
+                    listing = list_directory(pending)
+                else:
+                    listing = pending.result()
+                if listing is None:
+                    continue
+                (dir_entries, file_entries, walk_into) = listing
+                if any(is_under(dirpath, root) for root in walk_roots):
+                    self.listings[dirpath] = listing
+                subdirs = {os.path.basename(path): path for path in walk_into}
+                dirnames = sorted(subdirs)
+                filenames = [entry.name for entry in file_entries]
+                if darwin:
+                    filenames = [unicodedata.normalize('NFC', fn)
+                                 for fn in filenames]
+                yield (dirpath, dirnames, filenames)
+                kept = set(dirnames)
+                descend = []
+                for name in sorted(subdirs):
+                    path = subdirs[name]
+                    deep = needed(path, deep_roots)
+                    if deep and name in kept and dirpath not in dead:
+                        descend.append(path)
+                    elif needed(path, walk_roots):
+                        descend.append(path)
+                        if deep:
+                            dead.add(path)
+                            excluded[path] = every_search
+                dead.discard(dirpath)
+                stack.extend(reversed([(path, submit(path)) for path in descend]))
+        finally:
+            if executor is not None:
+                for (path, pending) in stack:
+                    pending.cancel()
+                executor.shutdown(wait=False)
+
+    def entries(self, top):
+        """Like FileUtilities.walk_entries(top) from the kept listings"""
+        stack = [top]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, tuple):
+                yield item
+                continue
+            listing = self.listings.get(item)
+            if listing is None:
+                continue
+            (dir_entries, file_entries, walk_into) = listing
+            stack.append((item, dir_entries, file_entries))
+            stack.extend(reversed(walk_into))
+
+    def walk_func(self, search, scan_cache):
+        """Return a function to walk a path like FileActionProvider"""
+        def func(input_path):
+            for expanded in scan_cache.iglob(input_path):
+                root = self.walk_root(expanded)
+                if root in self.planned_roots:
+                    walk = self.entries(root)
+                else:
+                    walk = FileUtilities.walk_entries(
+                        expanded, bleachbit.walk_workers)
+                for (dirpath, dir_entries, file_entries) in walk:
+                    if 'walk.files' != search:
+                        for entry in dir_entries:
+                            yield FileUtilities.FileRecord(entry)
+                    for entry in file_entries:
+                        yield FileUtilities.FileRecord(entry)
+            if 'walk.top' == search and os.path.exists(input_path):
+                yield input_path
+        return func
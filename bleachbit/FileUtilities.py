@@ -27,7 +27,9 @@ import bleachbit
 from bleachbit import _
 
 import atexit
+import collections
 import errno
+import fnmatch
 import glob
 import locale
 import logging
@@ -40,6 +42,7 @@ import string
 import sys
 import subprocess
 import tempfile
+import threading
 import time
 
 logger = logging.getLogger(__name__)
@@ -68,12 +71,13 @@ try:
 
         scandir.scandir = scandir.scandir_python
         scandir.DirEntry = scandir.Win32DirEntryPython = _Win32DirEntryPython
+    from scandir import scandir
 except ImportError:
     if sys.version_info < (3, 5, 0):
         # Python 3.5 incorporated scandir
         logger.warning(
             'scandir is not available, so falling back to slower os.walk()')
-    from os import walk
+    from os import walk, scandir
 
 
 def open_files_linux():
@@ -109,11 +113,19 @@ def open_files():
 
 class OpenFiles:
 
-    """Cached way to determine whether a file is open by active process"""
+    """Cached way to determine whether a file is open by active process
+
+    Open files are indexed by (st_dev, st_ino), so a lookup is one set
+    membership test. On Linux the index is refreshed per process: the
+    descriptor links are read again, but only a descriptor whose target
+    changed is stat-ed again."""
 
     def __init__(self):
         self.last_scan_time = None
-        self.files = []
+        # set of (st_dev, st_ino) of open files
+        self.files = set()
+        # pid -> {fd: (link target, (st_dev, st_ino) or None)}
+        self.pids = {}
 
     def file_qualifies(self, filename):
         """Return boolean whether filename qualifies to enter cache (check \
@@ -121,19 +133,258 @@ class OpenFiles:
         return not filename.startswith("/dev") and \
             not filename.startswith("/proc")
 
+    def scan_pid(self, pid, old_fds):
+        """Return the open descriptors of one process
+
+        Descriptors with the same target as in old_fds keep their inode
+        without another stat()."""
+        fd_dir = '/proc/%s/fd' % pid
+        fds = {}
+        try:
+            fd_names = os.listdir(fd_dir)
+        except OSError:
+            # process exited, or permission denied
+            return fds
+        for fd in fd_names:
+            fd_path = fd_dir + '/' + fd
+            try:
+                target = os.readlink(fd_path)
+            except OSError:
+                continue
+            old = old_fds.get(fd)
+            if old is not None and old[0] == target:
+                fds[fd] = old
+                continue
+            key = None
+            # Skip pipes, sockets, etc. which do not look like paths.
+            if target.startswith('/') and self.file_qualifies(target):
+                try:
+                    st = os.stat(fd_path)
+                except OSError:
+                    pass
+                else:
+                    key = (st.st_dev, st.st_ino)
+            fds[fd] = (target, key)
+        return fds
+
     def scan(self):
         """Update cache"""
         self.last_scan_time = time.time()
-        self.files = []
-        for filename in open_files():
-            if self.file_qualifies(filename):
-                self.files.append(filename)
+        files = set()
+        if sys.platform.startswith('linux'):
+            pids = {}
+            for pid in os.listdir('/proc'):
+                if not pid.isdigit():
+                    continue
+                fds = self.scan_pid(pid, self.pids.get(pid, {}))
+                pids[pid] = fds
+                files.update(key for (_target, key) in fds.values() if key)
+            self.pids = pids
+        else:
+            for filename in open_files():
+                if not self.file_qualifies(filename):
+                    continue
+                try:
+                    st = os.stat(filename)
+                except OSError:
+                    continue
+                files.add((st.st_dev, st.st_ino))
+        self.files = files
 
     def is_open(self, filename):
         """Return boolean whether filename is open by running process"""
         if self.last_scan_time is None or (time.time() - self.last_scan_time) > 10:
             self.scan()
-        return os.path.realpath(filename) in self.files
+        try:
+            st = lstat(filename)
+            if stat.S_ISLNK(st.st_mode):
+                st = os.stat(filename)
+        except OSError:
+            return False
+        return (st.st_dev, st.st_ino) in self.files
+
+
+class ScanCache:
+
+    """Bounded cache of directory walks and globs
+
+    Many cleaners search the same directories, such as the profile
+    directories of browsers based on Chromium. While Worker sets
+    scan_cache, a walk or glob keyed by (search, path) is done once
+    and replayed from here. The least recently used entries are
+    dropped first. When a file is deleted beneath a cached root, the
+    entry is dropped, because it would list the deleted file.
+
+    It also answers lexists() and iglob() for many paths in the same
+    directories, such as ~/.config/google-chrome/Default, by listing
+    each directory once and looking up names in the listing.
+
+    It is safe to use from several threads."""
+
+    # number of directory listings to keep
+    max_listings = 4096
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or bleachbit.scan_cache_size
+        # (search, path) -> (root, list of paths)
+        self.entries = collections.OrderedDict()
+        # directory -> {name: DirEntry}, or None if it cannot be listed
+        self.listings = collections.OrderedDict()
+        # keys being built -> root
+        self.building = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def root(pathname):
+        """Return the directory above the first glob character"""
+        parts = pathname.split(os.sep)
+        for i, part in enumerate(parts):
+            if re.search(r'[?*\[\]]', part):
+                return os.sep.join(parts[:i]) or os.sep
+        return pathname.rstrip(os.sep) or os.sep
+
+    def get(self, key):
+        """Return the list of paths for the key, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def cached(self, key, func):
+        """Yield the paths of func(), from the cache if possible"""
+        paths = self.get(key)
+        if paths is not None:
+            yield from (path for path in paths if not shred_pending(path))
+            return
+        root = self.root(key[1])
+        paths = []
+        with self.lock:
+            self.building[key] = root
+        complete = False
+        try:
+            for path in func(key[1]):
+                paths.append(path)
+                if not shred_pending(path):
+                    yield path
+            complete = True
+        finally:
+            with self.lock:
+                # A deletion beneath the root while walking removed the
+                # key, and a caller stopping early leaves it incomplete.
+                if self.building.pop(key, None) is not None and complete:
+                    self.entries[key] = (root, paths)
+                    self.entries.move_to_end(key)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+
+    def listdir(self, dirname):
+        """Return {name: DirEntry} for the directory, or None"""
+        with self.lock:
+            if dirname in self.listings:
+                self.listings.move_to_end(dirname)
+                return self.listings[dirname]
+        try:
+            with os.scandir(dirname) as it:
+                listing = {entry.name: entry for entry in it}
+        except OSError:
+            # Missing directories have no names. Others, such as
+            # those with permission to enter but not to list, are
+            # left to os.path.lexists().
+            listing = {} if not os.path.isdir(dirname) else None
+        with self.lock:
+            self.listings[dirname] = listing
+            while len(self.listings) > self.max_listings:
+                self.listings.popitem(last=False)
+        return listing
+
+    def lexists(self, path):
+        """Like os.path.lexists() but from the listing of the parent"""
+        if shred_pending(path):
+            return False
+        if 'posix' != os.name or not os.path.isabs(path):
+            return os.path.lexists(path)
+        (dirname, name) = os.path.split(path)
+        if name in ('', '.', '..'):
+            return os.path.lexists(path)
+        listing = self.listdir(dirname)
+        if listing is None:
+            return os.path.lexists(path)
+        return name in listing
+
+    def iglob(self, pathname, dironly=False):
+        """Like glob.iglob() but from directory listings"""
+        if 'posix' != os.name or not os.path.isabs(pathname) or \
+                pathname.endswith(os.sep):
+            yield from glob.iglob(pathname)
+            return
+        if not glob.has_magic(pathname):
+            if self.lexists(pathname):
+                yield pathname
+            return
+        (dirname, basename) = os.path.split(pathname)
+        if glob.has_magic(dirname):
+            dirs = self.iglob(dirname, True)
+        else:
+            dirs = (dirname, )
+        for dirname in dirs:
+            if not glob.has_magic(basename):
+                path = os.path.join(dirname, basename)
+                if self.lexists(path):
+                    yield path
+                continue
+            listing = self.listdir(dirname)
+            if not listing:
+                continue
+            for (name, entry) in list(listing.items()):
+                if name.startswith('.') and not basename.startswith('.'):
+                    # hidden
+                    continue
+                if not fnmatch.fnmatchcase(name, basename):
+                    continue
+                if dironly:
+                    try:
+                        if not entry.is_dir():
+                            continue
+                    except OSError:
+                        continue
+                path = os.path.join(dirname, name)
+                if not shred_pending(path):
+                    yield path
+
+    def invalidate(self, path, removed=True, tree=False):
+        """Forget walks and listings affected by deleting the path
+
+        If removed is False, the path itself remains. If tree is True,
+        everything below it may be gone."""
+
+        def affected(root):
+            return path == root or \
+                path.startswith(root.rstrip(os.sep) + os.sep) or \
+                root.startswith(path + os.sep)
+        with self.lock:
+            for key in [key for (key, (root, _paths)) in self.entries.items()
+                        if affected(root)]:
+                del self.entries[key]
+            for key in [key for (key, root) in self.building.items()
+                        if affected(root)]:
+                del self.building[key]
+            self.listings.pop(path, None)
+            if tree:
+                prefix = path.rstrip(os.sep) + os.sep
+                for dirname in [dirname for dirname in self.listings
+                                if dirname.startswith(prefix)]:
+                    del self.listings[dirname]
+            if removed:
+                (dirname, name) = os.path.split(path)
+                listing = self.listings.get(dirname)
+                if listing:
+                    listing.pop(name, None)
 
 
 def __random_string(length):
@@ -179,19 +430,176 @@ def bytes_to_human(bytes_i):
     return 'A lot.'
 
 
-def children_in_directory(top, list_directories=False):
-    """Iterate files and, optionally, subdirectories in directory"""
+class FileRecord(str):
+
+    """Pathname found by walking a directory
+
+    This is a string, so it works anywhere a pathname works, but it
+    also keeps the directory entry from scandir(). The file type comes
+    from the directory listing, and the lstat() result is fetched at most
+    once, so the walk, the filters, and the Command can share it instead
+    of each asking the kernel again."""
+
+    def __new__(cls, entry):
+        record = str.__new__(cls, entry.path)
+        record.entry = entry
+        record._lstat = None
+        return record
+
+    def is_dir(self):
+        """Return whether it is a directory, following symlinks like os.path.isdir()"""
+        try:
+            return self.entry.is_dir()
+        except OSError:
+            return False
+
+    def is_file(self):
+        """Return whether it is a regular file, following symlinks like os.path.isfile()"""
+        try:
+            return self.entry.is_file()
+        except OSError:
+            return False
+
+    def is_symlink(self):
+        """Return whether it is a symlink like os.path.islink()"""
+        try:
+            return self.entry.is_symlink()
+        except OSError:
+            return False
+
+    def lstat(self):
+        """Return the cached os.lstat() result"""
+        if self._lstat is None:
+            self._lstat = self.entry.stat(follow_symlinks=False)
+        return self._lstat
+
+
+def lstat(path):
+    """Like os.lstat(), but reuse the result cached in a FileRecord"""
+    if isinstance(path, FileRecord):
+        return path.lstat()
+    return os.lstat(path)
+
+
+def list_directory(path, prune=None):
+    """List one directory for walk_entries()
+
+    Return a 3-tuple (dir_entries, file_entries, walk_into) where
+    walk_into lists the subdirectories to descend into, or return None
+    if the directory cannot be listed. A subdirectory whose name
+    matches the function prune is left out entirely."""
+    try:
+        entries = list(scandir(path))
+    except OSError:
+        return None
+    dir_entries = []
+    file_entries = []
+    walk_into = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if not is_dir:
+            file_entries.append(entry)
+            continue
+        if prune is not None and prune(entry.name):
+            continue
+        dir_entries.append(entry)
+        try:
+            is_symlink = entry.is_symlink()
+        except OSError:
+            is_symlink = False
+        if not is_symlink:
+            walk_into.append(entry.path)
+    return dir_entries, file_entries, walk_into
+
+
+def walk_entries(top, workers=1, prune=None):
+    """Walk the directory tree bottom up like os.walk(top, topdown=False)
+
+    Yield a 3-tuple (dirpath, dir_entries, file_entries) where the entries
+    are the directory entries from scandir(). Like os.walk(), errors are
+    ignored, and symlinks to directories are listed but not followed.
+
+    With more than one worker, a thread pool lists the subdirectories
+    ahead of time, which helps when each listing waits on the disk or
+    the network. The order of the results is the same either way.
+
+    Subdirectories whose names match the function prune, such as the
+    search method of a compiled regex, are neither listed nor walked."""
+    if workers > 1:
+        for result in walk_entries_parallel(top, workers, prune):
+            yield result
+        return
+    stack = [top]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, tuple):
+            # all the subdirectories are done, so now yield the parent
+            yield item
+            continue
+        listing = list_directory(item, prune)
+        if listing is None:
+            continue
+        (dir_entries, file_entries, walk_into) = listing
+        stack.append((item, dir_entries, file_entries))
+        # reverse, so the first subdirectory is walked first
+        stack.extend(reversed(walk_into))
+
+
+def walk_entries_parallel(top, workers, prune=None):
+    """Implement walk_entries() with a pool of threads"""
+    from concurrent.futures import ThreadPoolExecutor
+    executor = ThreadPoolExecutor(max_workers=workers)
+    # Pending directories are 2-tuples (dirpath, future), and finished
+    # directories are 3-tuples ready to yield.
+    stack = [(top, executor.submit(list_directory, top, prune))]
+    try:
+        while stack:
+            item = stack.pop()
+            if 3 == len(item):
+                # all the subdirectories are done, so now yield the parent
+                yield item
+                continue
+            (dirpath, future) = item
+            listing = future.result()
+            if listing is None:
+                continue
+            (dir_entries, file_entries, walk_into) = listing
+            stack.append((dirpath, dir_entries, file_entries))
+            # Fan out: while this thread descends into the first
+            # subdirectory, the pool lists its siblings.
+            pending = [(path, executor.submit(list_directory, path, prune))
+                       for path in walk_into]
+            stack.extend(reversed(pending))
+    finally:
+        # If the caller stops early, do not list the rest of the tree.
+        for item in stack:
+            if 2 == len(item):
+                item[1].cancel()
+        executor.shutdown(wait=False)
+
+
+def children_in_directory(top, list_directories=False, workers=1, prune=None):
+    """Iterate files and, optionally, subdirectories in directory
+
+    Each pathname is a FileRecord. Children come before their
+    parent directory, so it is safe to delete them in order.
+
+    With workers greater than one, walk the tree in parallel. Skip
+    subdirectories whose names match the function prune."""
     if type(top) is tuple:
         for top_ in top:
-            for pathname in children_in_directory(top_, list_directories):
+            for pathname in children_in_directory(top_, list_directories, workers, prune):
                 yield pathname
         return
-    for (dirpath, dirnames, filenames) in walk(top, topdown=False):
+    for (dirpath, dir_entries, file_entries) in walk_entries(top, workers, prune):
         if list_directories:
-            for dirname in dirnames:
-                yield os.path.join(dirpath, dirname)
-        for filename in filenames:
-            yield os.path.join(dirpath, filename)
+            for entry in dir_entries:
+                yield FileRecord(entry)
+        for entry in file_entries:
+            yield FileRecord(entry)
 
 
 def clean_ini(path, section, parameter):
@@ -291,6 +699,215 @@ def clean_json(path, target):
             json.dump(js, f)
 
 
+def regex_literals(pattern, max_literals=64):
+    """Return what a regex for file names tests, if it is only literals
+
+    Return a 3-tuple (literals, start, end) where literals is a set of
+    strings, and start and end say whether a match must be at the
+    start or the end of the name. Character classes like [nop] and
+    groups like (jpg|png) are expanded into the set. This accepts
+    the output of fnmatch.translate(), such as (?s:.*\.tmp)\Z.
+
+    Return None for anything else, or if the set would be too large."""
+
+    class NotLiteral(Exception):
+        pass
+
+    def escaped(text, index):
+        """Return whether the character at index is escaped"""
+        backslashes = 0
+        while index - backslashes > 0 and '\\' == text[index - backslashes - 1]:
+            backslashes += 1
+        return 1 == backslashes % 2
+
+    def alternation(text, i):
+        literals, i = sequence(text, i)
+        alternatives = [literals]
+        while i < len(text) and '|' == text[i]:
+            literals, i = sequence(text, i + 1)
+            alternatives.append(literals)
+        return set().union(*alternatives), i, len(alternatives)
+
+    def sequence(text, i):
+        literals = {''}
+        while i < len(text) and text[i] not in ')|':
+            c = text[i]
+            if '\\' == c:
+                if i + 1 == len(text) or text[i + 1].isalnum():
+                    raise NotLiteral
+                chars = {text[i + 1]}
+                i += 2
+            elif '[' == c:
+                j = text.find(']', i + 2)
+                content = text[i + 1:j]
+                if j < 0 or any(x in content for x in '\\^['):
+                    raise NotLiteral
+                chars = set()
+                k = 0
+                while k < len(content):
+                    if k + 2 < len(content) and '-' == content[k + 1]:
+                        # a range such as 0-9
+                        chars.update(chr(x) for x in
+                                     range(ord(content[k]), ord(content[k + 2]) + 1))
+                        k += 3
+                    else:
+                        chars.add(content[k])
+                        k += 1
+                if not chars:
+                    raise NotLiteral
+                i = j + 1
+            elif '(' == c:
+                if text.startswith('(?:', i):
+                    i += 3
+                elif text.startswith('(?', i):
+                    raise NotLiteral
+                else:
+                    i += 1
+                chars, i, dummy = alternation(text, i)
+                if i == len(text) or ')' != text[i]:
+                    raise NotLiteral
+                i += 1
+            elif c in '.^$*+?{}]':
+                raise NotLiteral
+            else:
+                chars = {c}
+                i += 1
+            if i < len(text) and text[i] in '*+?{':
+                # a quantifier
+                raise NotLiteral
+            literals = {a + b for a in literals for b in chars}
+            if len(literals) > max_literals:
+                raise NotLiteral
+        return literals, i
+
+    start = pattern.startswith('^')
+    body = pattern[1:] if start else pattern
+    end = False
+    if body.endswith('\\Z') and escaped(body, len(body) - 1):
+        (body, end) = (body[:-2], True)
+    elif body.endswith('$') and not escaped(body, len(body) - 1):
+        (body, end) = (body[:-1], True)
+    # An anchor or .* next to an alternation belongs to one alternative.
+    ungrouped = start or end
+    if body.startswith('(?s:') and body.endswith(')') and \
+            not escaped(body, len(body) - 1):
+        # the wrapper from fnmatch.translate()
+        (body, ungrouped) = (body[4:-1], False)
+    if body.startswith('.*'):
+        (body, start, ungrouped) = (body[2:], False, True)
+    if body.endswith('.*') and not escaped(body, len(body) - 2):
+        (body, end, ungrouped) = (body[:-2], False, True)
+    try:
+        literals, i, n_alternatives = alternation(body, 0)
+    except NotLiteral:
+        return None
+    if i != len(body) or (n_alternatives > 1 and ungrouped):
+        return None
+    if not literals or '' in literals or any('\n' in x for x in literals):
+        return None
+    return (frozenset(literals), start, end)
+
+
+def is_ascii_encodable(s):
+    """Return whether the string has only ASCII characters"""
+    try:
+        s.encode('ascii')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+# str.isascii() is new in Python 3.7
+is_ascii = getattr(str, 'isascii', is_ascii_encodable)
+
+
+class LiteralRegex:
+
+    """A regex for file names lowered to string tests
+
+    search() gives the same answer as the search() of the compiled
+    regex, but it tests for an exact name, a prefix, a suffix or a
+    substring with set membership, str.startswith(), str.endswith() or
+    the in operator. Names with a newline and, when ignoring case,
+    names with non-ASCII characters go to the regex."""
+
+    def __init__(self, regex, literals, start, end):
+        self.regex = regex
+        self.pattern = regex.pattern
+        self.flags = regex.flags
+        self.ignorecase = bool(regex.flags & re.IGNORECASE)
+        if self.ignorecase:
+            literals = frozenset(x.lower() for x in literals)
+        self.literals = literals
+        self.start = start
+        self.end = end
+        affixes = tuple(sorted(literals))
+        # Build search() as a closure, which is faster than a method.
+        regex_search = regex.search
+        if start and end:
+            test = literals.__contains__
+        elif end:
+            def test(name):
+                return name.endswith(affixes)
+        elif start:
+            def test(name):
+                return name.startswith(affixes)
+        else:
+            def test(name):
+                return any(literal in name for literal in affixes)
+        if self.ignorecase:
+            def search(name):
+                if '\n' in name or not is_ascii(name):
+                    return regex_search(name) is not None
+                return test(name.lower())
+        elif end or '.*' in self.pattern:
+            # $ also matches before a final newline, and .* stops at one
+            def search(name):
+                if '\n' in name:
+                    return regex_search(name) is not None
+                return test(name)
+        else:
+            search = test
+        self.search = search
+
+    def __repr__(self):
+        return 'LiteralRegex(%r)' % self.pattern
+
+
+regex_cache = {}
+
+
+def compile_regex(pattern, flags=None):
+    """Compile a regex for file names, such as regex="..." in CleanerML
+
+    Some regexes which only test for literal strings become a
+    LiteralRegex: exact names, where a set lookup beats trying each
+    alternative, and patterns starting with .* like those from
+    fnmatch.translate(), which re retries at every position. For other
+    literals, re is as fast as a string test called from Python, so
+    they stay with re. Either way, the result has search().
+
+    The results are cached and shared by all callers. By default, the
+    flags are bleachbit.fs_scan_re_flags."""
+    if flags is None:
+        flags = bleachbit.fs_scan_re_flags
+    key = (pattern, flags)
+    compiled = regex_cache.get(key)
+    if compiled is None:
+        compiled = re.compile(pattern, flags)
+        literals = None
+        if not flags & (re.MULTILINE | re.VERBOSE):
+            literals = regex_literals(pattern)
+        if literals is not None and not \
+                (flags & re.IGNORECASE and not all(is_ascii(x) for x in literals[0])):
+            (dummy, start, end) = literals
+            body = pattern[4:] if pattern.startswith('(?s:') else pattern
+            if (start and end) or body.startswith('.*'):
+                compiled = LiteralRegex(compiled, *literals)
+        regex_cache[key] = compiled
+    return compiled
+
+
 def delete(path, shred=False, ignore_missing=False, allow_shred=True):
     """Delete path that is either file, directory, link or FIFO.
 
@@ -301,53 +918,49 @@ def delete(path, shred=False, ignore_missing=False, allow_shred=True):
     is_special = False
     path = extended_path(path)
     do_shred = allow_shred and (shred or options.get('shred'))
-    if not os.path.lexists(path):
+    if scan_cache is not None:
+        scan_cache.invalidate(path)
+    if 'posix' == os.name:
+        # One lstat() tells both whether the path exists and its type.
+        # It is not taken from a walk, because the path may have been
+        # replaced, such as by a symlink, since then.
+        try:
+            mode = os.lstat(path).st_mode
+        except (OSError, ValueError):
+            mode = None
+        exists = mode is not None
+    else:
+        mode = None
+        exists = os.path.lexists(path)
+    if exists and shred_pending(path):
+        # It is already overwritten and only waits for its removal.
+        exists = False
+    if not exists:
         if ignore_missing:
             return
         raise OSError(2, 'No such file or directory', path)
-    if 'posix' == os.name:
+    if mode is not None:
+        is_special = stat.S_ISFIFO(mode) or stat.S_ISLNK(mode)
+        is_dir = stat.S_ISDIR(mode)
+        is_file = stat.S_ISREG(mode)
+    else:
         # With certain (relatively rare) files on Windows os.lstat()
         # may return Access Denied
-        mode = os.lstat(path)[stat.ST_MODE]
-        is_special = stat.S_ISFIFO(mode) or stat.S_ISLNK(mode)
+        is_dir = os.path.isdir(path)
+        is_file = os.path.isfile(path)
     if is_special:
         os.remove(path)
-    elif os.path.isdir(path):
-        delpath = path
-        if do_shred:
-            if not is_dir_empty(path):
-                # Avoid renaming non-empty directory like https://github.com/bleachbit/bleachbit/issues/783
-                logger.info(_("Directory is not empty: %s"), path)
-                return
-            delpath = wipe_name(path)
-        try:
-            os.rmdir(delpath)
-        except OSError as e:
-            # [Errno 39] Directory not empty
-            # https://bugs.launchpad.net/bleachbit/+bug/1012930
-            if errno.ENOTEMPTY == e.errno:
-                logger.info(_("Directory is not empty: %s"), path)
-            elif errno.EBUSY == e.errno:
-                if os.name == 'posix' and os.path.ismount(path):
-                    logger.info(_("Skipping mount point: %s"), path)
-                else:
-                    logger.info(_("Device or resource is busy: %s"), path)
-            else:
-                raise
-        except WindowsError as e:
-            # WindowsError: [Error 145] The directory is not empty:
-            # 'C:\\Documents and Settings\\username\\Local Settings\\Temp\\NAILogs'
-            # Error 145 may happen if the files are scheduled for deletion
-            # during reboot.
-            if 145 == e.winerror:
-                logger.info(_("Directory is not empty: %s"), path)
-            else:
-                raise
-    elif os.path.isfile(path):
+    elif is_dir and shred_batch is not None and shred_batch.paths:
+        # Files in this directory may still wait in the batch.
+        shred_batch.add(path, True, do_shred)
+    elif is_dir:
+        delete_directory(path, do_shred)
+    elif is_file:
         # wipe contents
         if do_shred:
+            batch = shred_batch if 'posix' == os.name else None
             try:
-                wipe_contents(path)
+                wipe_contents(path, truncate=batch is None, sync=batch is None)
             except pywinerror as e:
                 # 2 = The system cannot find the file specified.
                 # This can happen with a broken symlink
@@ -359,6 +972,10 @@ def delete(path, shred=False, ignore_missing=False, allow_shred=True):
                 # permission denied (13) happens shredding MSIE 8 on Windows 7
                 logger.debug("IOError #%s shredding '%s'",
                              e.errno, path, exc_info=True)
+            if batch is not None:
+                # The batch syncs, then wipes the name.
+                batch.add(path, False, True)
+                return
             # wipe name
             os.remove(wipe_name(path))
         else:
@@ -370,6 +987,298 @@ def delete(path, shred=False, ignore_missing=False, allow_shred=True):
         logger.info(_("Special file type cannot be deleted: %s"), path)
 
 
+# Whether delete_tree() can work relative to directory file descriptors
+delete_tree_supported = os.unlink in os.supports_dir_fd and \
+    os.rmdir in os.supports_dir_fd and os.rename in os.supports_dir_fd and \
+    os.scandir in os.supports_fd
+
+
+def delete_tree(top, include_top=False, shred=False, really_delete=True,
+                whitelisted=None):
+    """Delete the contents of a directory, and optionally the directory
+
+    Every file and directory is opened, deleted or renamed by its name
+    relative to an open file descriptor of its parent directory. That
+    avoids looking up the full path again for each file, and a parent
+    directory renamed during the deletion cannot redirect it elsewhere.
+    Symlinks are deleted but not followed.
+
+    Yield (path, lstat result, whitelisted) for each file and directory
+    deleted, or to be deleted if really_delete is False, with children
+    before their parents. Paths for which the whitelisted function
+    returns True are yielded but kept. Errors are logged, and the
+    deletion continues without yielding the path.
+
+    If shred, the files in a directory are overwritten, their file
+    system is synced once, and then they are truncated and their
+    names are wiped, as in ShredBatch."""
+    dir_flags = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0)
+
+    def open_write(dir_fd, name):
+        """Open a file for writing, like wipe_contents() even if read-only"""
+        flags = os.O_WRONLY | os.O_NOFOLLOW
+        try:
+            return os.open(name, flags, dir_fd=dir_fd)
+        except OSError as e:
+            if e.errno != errno.EACCES:
+                raise
+            try:
+                os.chmod(name, 0o200, dir_fd=dir_fd, follow_symlinks=False)
+            except NotImplementedError:
+                # The platform can only change the mode through a symlink.
+                raise e
+        return os.open(name, flags, dir_fd=dir_fd)
+
+    def remove_files(dir_fd, dir_path, files):
+        """Remove files in one directory, yielding the results"""
+        if shred and really_delete:
+            for (name, st) in files:
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                try:
+                    fd = open_write(dir_fd, name)
+                except OSError as e:
+                    logger.debug("Error #%s shredding '%s'", e.errno,
+                                 os.path.join(dir_path, name))
+                    continue
+                try:
+                    size = (st.st_blocks * 512 + 4095) // 4096 * 4096
+                    for _done in overwrite_fd(fd, size, sync=False):
+                        pass
+                finally:
+                    os.close(fd)
+            # one sync for the whole group
+            if not syncfs(dir_fd):
+                sync()
+        for (name, st) in files:
+            path = os.path.join(dir_path, name)
+            if really_delete:
+                try:
+                    if shred:
+                        if stat.S_ISREG(st.st_mode):
+                            fd = open_write(dir_fd, name)
+                            try:
+                                os.ftruncate(fd, 0)
+                            finally:
+                                os.close(fd)
+                        name = wipe_name(name, dir_fd)
+                    os.unlink(name, dir_fd=dir_fd)
+                except OSError as e:
+                    logger.error('%s: %s', e, path)
+                    continue
+            yield path, st, False
+
+    def remove_dir(dir_fd, dir_path):
+        """Remove the contents of an open directory, yielding the results
+
+        Return boolean whether the directory is now empty."""
+        files = []
+        subdirs = []
+        with os.scandir(dir_fd) as it:
+            for entry in it:
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    # deleted in the meantime
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    subdirs.append((entry.name, st))
+                else:
+                    files.append((entry.name, st))
+        empty = True
+        emptied = set()
+        for (name, _st) in subdirs:
+            path = os.path.join(dir_path, name)
+            try:
+                fd = os.open(name, dir_flags | os.O_NOFOLLOW, dir_fd=dir_fd)
+            except OSError as e:
+                logger.error('%s: %s', e, path)
+                empty = False
+                continue
+            try:
+                if (yield from remove_dir(fd, path)):
+                    emptied.add(name)
+            finally:
+                os.close(fd)
+        if whitelisted:
+            keep = [(name, st) for (name, st) in files
+                    if whitelisted(os.path.join(dir_path, name))]
+            for (name, st) in keep:
+                yield os.path.join(dir_path, name), st, True
+            if keep:
+                empty = False
+                files = [f for f in files if f not in keep]
+        # Shred in groups to keep the number of files pending small.
+        batch_size = bleachbit.shred_batch_size
+        for i in range(0, len(files), batch_size):
+            n_files = 0
+            for ret in remove_files(dir_fd, dir_path, files[i:i + batch_size]):
+                n_files += 1
+                yield ret
+            if n_files < len(files[i:i + batch_size]):
+                empty = False
+        for (name, st) in subdirs:
+            path = os.path.join(dir_path, name)
+            if whitelisted and whitelisted(path):
+                empty = False
+                yield path, st, True
+                continue
+            if not really_delete:
+                yield path, st, False
+                continue
+            try:
+                if shred and name in emptied:
+                    name = wipe_name(name, dir_fd)
+                os.rmdir(name, dir_fd=dir_fd)
+            except OSError as e:
+                empty = False
+                # [Errno 39] Directory not empty
+                if errno.ENOTEMPTY == e.errno:
+                    logger.info(_("Directory is not empty: %s"), path)
+                elif errno.EBUSY == e.errno:
+                    logger.info(_("Skipping mount point: %s"), path)
+                else:
+                    logger.error('%s: %s', e, path)
+                continue
+            yield path, st, False
+        return empty
+
+    if shred_batch is not None and shred_batch.paths:
+        # Files in this tree may still wait in the batch.
+        shred_batch.flush()
+    if really_delete and scan_cache is not None:
+        scan_cache.invalidate(top, removed=False, tree=True)
+    top_fd = os.open(top, dir_flags)
+    try:
+        empty = yield from remove_dir(top_fd, top)
+    finally:
+        os.close(top_fd)
+    if not include_top:
+        return
+    st = os.lstat(top)
+    if whitelisted and whitelisted(top):
+        yield top, st, True
+    elif not really_delete:
+        yield top, st, False
+    else:
+        if stat.S_ISLNK(st.st_mode):
+            os.remove(top)
+        else:
+            delete_directory(top, shred and empty)
+        if not os.path.lexists(top):
+            if scan_cache is not None:
+                scan_cache.invalidate(top)
+            yield top, st, False
+
+
+def delete_directory(path, shred=False):
+    """Delete an empty directory
+
+    If shred, wipe its name first."""
+    delpath = path
+    if shred:
+        if not is_dir_empty(path):
+            # Avoid renaming non-empty directory like https://github.com/bleachbit/bleachbit/issues/783
+            logger.info(_("Directory is not empty: %s"), path)
+            return
+        delpath = wipe_name(path)
+    try:
+        os.rmdir(delpath)
+    except OSError as e:
+        # [Errno 39] Directory not empty
+        # https://bugs.launchpad.net/bleachbit/+bug/1012930
+        if errno.ENOTEMPTY == e.errno:
+            logger.info(_("Directory is not empty: %s"), path)
+        elif errno.EBUSY == e.errno:
+            if os.name == 'posix' and os.path.ismount(path):
+                logger.info(_("Skipping mount point: %s"), path)
+            else:
+                logger.info(_("Device or resource is busy: %s"), path)
+        else:
+            raise
+    except WindowsError as e:
+        # WindowsError: [Error 145] The directory is not empty:
+        # 'C:\\Documents and Settings\\username\\Local Settings\\Temp\\NAILogs'
+        # Error 145 may happen if the files are scheduled for deletion
+        # during reboot.
+        if 145 == e.winerror:
+            logger.info(_("Directory is not empty: %s"), path)
+        else:
+            raise
+
+
+class ShredBatch:
+
+    """Shred many files with one sync for the whole group
+
+    delete() overwrites each file without its own fsync() and adds it
+    here. flush() syncs each file system once, and only then truncates,
+    wipes the names and deletes the files. The overwritten data is on
+    stable storage before the names are removed, just as when shredding
+    one file at a time. Directories wait in the same queue, so they are
+    removed after the files in them."""
+
+    def __init__(self, max_files=None):
+        self.max_files = max_files or bleachbit.shred_batch_size
+        # list of (path, is_dir, shred)
+        self.paths = []
+        # the queued paths, which count as removed already
+        self.pending = set()
+
+    def add(self, path, is_dir, shred):
+        """Queue an overwritten file or a directory for removal"""
+        if path in self.pending:
+            return
+        self.pending.add(path)
+        self.paths.append((path, is_dir, shred))
+        if len(self.paths) >= self.max_files:
+            self.flush()
+
+    def flush(self):
+        """Sync and remove the queued paths
+
+        Return the number of errors, which are logged."""
+        paths, self.paths = self.paths, []
+        if not paths:
+            return 0
+        synced = set()
+        for (path, is_dir, _shred) in paths:
+            if is_dir:
+                continue
+            dirname = os.path.dirname(path)
+            try:
+                dev = os.stat(dirname).st_dev
+            except OSError:
+                continue
+            if dev not in synced:
+                synced.add(dev)
+                sync_filesystem(dirname)
+        errors = 0
+        for (path, is_dir, shred) in paths:
+            try:
+                if is_dir:
+                    delete_directory(path, shred)
+                else:
+                    try:
+                        os.truncate(path, 0)
+                    except OSError as e:
+                        if e.errno != errno.ENOSPC:
+                            raise
+                    os.remove(wipe_name(path))
+            except OSError as e:
+                logger.error('%s: %s', e, path)
+                errors += 1
+        self.pending.clear()
+        return errors
+
+
+def shred_pending(path):
+    """Return whether the path waits in the shred batch for removal
+
+    Walks, globs and deletions treat such a path as removed."""
+    return shred_batch is not None and path in shred_batch.pending
+
+
 def detect_encoding(fn):
     """Detect the encoding of the file"""
     try:
@@ -400,7 +1309,7 @@ def detect_encoding(fn):
 
 def ego_owner(filename):
     """Return whether current user owns the file"""
-    return os.lstat(filename).st_uid == os.getuid()
+    return lstat(filename).st_uid == os.getuid()
 
 
 def exists_in_path(filename):
@@ -506,7 +1415,7 @@ def getsize(path):
        and symlinks"""
     if 'posix' == os.name:
         try:
-            __stat = os.lstat(path)
+            __stat = lstat(path)
         except OSError as e:
             # OSError: [Errno 13] Permission denied
             # can happen when a regular user is trying to find the size of /var/log/hp/tmp
@@ -531,10 +1440,10 @@ def getsize(path):
     return os.path.getsize(path)
 
 
-def getsizedir(path):
+def getsizedir(path, workers=1):
     """Return the size of the contents of a directory"""
     total_bytes = 0
-    for node in children_in_directory(path, list_directories=False):
+    for node in children_in_directory(path, list_directories=False, workers=workers):
         total_bytes += getsize(node)
     return total_bytes
 
@@ -674,6 +1583,39 @@ def sync():
         ctypes.cdll.LoadLibrary('msvcrt.dll')._flushall()
 
 
+def syncfs(fd):
+    """Flush the buffers of the file system of an open file descriptor
+
+    Return boolean whether it worked. Where syncfs() is not available,
+    return False without flushing."""
+    if not sys.platform.startswith('linux'):
+        return False
+    import ctypes
+    libc = ctypes.CDLL('libc.so.6', use_errno=True)
+    if 0 == libc.syncfs(fd):
+        return True
+    logger.error('syncfs() returned error %d', ctypes.get_errno())
+    return False
+
+
+def sync_filesystem(path):
+    """Flush the buffers of the file system containing the path
+
+    Where syncfs() is not available, flush all file systems."""
+    if sys.platform.startswith('linux'):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            fd = None
+        if fd is not None:
+            try:
+                if syncfs(fd):
+                    return
+            finally:
+                os.close(fd)
+    sync()
+
+
 def truncate_f(f):
     """Truncate the file object"""
     try:
@@ -707,42 +1649,97 @@ def uris_to_paths(file_uris):
     return file_paths
 
 
+class PathMatcher:
+
+    """Compiled whitelist for matching many paths quickly
+
+    Files must match exactly. Folders match themselves and everything
+    below them, so a path matches if it or any of its parent
+    directories is in the set of folders. This costs one set lookup
+    per path component no matter how long the whitelist is.
+
+    The regular expressions are combined into one, which is matched
+    against the start of the path."""
+
+    def __init__(self, paths=(), regexes=(), case_sensitive=True):
+        """Compile paths, which are (type, pathname) tuples as in
+        Options.get_whitelist_paths(), and regexes"""
+        self.case_sensitive = case_sensitive
+        self.files = set()
+        self.folders = set()
+        # Simple drive letters like C:\ that match everything below
+        self.drives = set()
+        for (p_type, p_path) in paths:
+            if not case_sensitive:
+                p_path = p_path.lower()
+            if 'file' == p_type:
+                self.files.add(p_path)
+            elif 'folder' == p_type:
+                self.folders.add(p_path)
+                if 'nt' == os.name and 3 == len(p_path):
+                    self.drives.add(p_path)
+        self.regex = None
+        if regexes:
+            self.regex = re.compile(
+                '|'.join('(?:%s)' % regex for regex in regexes))
+
+    def __bool__(self):
+        """Return whether anything can match"""
+        return bool(self.files or self.folders or self.regex)
+
+    def match(self, path):
+        """Return boolean whether the path is whitelisted"""
+        if not self.case_sensitive:
+            path = path.lower()
+        if path in self.files or path in self.folders:
+            return True
+        if self.folders:
+            # Look up each parent directory.
+            pos = path.find(os.sep)
+            while -1 != pos:
+                if path[:pos] in self.folders:
+                    return True
+                pos = path.find(os.sep, pos + 1)
+        if self.drives and path[:3] in self.drives:
+            return True
+        if self.regex and self.regex.match(path):
+            return True
+        return False
+
+
+def get_whitelist():
+    """Return the PathMatcher for the whitelist in the preferences
+
+    It is compiled once and then reused until the whitelist changes."""
+    from bleachbit.Options import options
+    if options.whitelist_matcher is None:
+        options.whitelist_matcher = PathMatcher(
+            options.get_whitelist_paths(), case_sensitive=('nt' != os.name))
+    return options.whitelist_matcher
+
+
 def whitelisted_posix(path, check_realpath=True):
     """Check whether this POSIX path is whitelisted"""
-    from bleachbit.Options import options
-    if check_realpath and os.path.islink(path):
+    matcher = get_whitelist()
+    if not matcher:
+        # This is the common case, so skip checking for a symlink.
+        return False
+    if isinstance(path, FileRecord):
+        is_link = path.is_symlink()
+    else:
+        is_link = os.path.islink(path)
+    if check_realpath and is_link:
         # also check the link name
-        if whitelisted_posix(path, False):
+        if matcher.match(path):
             return True
         # resolve symlink
         path = os.path.realpath(path)
-    for pathname in options.get_whitelist_paths():
-        if pathname[0] == 'file' and path == pathname[1]:
-            return True
-        if pathname[0] == 'folder':
-            if path == pathname[1]:
-                return True
-            if path.startswith(pathname[1] + os.sep):
-                return True
-    return False
+    return matcher.match(path)
 
 
 def whitelisted_windows(path):
     """Check whether this Windows path is whitelisted"""
-    from bleachbit.Options import options
-    for pathname in options.get_whitelist_paths():
-        # Windows is case insensitive
-        if pathname[0] == 'file' and path.lower() == pathname[1].lower():
-            return True
-        if pathname[0] == 'folder':
-            if path.lower() == pathname[1].lower():
-                return True
-            if path.lower().startswith(pathname[1].lower() + os.sep):
-                return True
-            # Simple drive letter like C:\ matches everything below
-            if len(pathname[1]) == 3 and path.lower().startswith(pathname[1].lower()):
-                return True
-    return False
+    return get_whitelist().match(path)
 
 
 if 'nt' == os.name:
@@ -751,8 +1748,66 @@ else:
     whitelisted = whitelisted_posix
 
 
-def wipe_contents(path, truncate=True):
-    """Wipe files contents
+# Overwrite patterns: a repeated byte, or WIPE_RANDOM for pseudo-random data
+WIPE_ZEROS = b'\x00'
+WIPE_ONES = b'\xff'
+WIPE_RANDOM = None
+
+# (pattern, block size) -> buffer, reused across files
+_wipe_buffers = {}
+
+
+def wipe_buffer(pattern, block_size):
+    """Return a reusable, page-aligned buffer filled with the pattern"""
+    key = (pattern, block_size)
+    if key not in _wipe_buffers:
+        import mmap
+        # Anonymous memory is page aligned and starts zeroed.
+        buf = mmap.mmap(-1, block_size)
+        if WIPE_RANDOM == pattern:
+            buf.write(os.urandom(block_size))
+        elif WIPE_ZEROS != pattern:
+            buf.write(pattern * block_size)
+        _wipe_buffers[key] = buf
+    return memoryview(_wipe_buffers[key])
+
+
+def overwrite_fd(fd, size, patterns=(WIPE_ZEROS,), block_size=None, sync=True):
+    """Overwrite the first size bytes of a raw file descriptor
+
+    Each pattern is one pass, and each pass is synced to disk. If sync
+    is False, the last pass is left for the caller to sync. After each
+    block, yield the number of bytes written so far."""
+    if block_size is None:
+        block_size = bleachbit.wipe_block_size
+    done = 0
+    for pass_i, pattern in enumerate(patterns, 1):
+        buf = wipe_buffer(pattern, block_size)
+        if not hasattr(os, 'pwrite'):
+            # Windows
+            os.lseek(fd, 0, os.SEEK_SET)
+        offset = 0
+        while offset < size:
+            chunk = buf[:min(block_size, size - offset)]
+            if hasattr(os, 'pwrite'):
+                written = os.pwrite(fd, chunk, offset)
+            else:
+                written = os.write(fd, chunk)
+            offset += written
+            done += written
+            yield done
+        if sync or pass_i < len(patterns):
+            os.fsync(fd)  # force write to disk
+
+
+def wipe_contents_progress(path, truncate=True, patterns=(WIPE_ZEROS,), sync=True):
+    """Wipe file contents and yield progress
+
+    The progress is a tuple like wipe_path(): (1, fraction done,
+    seconds remaining). It is yielded at most once per second.
+
+    If sync is False, the caller must sync the file system, such as
+    ShredBatch does for many files at once.
 
     http://en.wikipedia.org/wiki/Data_remanence
     2006 NIST Special Publication 800-88 (p. 7): "Studies have
@@ -761,22 +1816,48 @@ def wipe_contents(path, truncate=True):
     """
 
     def wipe_write():
-        size = getsize(path)
+        flags = os.O_WRONLY | getattr(os, 'O_BINARY', 0) | \
+            getattr(os, 'O_NOFOLLOW', 0)
         try:
-            f = open(path, 'wb')
-        except IOError as e:
+            fd = os.open(path, flags)
+        except OSError as e:
             if e.errno == errno.EACCES:  # permission denied
                 os.chmod(path, 0o200)  # user write only
-                f = open(path, 'wb')
+                fd = os.open(path, flags)
             else:
                 raise
-        blanks = b'\0' * 4096
-        while size > 0:
-            f.write(blanks)
-            size -= 4096
-        f.flush()  # flush to OS buffer
-        os.fsync(f.fileno())  # force write to disk
-        return f
+        try:
+            size = getsize(path)
+            if not size:
+                # A block device such as a swap partition has no
+                # blocks of its own, so ask for its length.
+                size = os.lseek(fd, 0, os.SEEK_END)
+            # Overwrite whole file system blocks, including slack space.
+            size = (size + 4095) // 4096 * 4096
+            total = size * len(patterns)
+            start_time = last_time = time.time()
+            done = 0
+            for done in overwrite_fd(fd, size, patterns, sync=sync):
+                now = time.time()
+                if now - last_time > 1:
+                    last_time = now
+                    rate = done / (now - start_time + 0.0001)
+                    yield 1, 1.0 * done / total, int((total - done) / (rate + 0.0001))
+            elapsed_sec = time.time() - start_time
+            if done > 100 * 1024 * 1024:
+                rate_mbs = (done / (1000 * 1000)) / (elapsed_sec + 0.0001)
+                logger.info(_('Wrote {bytes:,} bytes in {seconds:,} seconds at {rate:.2f} MB/s').format(
+                            bytes=done, seconds=int(elapsed_sec), rate=rate_mbs))
+            if truncate:
+                try:
+                    os.ftruncate(fd, 0)
+                    if sync:
+                        os.fsync(fd)
+                except OSError as e:
+                    if e.errno != errno.ENOSPC:
+                        raise
+        finally:
+            os.close(fd)
 
     if 'nt' == os.name:
         from win32com.shell.shell import IsUserAnAdmin
@@ -784,7 +1865,6 @@ def wipe_contents(path, truncate=True):
     if 'nt' == os.name and IsUserAnAdmin():
         from bleachbit.WindowsWipe import file_wipe, UnsupportedFileSystemError
         import warnings
-        from bleachbit import _
         try:
             file_wipe(path)
         except pywinerror as e:
@@ -809,20 +1889,33 @@ def wipe_contents(path, truncate=True):
         except UnsupportedFileSystemError as e:
             warnings.warn(
                 _('There was at least one file on a file system that does not support advanced overwriting.'), UserWarning)
-            f = wipe_write()
+            yield from wipe_write()
         else:
             # The wipe succeed, so prepare to truncate.
-            f = open(path, 'w')
+            if truncate:
+                with open(path, 'w') as f:
+                    truncate_f(f)
     else:
-        f = wipe_write()
-    if truncate:
-        truncate_f(f)
-    f.close()
+        yield from wipe_write()
+
+
+def wipe_contents(path, truncate=True, sync=True):
+    """Wipe file contents
+
+    See wipe_contents_progress() to also get progress."""
+    for _progress in wipe_contents_progress(path, truncate, sync=sync):
+        pass
 
 
-def wipe_name(pathname1):
-    """Wipe the original filename and return the new pathname"""
-    (head, _tail) = os.path.split(pathname1)
+def wipe_name(pathname1, dir_fd=None):
+    """Wipe the original filename and return the new pathname
+
+    If dir_fd is given, pathname1 is a name in that open directory, and
+    the new name is too."""
+    if dir_fd is None:
+        (head, _tail) = os.path.split(pathname1)
+    else:
+        head = ''
     # reference http://en.wikipedia.org/wiki/Comparison_of_file_systems#Limits
     maxlen = 226
     # first, rename to a long name
@@ -830,7 +1923,8 @@ def wipe_name(pathname1):
     while True:
         try:
             pathname2 = os.path.join(head, __random_string(maxlen))
-            os.rename(pathname1,  pathname2)
+            os.rename(pathname1, pathname2,
+                      src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
             break
         except OSError:
             if maxlen > 10:
@@ -845,7 +1939,8 @@ def wipe_name(pathname1):
     while True:
         try:
             pathname3 = os.path.join(head, __random_string(i + 1))
-            os.rename(pathname2, pathname3)
+            os.rename(pathname2, pathname3,
+                      src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
             break
         except:
             i += 1
@@ -858,7 +1953,11 @@ def wipe_name(pathname1):
 
 def wipe_path(pathname, idle=False):
     """Wipe the free space in the path
-    This function uses an iterator to update the GUI."""
+    This function uses an iterator to update the GUI.
+
+    Several writer threads each fill their own temporary files. Where
+    posix_fallocate() works, space is reserved ahead of the writes to
+    reduce fragmentation."""
 
     def temporaryfile():
         # reference
@@ -890,11 +1989,8 @@ def wipe_path(pathname, idle=False):
 
     def estimate_completion():
         """Return (percent, seconds) to complete"""
-        remaining_bytes = free_space(pathname)
-        done_bytes = start_free_bytes - remaining_bytes
-        if done_bytes < 0:
-            # maybe user deleted large file after starting wipe
-            done_bytes = 0
+        done_bytes = sum(written)
+        remaining_bytes = max(start_free_bytes - done_bytes, 0)
         if 0 == start_free_bytes:
             done_percent = 0
         else:
@@ -904,99 +2000,143 @@ def wipe_path(pathname, idle=False):
         remaining_seconds = int(remaining_bytes / (rate + 0.0001))
         return 1, done_percent, remaining_seconds
 
-    logger.debug(_("Wiping path: %s") % pathname)
-    files = []
-    total_bytes = 0
-    start_free_bytes = free_space(pathname)
-    start_time = time.time()
-    # Because FAT32 has a maximum file size of 4,294,967,295 bytes,
-    # this loop is sometimes necessary to create multiple files.
-    while True:
-        try:
-            logger.debug(
-                _('Creating new, temporary file for wiping free space.'))
-            f = temporaryfile()
-        except OSError as e:
-            # Linux gives errno 24
-            # Windows gives errno 28 No space left on device
-            if e.errno in (errno.EMFILE, errno.ENOSPC):
-                break
-            else:
-                raise
-        last_idle = time.time()
-        # Write large blocks to quickly fill the disk.
-        blanks = b'\0' * 65536
-        while True:
+    def fill_file(f, worker):
+        """Fill one file until the disk or the file is full
+
+        Return boolean whether the disk is full"""
+        fd = f.fileno()
+        size = len(blanks)
+        reserved = 0  # bytes reserved by fallocate but not yet written
+        while not stop.is_set():
+            if reserve[0] and not reserved:
+                try:
+                    os.posix_fallocate(fd, os.lseek(fd, 0, os.SEEK_CUR), reserve[0])
+                except OSError as e:
+                    if e.errno == errno.ENOSPC:
+                        # Reserve less, down to one block.
+                        reserve[0] = reserve[0] // 2 if reserve[0] > len(blanks) else 0
+                    elif e.errno == errno.EFBIG:
+                        return False
+                    else:
+                        # not supported by the file system
+                        reserve[0] = 0
+                    continue
+                reserved = reserve[0]
             try:
-                f.write(blanks)
-            except IOError as e:
+                if reserved:
+                    n = os.write(fd, blanks[:min(size, reserved)])
+                    reserved -= n
+                else:
+                    n = os.write(fd, blanks[:size])
+            except OSError as e:
                 if e.errno == errno.ENOSPC:
-                    if len(blanks) > 1:
+                    if size > 1:
                         # Try writing smaller blocks
-                        blanks = blanks[0:len(blanks) // 2]
-                    else:
-                        break
+                        size //= 2
+                        continue
+                    return True
                 elif e.errno == errno.EFBIG:
-                    break
-                else:
-                    raise
-            if idle and (time.time() - last_idle) > 2:
-                # Keep the GUI responding, and allow the user to abort.
-                # Also display the ETA.
-                yield estimate_completion()
-                last_idle = time.time()
-        # Write to OS buffer
-        try:
-            f.flush()
-        except IOError as e:
-            # IOError: [Errno 28] No space left on device
-            # seen on Microsoft Windows XP SP3 with ~30GB free space but
-            # not on another XP SP3 with 64MB free space
-            if not e.errno == errno.ENOSPC:
-                logger.error(
-                    _("Error #%d when flushing the file buffer." % e.errno))
-
-        os.fsync(f.fileno())  # write to disk
-        # Remember to delete
-        files.append(f)
-        # For statistics
-        total_bytes += f.tell()
-        # If no bytes were written, then quit.
-        # See https://github.com/bleachbit/bleachbit/issues/502
-        if len(blanks) < 2:
-            break
-    # sync to disk
-    sync()
-    # statistics
-    elapsed_sec = time.time() - start_time
-    rate_mbs = (total_bytes / (1000 * 1000)) / elapsed_sec
-    logger.info(_('Wrote {files:,} files and {bytes:,} bytes in {seconds:,} seconds at {rate:.2f} MB/s').format(
-                files=len(files), bytes=total_bytes, seconds=int(elapsed_sec), rate=rate_mbs))
-    # how much free space is left (should be near zero)
-    if 'posix' == os.name:
-        stats = os.statvfs(pathname)
-        logger.info(_("{bytes:,} bytes and {inodes:,} inodes available to non-super-user").format(
-                    bytes=stats.f_bsize * stats.f_bavail, inodes=stats.f_favail))
-        logger.info(_("{bytes:,} bytes and {inodes:,} inodes available to super-user").format(
-                    bytes=stats.f_bsize * stats.f_bfree, inodes=stats.f_ffree))
-    # truncate and close files
-    for f in files:
-        truncate_f(f)
+                    # FAT32 has a maximum file size of 4,294,967,295
+                    # bytes, so continue in another file.
+                    return False
+                raise
+            written[worker] += n
+        return True
 
-        while True:
-            try:
-                # Nikita: I noticed a bug that prevented file handles from
-                # being closed on FAT32. It sometimes takes two .close() calls
-                # to do actually close (and therefore delete) a temporary file
-                f.close()
-                break
-            except IOError as e:
-                if e.errno == 0:
+    def writer(worker):
+        """Create and fill files until the disk is full"""
+        try:
+            while not stop.is_set():
+                try:
                     logger.debug(
-                        _("Handled unknown error #0 while truncating file."))
-                    time.sleep(0.1)
-        # explicitly delete
-        delete(f.name, ignore_missing=True)
+                        _('Creating new, temporary file for wiping free space.'))
+                    f = temporaryfile()
+                except OSError as e:
+                    # Linux gives errno 24
+                    # Windows gives errno 28 No space left on device
+                    if e.errno in (errno.EMFILE, errno.ENOSPC):
+                        break
+                    raise
+                # Remember to delete
+                files.append(f)
+                disk_full = fill_file(f, worker)
+                try:
+                    os.fsync(f.fileno())  # write to disk
+                except OSError as e:
+                    if not e.errno == errno.ENOSPC:
+                        logger.error(
+                            _("Error #%d when flushing the file buffer." % e.errno))
+                if disk_full:
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    logger.debug(_("Wiping path: %s") % pathname)
+    files = []
+    errors = []
+    n_workers = max(1, bleachbit.wipe_path_workers)
+    written = [0] * n_workers  # bytes written by each writer
+    # Write large blocks to quickly fill the disk.
+    blanks = wipe_buffer(WIPE_ZEROS, bleachbit.wipe_block_size)
+    # bytes to reserve at once, shared by the writers
+    reserve = [64 * len(blanks) if hasattr(os, 'posix_fallocate') else 0]
+    stop = threading.Event()
+    start_free_bytes = free_space(pathname)
+    start_time = time.time()
+    threads = [threading.Thread(target=writer, args=(worker,), daemon=True)
+               for worker in range(n_workers)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(2 if idle else None)
+                if idle and thread.is_alive():
+                    # Keep the GUI responding, and allow the user to abort.
+                    # Also display the ETA.
+                    yield estimate_completion()
+        if errors:
+            raise errors[0]
+        # sync to disk
+        sync()
+        # statistics
+        total_bytes = sum(written)
+        elapsed_sec = time.time() - start_time
+        rate_mbs = (total_bytes / (1000 * 1000)) / elapsed_sec
+        logger.info(_('Wrote {files:,} files and {bytes:,} bytes in {seconds:,} seconds at {rate:.2f} MB/s').format(
+                    files=len(files), bytes=total_bytes, seconds=int(elapsed_sec), rate=rate_mbs))
+        # how much free space is left (should be near zero)
+        if 'posix' == os.name:
+            stats = os.statvfs(pathname)
+            logger.info(_("{bytes:,} bytes and {inodes:,} inodes available to non-super-user").format(
+                        bytes=stats.f_bsize * stats.f_bavail, inodes=stats.f_favail))
+            logger.info(_("{bytes:,} bytes and {inodes:,} inodes available to super-user").format(
+                        bytes=stats.f_bsize * stats.f_bfree, inodes=stats.f_ffree))
+    finally:
+        # Also release the space if the caller stopped early.
+        stop.set()
+        for thread in threads:
+            if thread.is_alive():
+                thread.join()
+        # truncate and close files
+        for f in files:
+            truncate_f(f)
+
+            while True:
+                try:
+                    # Nikita: I noticed a bug that prevented file handles from
+                    # being closed on FAT32. It sometimes takes two .close() calls
+                    # to do actually close (and therefore delete) a temporary file
+                    f.close()
+                    break
+                except IOError as e:
+                    if e.errno == 0:
+                        logger.debug(
+                            _("Handled unknown error #0 while truncating file."))
+                        time.sleep(0.1)
+            # explicitly delete
+            delete(f.name, ignore_missing=True)
 
 
 def vacuum_sqlite3(path):
@@ -1005,3 +2145,7 @@ def vacuum_sqlite3(path):
 
 
 openfiles = OpenFiles()
+# While set by Worker, delete() shreds files in groups.
+shred_batch = None
+# While set by Worker, walks and globs are cached.
+scan_cache = None
@@ -320,6 +320,7 @@ class Bleachbit(Gtk.Application):
     def quit(self, _action=None, _param=None, init_configuration=False):
         if init_configuration:
             bleachbit.Options.init_configuration()
+        self._window.tree_store.cancel_probes()
         self._window.destroy()
 
     def get_diagnostics_dialog(self):
@@ -375,6 +376,9 @@ class TreeInfoModel:
         if not self.tree_store:
             raise Exception("cannot create tree store")
         self.row_changed_handler_id = None
+        # auto_hide() probes of the latest refresh
+        self.probes = None
+        self.refresh_count = 0
         self.refresh_rows()
         self.tree_store.set_sort_func(3, self.sort_func)
         self.tree_store.set_sort_column_id(3, Gtk.SortType.ASCENDING)
@@ -393,10 +397,17 @@ class TreeInfoModel:
         options.set_tree(parent, child, value)
 
     def refresh_rows(self):
-        """Clear rows (cleaners) and add them fresh"""
+        """Clear rows (cleaners) and add them fresh
+
+        Cleaners without a kept auto_hide() verdict are shown at once
+        and probed in background threads, which remove the rows of the
+        cleaners with nothing to clean."""
+        self.cancel_probes()
+        self.refresh_count += 1
         if self.row_changed_handler_id:
             self.tree_store.disconnect(self.row_changed_handler_id)
         self.tree_store.clear()
+        to_probe = []
         for key in sorted(backends):
             if not any(backends[key].get_options()):
                 # localizations has no options, so it should be hidden
@@ -405,15 +416,46 @@ class TreeInfoModel:
             c_name = backends[key].get_name()
             c_id = backends[key].get_id()
             c_value = options.get_tree(c_id, None)
-            if not c_value and options.get('auto_hide') and backends[key].auto_hide():
-                logger.debug("automatically hiding cleaner '%s'", c_id)
-                continue
+            if not c_value and options.get('auto_hide'):
+                verdict = backends[key].cached_auto_hide()
+                if verdict:
+                    logger.debug("automatically hiding cleaner '%s'", c_id)
+                    continue
+                if verdict is None:
+                    to_probe.append(backends[key])
             parent = self.tree_store.append(None, (c_name, c_value, c_id, ""))
             for (o_id, o_name) in backends[key].get_options():
                 o_value = options.get_tree(c_id, o_id)
                 self.tree_store.append(parent, (o_name, o_value, o_id, ""))
         self.row_changed_handler_id = self.tree_store.connect("row-changed",
                                                               self.on_row_changed)
+        if to_probe:
+            refresh_count = self.refresh_count
+            self.probes = Cleaner.auto_hide_async(
+                to_probe,
+                lambda cleaner: GLib.idle_add(self.hide_cleaner, cleaner.id, refresh_count))
+
+    def cancel_probes(self):
+        """Stop the auto_hide() probes that have not started"""
+        if self.probes is not None:
+            self.probes.cancel()
+            self.probes = None
+
+    def hide_cleaner(self, c_id, refresh_count):
+        """Remove the row of a cleaner that auto_hide() found empty"""
+        if refresh_count != self.refresh_count:
+            # the rows were refreshed after the probe started
+            return False
+        for row in self.tree_store:
+            if c_id != row[2]:
+                continue
+            if row[1] or any(child[1] for child in row.iterchildren()):
+                # selected while the probe ran
+                return False
+            logger.debug("automatically hiding cleaner '%s'", c_id)
+            self.tree_store.remove(row.iter)
+            break
+        return False
 
     def sort_func(self, model, iter1, iter2, _user_data):
         """Sort the tree by the display name"""
@@ -1047,6 +1089,7 @@ class GUI(Gtk.ApplicationWindow):
     def on_delete_event(self, widget, event):
         # commit options to disk
         options.commit()
+        self.tree_store.cancel_probes()
         return False
 
     def on_show(self, widget):
@@ -267,7 +267,9 @@ def report_free():
 
 
 def wipe_swap_linux(devices, proc_swaps):
-    """Shred the Linux swap file and then reinitialize it"""
+    """Shred the Linux swap file and then reinitialize it
+
+    Yield progress of overwriting each device."""
     if devices is None:
         return
     if 0 < count_swap_linux():
@@ -286,7 +288,8 @@ def wipe_swap_linux(devices, proc_swaps):
                 (device, actual_size_bytes, safety_limit_bytes))
         uuid = get_swap_uuid(device)
         # wipe
-        FileUtilities.wipe_contents(device, truncate=False)
+        for ret in FileUtilities.wipe_contents_progress(device, truncate=False):
+            yield ret
         # reinitialize
         # TRANSLATORS: The variable is a device like /dev/sda2
         logger.debug(_("Reinitializing the swap device %s."), device)
@@ -307,7 +310,8 @@ def wipe_memory():
     yield True  # process GTK+ idle loop
     # TRANSLATORS: The variable is a device like /dev/sda2
     logger.debug(_("Detected these swap devices: %s"), str(devices))
-    wipe_swap_linux(devices, proc_swaps)
+    for ret in wipe_swap_linux(devices, proc_swaps):
+        yield ret
     yield True
     child_pid = os.fork()
     if 0 == child_pid:
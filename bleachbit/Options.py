@@ -90,6 +90,8 @@ class Options:
 
     def __init__(self):
         self.purged = False
+        # compiled whitelist, built by FileUtilities.get_whitelist()
+        self.whitelist_matcher = None
         self.config = bleachbit.RawConfigParser()
         self.config.optionxform = str  # make keys case sensitive for hashpath purging
         self.config.BOOLEAN_STATES['t'] = True
@@ -249,6 +251,7 @@ class Options:
 
     def restore(self):
         """Restore saved options from disk"""
+        self.whitelist_matcher = None
         try:
             self.config.read(bleachbit.options_file, encoding='utf-8-sig')
         except:
@@ -326,6 +329,7 @@ class Options:
 
     def set_whitelist_paths(self, values):
         """Save the whitelist"""
+        self.whitelist_matcher = None
         section = "whitelist/paths"
         if self.config.has_section(section):
             self.config.remove_section(section)
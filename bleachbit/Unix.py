@@ -498,49 +498,65 @@ def is_broken_xdg_desktop(pathname):
     return False
 
 
-def is_running_darwin(exename, run_ps=None):
+def running_processes_darwin(run_ps=None):
+    """Return a dictionary mapping process ID to command name"""
     if run_ps is None:
         def run_ps():
             return subprocess.check_output(["ps", "aux", "-c"])
     try:
-        processess = (re.split(r"\s+", p, 10)[10]
-                      for p in run_ps().split("\n") if p != "")
-        next(processess)  # drop the header
-        return exename in processess
-    except IndexError:
+        processes = [re.split(r"\s+", p, 10)
+                     for p in run_ps().split("\n") if p != ""]
+        # drop the header
+        if len(processes.pop(0)) != 11:
+            raise ValueError
+        return {int(p[1]): p[10] for p in processes}
+    except (IndexError, ValueError):
         raise RuntimeError("Unexpected output from ps")
 
 
-def is_running_linux(exename):
-    """Check whether exename is running"""
-    for filename in glob.iglob("/proc/*/exe"):
-        try:
-            target = os.path.realpath(filename)
-        except TypeError:
-            # happens, for example, when link points to
-            # '/etc/password\x00 (deleted)'
+def running_processes_linux():
+    """Return a dictionary mapping process ID to executable name"""
+    ret = {}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
             continue
+        try:
+            target = os.readlink('/proc/%s/exe' % pid)
         except OSError:
             # 13 = permission denied
+            # 2 = kernel thread, or the process exited
             continue
         # Google Chrome shows 74 on Ubuntu 19.04 shows up as
         # /opt/google/chrome/chrome (deleted)
-        found_exename = os.path.basename(target).replace(' (deleted)', '')
-        if exename == found_exename:
-            return True
-    return False
+        ret[int(pid)] = os.path.basename(target).replace(' (deleted)', '')
+    return ret
 
 
-def is_running(exename):
-    """Check whether exename is running"""
+def running_processes():
+    """Return a dictionary mapping process ID to executable name"""
     if sys.platform.startswith('linux'):
-        return is_running_linux(exename)
+        return running_processes_linux()
     elif ('darwin' == sys.platform or
           sys.platform.startswith('openbsd') or
           sys.platform.startswith('freebsd')):
-        return is_running_darwin(exename)
+        return running_processes_darwin()
     else:
-        raise RuntimeError('unsupported platform for physical_free()')
+        raise RuntimeError('unsupported platform for running_processes()')
+
+
+def is_running_darwin(exename, run_ps=None):
+    """Check whether exename is running"""
+    return exename in running_processes_darwin(run_ps).values()
+
+
+def is_running_linux(exename):
+    """Check whether exename is running"""
+    return exename in running_processes_linux().values()
+
+
+def is_running(exename):
+    """Check whether exename is running"""
+    return exename in running_processes().values()
 
 
 def rotated_logs():
@@ -671,11 +687,11 @@ def yum_clean():
             "%s cannot be cleaned because it is currently running.  Close it, and try again.") % "Yum"
         raise RuntimeError(msg)
 
-    old_size = FileUtilities.getsizedir('/var/cache/yum')
+    old_size = FileUtilities.getsizedir('/var/cache/yum', bleachbit.walk_workers)
     args = ['--enablerepo=*', 'clean', 'all']
     invalid = ['You need to be root', 'Cannot remove rpmdb file']
     run_cleaner_cmd('yum', args, '^unused regex$', invalid)
-    new_size = FileUtilities.getsizedir('/var/cache/yum')
+    new_size = FileUtilities.getsizedir('/var/cache/yum', bleachbit.walk_workers)
     return old_size - new_size
 
 
@@ -686,11 +702,11 @@ def dnf_clean():
             "%s cannot be cleaned because it is currently running.  Close it, and try again.") % "Dnf"
         raise RuntimeError(msg)
 
-    old_size = FileUtilities.getsizedir('/var/cache/dnf')
+    old_size = FileUtilities.getsizedir('/var/cache/dnf', bleachbit.walk_workers)
     args = ['--enablerepo=*', 'clean', 'all']
     invalid = ['You need to be root', 'Cannot remove rpmdb file']
     run_cleaner_cmd('dnf', args, '^unused regex$', invalid)
-    new_size = FileUtilities.getsizedir('/var/cache/dnf')
+    new_size = FileUtilities.getsizedir('/var/cache/dnf', bleachbit.walk_workers)
 
     return old_size - new_size
 
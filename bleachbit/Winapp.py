@@ -26,12 +26,13 @@ Import Winapp2.ini files
 import logging
 import os
 import glob
+import json
 import re
-from xml.dom.minidom import parseString
+import sys
 
 import bleachbit
-from bleachbit import Cleaner, Windows
-from bleachbit.Action import Delete, Winreg
+from bleachbit import Cleaner, FileUtilities, Windows
+from bleachbit.Action import Delete, Winreg, has_glob
 from bleachbit import _
 
 logger = logging.getLogger(__name__)
@@ -60,11 +61,6 @@ langsecref_map = {
     'Games': ('winapp2_games', _('Games'))}
 
 
-def xml_escape(s):
-    """Lightweight way to escape XML entities"""
-    return s.replace('&', '&amp;').replace('"', '&quot;')
-
-
 def section2option(s):
     """Normalize section name to appropriate option name"""
     ret = re.sub(r'[^a-z0-9]', '_', s.lower())
@@ -118,22 +114,56 @@ def detect_file(pathname):
     return False
 
 
+def detect_roots(pathname):
+    """Return the directories whose modification times change when a
+    path for DetectFile#= appears or disappears
+
+    A path created deeper below a glob does not change the time of its
+    root."""
+    roots = []
+    for expanded in winapp_expand_vars(pathname):
+        if has_glob(expanded):
+            roots.append(FileUtilities.ScanCache.root(expanded))
+        else:
+            roots.append(os.path.dirname(os.path.normpath(expanded)))
+    return roots
+
+
+# Registry keys for SpecialDetect=
+# The last two are used only for testing
+special_detect_keys = {
+    'DET_CHROME': r'HKCU\Software\Google\Chrome',
+    'DET_MOZILLA': r'HKCU\Software\Mozilla\Firefox',
+    'DET_OPERA': r'HKCU\Software\Opera Software',
+    'DET_THUNDERBIRD': r'HKLM\SOFTWARE\Clients\Mail\Mozilla Thunderbird',
+    'DET_WINDOWS': r'HKCU\Software\Microsoft',
+    'DET_SPACE_QUEST': r'HKCU\Software\Sierra Games\Space Quest'}
+
+
 def special_detect(code):
     """Check whether the SpecialDetect== software exists"""
-    # The last two are used only for testing
-    sd_keys = {'DET_CHROME': r'HKCU\Software\Google\Chrome',
-               'DET_MOZILLA': r'HKCU\Software\Mozilla\Firefox',
-               'DET_OPERA': r'HKCU\Software\Opera Software',
-               'DET_THUNDERBIRD': r'HKLM\SOFTWARE\Clients\Mail\Mozilla Thunderbird',
-               'DET_WINDOWS': r'HKCU\Software\Microsoft',
-               'DET_SPACE_QUEST': r'HKCU\Software\Sierra Games\Space Quest'}
-    if code in sd_keys:
-        return Windows.detect_registry_key(sd_keys[code])
+    if code in special_detect_keys:
+        return Windows.detect_registry_key(special_detect_keys[code])
     else:
         logger.error('Unknown SpecialDetect=%s', code)
     return False
 
 
+def probes_match(probes):
+    """Return whether the probes recorded by Winapp.detect() still give
+    the same results"""
+    if probes['os'] is not None and \
+            probes['os'] != str(Windows.parse_windows_build()):
+        return False
+    for key, found in probes['keys'].items():
+        if Windows.detect_registry_key(key) != found:
+            return False
+    for pathname, mtimes in probes['files'].items():
+        if [list(x) for x in Cleaner.root_mtimes(detect_roots(pathname))] != mtimes:
+            return False
+    return True
+
+
 def fnmatch_translate(pattern):
     """Same as the original without the end"""
     import fnmatch
@@ -149,14 +179,40 @@ class Winapp:
 
     """Create cleaners from a Winapp2.ini-style file"""
 
-    def __init__(self, pathname, cb_progress=lambda x: None):
-        """Create cleaners from a Winapp2.ini-style file"""
+    def __init__(self, pathname, cb_progress=lambda x: None, definition=None):
+        """Create cleaners from a Winapp2.ini-style file
+
+        definition is the attribute of the same name from an earlier
+        instance for the same file, whose detection probes still match.
+        Giving it skips parsing and detection.
+        """
 
         self.cleaners = {}
         self.cleaner_ids = []
         for langsecref in set(langsecref_map.values()):
             self.add_section(langsecref[0], langsecref[1])
         self.errors = 0
+        if definition is None:
+            definition = self.parse(pathname, cb_progress)
+        self.definition = definition
+        for section in definition['sections']:
+            try:
+                self.build_section(section)
+            except Exception:
+                self.errors += 1
+                logger.exception(
+                    'error building option %s', section['option'])
+
+    def parse(self, pathname, cb_progress):
+        """Parse and detect the sections into a definition
+
+        The definition is a dictionary of plain data for JSON.
+        'sections' lists the active sections, and 'probes' records the
+        operating system, registry keys, and DetectFile#= paths checked
+        by detect().
+        """
+        self.sections = []
+        self.probes = {'os': None, 'keys': {}, 'files': {}}
         self.parser = bleachbit.RawConfigParser()
         self.parser.read(pathname)
         self.re_detect = re.compile(r'^detect(\d+)?$')
@@ -173,6 +229,26 @@ class Winapp:
             else:
                 section_done_count += 1
                 cb_progress(1.0*section_done_count/section_total_count)
+        return {'sections': self.sections, 'probes': self.probes}
+
+    def build_section(self, section):
+        """Add the option and actions of a parsed section"""
+        # Environment variables are expanded here, not in the cached
+        # definition, because they differ between users and machines.
+        excludekeys = [self.excludekey_to_nwholeregex(excludekey)
+                       for excludekey in section['excludekeys']]
+        lid = self.section_to_cleanerid(section['langsecref'])
+        option_id = section['option']
+        self.cleaners[lid].add_option(option_id, section['label'], '')
+        if section['warning'] is not None:
+            self.cleaners[lid].set_warning(option_id, section['warning'])
+        for (key_type, value) in section['actions']:
+            if 'regkey' == key_type:
+                provider = Winreg(self.handle_regkey(value))
+                self.cleaners[lid].add_action(option_id, provider)
+                continue
+            for attrs in self.handle_filekey(section['label'], value, excludekeys):
+                self.cleaners[lid].add_action(option_id, Delete(attrs))
 
     def add_section(self, cleaner_id, name):
         """Add a section (cleaners)"""
@@ -260,29 +336,42 @@ class Winapp:
         """
         if self.parser.has_option(section, 'detectos'):
             required_ver = self.parser.get(section, 'detectos')
+            self.probes['os'] = str(Windows.parse_windows_build())
             if not detectos(required_ver):
                 return False
         any_detect_option = False
         if self.parser.has_option(section, 'specialdetect'):
             any_detect_option = True
             sd_code = self.parser.get(section, 'specialdetect')
-            if special_detect(sd_code):
+            if sd_code not in special_detect_keys:
+                logger.error('Unknown SpecialDetect=%s', sd_code)
+            elif self.detect_registry_key(special_detect_keys[sd_code]):
                 return True
         for option in self.parser.options(section):
             if re.match(self.re_detect, option):
                 # Detect= checks for a registry key
                 any_detect_option = True
                 key = self.parser.get(section, option)
-                if Windows.detect_registry_key(key):
+                if self.detect_registry_key(key):
                     return True
             elif re.match(self.re_detectfile, option):
                 # DetectFile= checks for a file
                 any_detect_option = True
                 key = self.parser.get(section, option)
+                # Take the times first, so a change during the check
+                # makes the probe stale.
+                self.probes['files'][key] = [
+                    list(x) for x in Cleaner.root_mtimes(detect_roots(key))]
                 if detect_file(key):
                     return True
         return not any_detect_option
 
+    def detect_registry_key(self, key):
+        """Check whether a registry key exists, once for each key"""
+        if key not in self.probes['keys']:
+            self.probes['keys'][key] = Windows.detect_registry_key(key)
+        return self.probes['keys'][key]
+
     def handle_section(self, section):
         """Parse a section"""
         # check whether the section is active (i.e., whether it will be shown)
@@ -292,8 +381,7 @@ class Winapp:
         excludekeys = []
         for option in self.parser.options(section):
             if re.match(self.re_excludekey, option):
-                excludekeys.append(
-                    self.excludekey_to_nwholeregex(self.parser.get(section, option)))
+                excludekeys.append(self.parser.get(section, option))
         # there are two ways to specify sections: langsecref= and section=
         if self.parser.has_option(section, 'langsecref'):
             # verify the langsecref number is known
@@ -305,18 +393,24 @@ class Winapp:
             logger.error(
                 'neither option LangSecRef nor Section found in section %s', section)
             return
-        # find the BleachBit internal cleaner ID
-        lid = self.section_to_cleanerid(langsecref_num)
-        self.cleaners[lid].add_option(
-            section2option(section), section.replace('*', ''), '')
+        # The cleaner is found or added by build_section(), which also
+        # turns the keys into actions.
+        record = {'langsecref': langsecref_num,
+                  'option': section2option(section),
+                  'label': section.replace('*', ''),
+                  'warning': None,
+                  'excludekeys': excludekeys,
+                  'actions': []}
+        self.sections.append(record)
         for option in self.parser.options(section):
             if option.startswith('filekey'):
-                self.handle_filekey(lid, section, option, excludekeys)
+                record['actions'].append(
+                    ['filekey', self.parser.get(section, option)])
             elif option.startswith('regkey'):
-                self.handle_regkey(lid, section, option)
+                record['actions'].append(
+                    ['regkey', self.parser.get(section, option)])
             elif option == 'warning':
-                self.cleaners[lid].set_warning(
-                    section2option(section), self.parser.get(section, 'warning'))
+                record['warning'] = self.parser.get(section, 'warning')
             elif option in ('default', 'langsecref', 'section', 'detectos', 'specialdetect') \
                     or re.match(self.re_detect, option) \
                     or re.match(self.re_detectfile, option) \
@@ -327,48 +421,42 @@ class Winapp:
                     'unknown option %s in section %s', option, section)
                 return
 
-    def __make_file_provider(self, dirname, filename, recurse, removeself, excludekeys):
-        """Change parsed FileKey to action provider"""
-        regex = ''
+    def __make_file_actions(self, dirname, filename, recurse, removeself, excludekeys):
+        """Change parsed FileKey to attributes of Delete actions"""
+        attrs = {'command': 'delete'}
         if recurse:
-            search = 'walk.files'
-            path = dirname
+            attrs['search'] = 'walk.files'
+            attrs['path'] = dirname
             if filename.startswith('*.'):
                 filename = filename.replace('*.', '.')
             if filename == '.*':
                 if removeself:
-                    search = 'walk.all'
+                    attrs['search'] = 'walk.all'
             else:
                 import fnmatch
-                regex = ' regex="%s" ' % (fnmatch.translate(filename))
+                attrs['regex'] = fnmatch.translate(filename)
         else:
-            search = 'glob'
-            path = os.path.join(dirname, filename)
-            if path.find('*') == -1:
-                search = 'file'
-        excludekeysxml = ''
+            attrs['search'] = 'glob'
+            attrs['path'] = os.path.join(dirname, filename)
+            if attrs['path'].find('*') == -1:
+                attrs['search'] = 'file'
         if excludekeys:
             if len(excludekeys) > 1:
                 # multiple
-                exclude_str = '(%s)' % '|'.join(excludekeys)
+                attrs['nwholeregex'] = '(%s)' % '|'.join(excludekeys)
             else:
                 # just one
-                exclude_str = excludekeys[0]
-            excludekeysxml = 'nwholeregex="%s"' % xml_escape(exclude_str)
-        action_str = '<option command="delete" search="%s" path="%s" %s %s/>' % \
-                     (search, xml_escape(path), regex, excludekeysxml)
-        yield Delete(parseString(action_str).childNodes[0])
+                attrs['nwholeregex'] = excludekeys[0]
+        yield attrs
         if removeself:
-            action_str = '<option command="delete" search="file" path="%s"/>' % \
-                         (xml_escape(dirname))
-            yield Delete(parseString(action_str).childNodes[0])
+            yield {'command': 'delete', 'search': 'file', 'path': dirname}
 
-    def handle_filekey(self, lid, ini_section, ini_option, excludekeys):
-        """Parse a FileKey# option.
+    def handle_filekey(self, ini_section, value, excludekeys):
+        """Parse the value of a FileKey# option into attributes of
+        Delete actions
 
-        Section is [Application Name] and option is the FileKey#"""
-        elements = self.parser.get(
-            ini_section, ini_option).strip().split('|')
+        Section is [Application Name], and excludekeys are regexes."""
+        elements = value.strip().split('|')
         dirnames = winapp_expand_vars(elements.pop(0))
         filenames = ""
         if elements:
@@ -387,21 +475,16 @@ class Winapp:
                     'unknown file option %s in section %s', element, ini_section)
         for filename in filenames.split(';'):
             for dirname in dirnames:
-                for provider in self.__make_file_provider(dirname, filename, recurse, removeself, excludekeys):
-                    self.cleaners[lid].add_action(
-                        section2option(ini_section), provider)
-
-    def handle_regkey(self, lid, ini_section, ini_option):
-        """Parse a RegKey# option"""
-        elements = self.parser.get(
-            ini_section, ini_option).strip().split('|')
-        path = xml_escape(elements[0])
-        name = ""
+                yield from self.__make_file_actions(dirname, filename, recurse, removeself, excludekeys)
+
+    def handle_regkey(self, value):
+        """Parse the value of a RegKey# option into attributes of a
+        Winreg action"""
+        elements = value.strip().split('|')
+        attrs = {'command': 'winreg', 'path': elements[0]}
         if len(elements) == 2:
-            name = 'name="%s"' % xml_escape(elements[1])
-        action_str = '<option command="winreg" path="%s" %s/>' % (path, name)
-        provider = Winreg(parseString(action_str).childNodes[0])
-        self.cleaners[lid].add_action(section2option(ini_section), provider)
+            attrs['name'] = elements[1]
+        return attrs
 
     def get_cleaners(self):
         """Return the created cleaners"""
@@ -418,16 +501,142 @@ def list_winapp_files():
             yield fname
 
 
+def load_cache():
+    """Return cached winapp2.ini entries keyed by pathname
+
+    Each entry is [SHA-256 digest, definition]. The cache is dropped
+    when it was written by another version or for another platform.
+    """
+    if not bleachbit.winapp2_cache_file:
+        return {}
+    try:
+        with open(bleachbit.winapp2_cache_file, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or \
+            cache.get('version') != bleachbit.APP_VERSION or \
+            cache.get('platform') != sys.platform:
+        return {}
+    return cache.get('files', {})
+
+
+def save_cache(entries):
+    """Write winapp2.ini entries to the cache"""
+    if not bleachbit.winapp2_cache_file:
+        return
+    cache = {'version': bleachbit.APP_VERSION,
+             'platform': sys.platform,
+             'files': entries}
+    # Write beside the cache and rename so concurrent readers see
+    # either the old or the new cache.
+    tmp_path = '%s.%d' % (bleachbit.winapp2_cache_file, os.getpid())
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, separators=(',', ':'))
+        os.replace(tmp_path, bleachbit.winapp2_cache_file)
+    except OSError as e:
+        logger.debug('Cannot write winapp2.ini cache %s: %s',
+                     bleachbit.winapp2_cache_file, e)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def read_winapp(pathname, digest, cache, cb_progress=lambda x: None):
+    """Return a Winapp for the file and whether it was parsed
+
+    The cached definition is used while the digest of the file and the
+    results of its detection probes are unchanged. Otherwise, the file
+    is parsed, and its definition replaces the entry in the cache.
+    """
+    entry = cache.get(pathname)
+    if entry is not None and entry[0] == digest and \
+            probes_match(entry[1]['probes']):
+        return Winapp(pathname, cb_progress, entry[1]), False
+    inicleaner = Winapp(pathname, cb_progress)
+    cache[pathname] = [digest, inicleaner.definition]
+    return inicleaner, True
+
+
+def cleaner_index():
+    """Return {cleaner ID: sorted option IDs} of winapp2.ini cleaners"""
+    ret = {}
+    cache = load_cache()
+    cache_changed = False
+    for pathname in list_winapp_files():
+        try:
+            inicleaner, parsed = read_winapp(
+                pathname, file_digest(pathname), cache)
+        except Exception:
+            logger.exception(
+                "Error reading winapp2.ini cleaner '%s'", pathname)
+            continue
+        cache_changed |= parsed
+        for cleaner in inicleaner.get_cleaners():
+            ret[cleaner.id] = [option_id for (option_id, __name)
+                               in cleaner.get_options()]
+    if cache_changed:
+        save_cache(cache)
+    return ret
+
+
+# pathname -> ((mtime_ns, size), SHA-256 digest, definition, cleaners)
+# of loaded files
+loaded = {}
+
+
+def file_digest(pathname):
+    """Return the SHA-256 digest of a file as hex"""
+    import hashlib
+    with open(pathname, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
 def load_cleaners(cb_progress=lambda x: None):
-    """Scan for winapp2.ini files and load them"""
+    """Scan for winapp2.ini files and load them
+
+    A file with the same modification time and size, or else the same
+    content, as at the previous call registers the same cleaners
+    again while its detection probes give the same results. Otherwise,
+    the cleaners are built from the cache or by parsing the file.
+    """
     cb_progress(0.0)
-    for pathname in list_winapp_files():
+    pathnames = list(list_winapp_files())
+    cache = load_cache()
+    cache_changed = False
+    for pathname in pathnames:
         try:
-            inicleaner = Winapp(pathname, cb_progress)
+            st = os.stat(pathname)
+            key = (st.st_mtime_ns, st.st_size)
+            previous = loaded.get(pathname)
+            if previous is not None and previous[0] == key:
+                digest = previous[1]
+            else:
+                digest = file_digest(pathname)
+            if previous is not None and previous[1] == digest and \
+                    probes_match(previous[2]['probes']):
+                definition, cleaners = previous[2], previous[3]
+            else:
+                inicleaner, parsed = read_winapp(
+                    pathname, digest, cache, cb_progress)
+                cache_changed |= parsed
+                definition = inicleaner.definition
+                cleaners = list(inicleaner.get_cleaners())
+            loaded[pathname] = (key, digest, definition, cleaners)
         except Exception as e:
+            loaded.pop(pathname, None)
             logger.exception(
                 "Error reading winapp2.ini cleaner '%s'", pathname)
         else:
-            for cleaner in inicleaner.get_cleaners():
+            for cleaner in cleaners:
                 Cleaner.backends[cleaner.id] = cleaner
         yield True
+    for pathname in set(loaded) - set(pathnames):
+        del loaded[pathname]
+    for pathname in set(cache) - set(pathnames):
+        del cache[pathname]
+        cache_changed = True
+    if cache_changed:
+        save_cache(cache)
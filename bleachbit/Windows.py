@@ -476,6 +476,18 @@ def is_process_running(name):
     return False
 
 
+def running_processes():
+    """Return a dictionary mapping process ID to lowercase process name"""
+    import psutil
+    ret = {}
+    for proc in psutil.process_iter():
+        try:
+            ret[proc.pid] = proc.name().lower()
+        except psutil.NoSuchProcess:
+            pass
+    return ret
+
+
 def move_to_recycle_bin(path):
     """Move 'path' into recycle bin"""
     shell.SHFileOperation(
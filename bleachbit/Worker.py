@@ -22,8 +22,9 @@
 Perform the preview or delete operations
 """
 
+import bleachbit
 from bleachbit import DeepScan, FileUtilities
-from bleachbit.Cleaner import backends
+from bleachbit.Cleaner import backends, processes
 from bleachbit import _, ungettext
 
 import logging
@@ -82,7 +83,6 @@ class Worker:
 
     def execute(self, cmd, operation_option):
         """Execute or preview the command"""
-        ret = None
         try:
             for ret in cmd.execute(self.really_delete):
                 if True == ret or isinstance(ret, tuple):
@@ -90,6 +90,9 @@ class Worker:
                     # allow user to abort, and
                     # display progress (if applicable).
                     yield ret
+                elif isinstance(ret, dict):
+                    # A command such as DeleteTree has many results.
+                    self.print_result(ret)
                 if self.is_aborted:
                     return
         except SystemExit:
@@ -108,28 +111,28 @@ class Worker:
                 data = {'command': cmd, 'operation_option': operation_option}
                 logger.error(msg.format(**data), exc_info=True)
             self.total_errors += 1
+
+    def print_result(self, ret):
+        """Count and display the result of a command"""
+        if isinstance(ret['size'], int):
+            size = FileUtilities.bytes_to_human(ret['size'])
+            self.size += ret['size']
+            self.total_bytes += ret['size']
         else:
-            if ret is None:
-                return
-            if isinstance(ret['size'], int):
-                size = FileUtilities.bytes_to_human(ret['size'])
-                self.size += ret['size']
-                self.total_bytes += ret['size']
-            else:
-                size = "?B"
+            size = "?B"
 
-            if ret['path']:
-                path = ret['path']
-            else:
-                path = ''
+        if ret['path']:
+            path = ret['path']
+        else:
+            path = ''
 
-            line = "%s %s %s\n" % (ret['label'], size, path)
-            self.total_deleted += ret['n_deleted']
-            self.total_special += ret['n_special']
-            if ret['label']:
-                # the label may be a hidden operation
-                # (e.g., win.shell.change.notify)
-                self.ui.append_text(line)
+        line = "%s %s %s\n" % (ret['label'], size, path)
+        self.total_deleted += ret['n_deleted']
+        self.total_special += ret['n_special']
+        if ret['label']:
+            # the label may be a hidden operation
+            # (e.g., win.shell.change.notify)
+            self.ui.append_text(line)
 
     def clean_operation(self, operation):
         """Perform a single cleaning operation"""
@@ -233,6 +236,13 @@ class Worker:
         3. Memory
         4. Free disk space"""
         self.deepscans = {}
+        # share walks between cleaners during this run
+        FileUtilities.scan_cache = FileUtilities.ScanCache()
+        if self.really_delete:
+            # one look at the running processes for all cleaners
+            processes.refresh()
+            # shred files in groups with one sync per group
+            FileUtilities.shred_batch = FileUtilities.ShredBatch()
         # prioritize
         self.delayed_ops = []
         for operation in self.operations:
@@ -249,24 +259,41 @@ class Worker:
                     new_op = (priority, {operation: [delayable]})
                     self.delayed_ops.append(new_op)
 
-        # standard operations
-        import warnings
-        with warnings.catch_warnings(record=True) as ws:
-            # This warning system allows general warnings. Duplicate will
-            # be removed, and the warnings will show near the end of
-            # the log.
-
-            warnings.simplefilter('once')
-            for dummy in self.run_operations(self.operations):
-                # yield to GTK+ idle loop
+        try:
+            # read each shared tree once for all the walks and deep scans
+            for dummy in self.plan_walks():
+                if self.is_aborted:
+                    break
                 yield True
-            for w in ws:
-                logger.warning(w.message)
 
-        # run deep scan
-        if self.deepscans:
-            for dummy in self.run_deep_scan():
-                yield dummy
+            # standard operations
+            import warnings
+            with warnings.catch_warnings(record=True) as ws:
+                # This warning system allows general warnings. Duplicate will
+                # be removed, and the warnings will show near the end of
+                # the log.
+
+                warnings.simplefilter('once')
+                for dummy in self.run_operations(self.operations):
+                    # yield to GTK+ idle loop
+                    yield True
+                for w in ws:
+                    logger.warning(w.message)
+
+            # run deep scan
+            if self.deepscans:
+                for dummy in self.run_deep_scan():
+                    yield dummy
+        finally:
+            # Finish shredding, also when the run is closed or fails,
+            # because the queued files were already reported as deleted.
+            if FileUtilities.shred_batch is not None:
+                self.total_errors += FileUtilities.shred_batch.flush()
+                FileUtilities.shred_batch = None
+            logger.debug('scan cache: %d hits, %d misses',
+                         FileUtilities.scan_cache.hits, FileUtilities.scan_cache.misses)
+            FileUtilities.scan_cache = None
+            DeepScan.planned = None
 
         # delayed operations
         for op in sorted(self.delayed_ops):
@@ -311,6 +338,45 @@ class Worker:
 
         yield False
 
+    def plan_walks(self):
+        """Walk the trees shared by walk searches and deep scans once
+
+        The walks go into the scan cache, and the deep scan matches go
+        into DeepScan.planned."""
+        walks = []
+        deepscans = {}
+        for operation in self.operations:
+            try:
+                op_walks = []
+                op_deepscans = []
+                for option_id in self.operations[operation]:
+                    op_walks.extend(backends[operation].get_walks(option_id))
+                    op_deepscans.extend(
+                        backends[operation].get_deep_scan(option_id))
+            except Exception as e:
+                # The operation runs without a plan, and cleaning it
+                # reports any error that happens again.
+                logger.warning('Cannot plan the walks of %s: %s', operation, e)
+                continue
+            for key in op_walks:
+                if key not in walks:
+                    walks.append(key)
+            for (path, search) in op_deepscans:
+                if '' == path:
+                    path = os.path.expanduser('~')
+                deepscans.setdefault(path, []).append(search)
+        if not walks:
+            return
+        plan = DeepScan.WalkPlan(walks, deepscans, bleachbit.walk_workers)
+        try:
+            for dummy in plan.run(FileUtilities.scan_cache):
+                yield True
+        except Exception as e:
+            # the walks and deep scans run as if not planned
+            logger.warning('Cannot plan the walks: %s', e)
+            return
+        DeepScan.planned = plan.matches
+
     def run_deep_scan(self):
         """Run deep scans"""
         logger.debug(' deepscans=%s' % self.deepscans)
@@ -321,7 +387,12 @@ class Worker:
         yield True  # allow GTK to update the screen
         ds = DeepScan.DeepScan(self.deepscans)
 
-        for cmd in ds.scan():
+        scan = ds.scan()
+        for cmd in scan:
+            if self.is_aborted:
+                # stop the scan, including any threads
+                scan.close()
+                break
             if True == cmd:
                 yield True
                 continue
@@ -38,6 +38,38 @@ APP_URL = "https://www.bleachbit.org"
 
 socket_timeout = 10
 
+# Number of threads for walking large directory trees such as
+# search="walk.all". Use 1 to walk on the calling thread only.
+walk_workers = 4
+
+# Number of threads for matching files in a deep scan. Use 1 to scan
+# on the calling thread only.
+deep_scan_workers = 4
+
+# Regex of directory names which deep scans do not walk, for actions
+# without their own prune attribute. Use '' to walk every directory.
+deep_scan_prune = r'^(\.git|\.hg|\.svn|node_modules|\.snapshots|\.zfs|VirtualBox VMs)$'
+
+# Size in bytes of each write when overwriting file contents
+wipe_block_size = 1024 * 1024
+
+# Number of threads for filling free disk space, each with its own file
+wipe_path_workers = 2
+
+# Number of shredded files to overwrite before one sync removes them
+shred_batch_size = 1000
+
+# Number of processes for parsing CleanerML files that are not cached.
+# Use 1 to parse in this process only.
+cleanerml_workers = 4
+
+# Number of threads for checking which cleaners have nothing to clean
+# when the preference auto_hide is set
+probe_workers = 4
+
+# Number of directory walks and globs to remember during a Worker run
+scan_cache_size = 64
+
 if sys.version_info < (3,0,0):
     print('BleachBit no longer supports Python 2.x.')
     sys.exit(1)
@@ -104,6 +136,15 @@ elif 'nt' == os.name:
         options_dir = os.path.expandvars(r"${APPDATA}\BleachBit")
 options_file = os.path.join(options_dir, "bleachbit.ini")
 
+# parsed CleanerML definitions, reused while the XML files are unchanged.
+# Set to None to always parse the XML.
+cleanerml_cache_file = os.path.join(options_dir, "cleanerml_cache.json")
+
+# parsed and detected winapp2.ini sections, reused while the file and
+# the results of its detection are unchanged. Set to None to always
+# parse the file.
+winapp2_cache_file = os.path.join(options_dir, "winapp2_cache.json")
+
 # check whether the application is running from the source tree
 if not portable_mode:
     e1 = os.path.exists(os.path.join(bleachbit_exe_path, '../cleaners'))
@@ -119,8 +119,11 @@ class ActionTestCase(common.BleachbitTestCase):
             common.validate_result(self, result)
             self.assertNotEqual('/', result['path'])
             # delete
-            ret = next(cmd.execute(really_delete=True))
-            if 'delete' == command:
+            for ret in cmd.execute(really_delete=True):
+                pass
+            if isinstance(cmd, Command.DeleteTree) and not cmd.include_top:
+                self.assertTrue(dir_is_empty(cmd.path))
+            elif 'delete' == command:
                 self.assertNotLExists(cmd.path)
             elif 'truncate' == command:
                 self.assertLExists(filename)
@@ -168,6 +171,36 @@ class ActionTestCase(common.BleachbitTestCase):
                 self._test_action_str(action_str)
                 self.assertNotExists(filename)
 
+    def test_action_attributes(self):
+        """Providers accept a mapping of attributes like a DOM element"""
+        dirname = self.mkdtemp(prefix='bleachbit-action-attributes')
+        filename = self.write_file(os.path.join(dirname, 'foo.log'))
+        attrs = {'command': 'delete', 'search': 'walk.files',
+                 'path': dirname, 'regex': r'\.log$'}
+        action_str = '<action command="delete" search="walk.files" path="%s" regex="\\.log$" />' % dirname
+        dom_provider = Delete(parseString(action_str).childNodes[0])
+        self.assertEqual(action_attributes(
+            parseString(action_str).childNodes[0]), attrs)
+        dict_provider = Delete(attrs)
+        for attr in ('regex', 'nregex', 'search', 'object_type'):
+            self.assertEqual(getattr(dict_provider, attr),
+                             getattr(dom_provider, attr))
+        self.assertEqual(dict_provider.expand_paths(),
+                         dom_provider.expand_paths())
+        results = [next(cmd.execute(False))['path']
+                   for cmd in dict_provider.get_commands()]
+        self.assertEqual(results, [filename])
+
+    def test_deep_prune(self):
+        """Deep scans prune the default directories unless told otherwise"""
+        import bleachbit
+        attrs = {'command': 'delete', 'search': 'deep', 'regex': r'\.bak$'}
+        self.assertEqual(Delete(attrs).ds.prune, bleachbit.deep_scan_prune)
+        self.assertEqual(Delete(dict(attrs, prune='^foo$')).ds.prune, '^foo$')
+        self.assertEqual(Delete(dict(attrs, prune='')).ds.prune, '')
+        attrs['search'] = 'walk.files'
+        self.assertEqual(Delete(attrs).prune, '')
+
     def test_delete_special_filenames(self):
         """Unit test for deleting special filenames"""
         tests = [
@@ -457,6 +490,34 @@ class ActionTestCase(common.BleachbitTestCase):
             # The top directory no long exists, so just replay it.
             self._test_action_str(action_str, False)
 
+    def test_scan_cache(self):
+        """Unit test for sharing walks through FileUtilities.scan_cache"""
+        dirname = self.mkdtemp(prefix='bleachbit-action-scan-cache')
+        for fn in ('a.log', 'b.txt'):
+            common.touch_file(os.path.join(dirname, fn))
+        astrs = ['<action command="delete" search="walk.files" path="%s" />' % dirname,
+                 '<action command="delete" search="walk.files" regex="\\.log$" path="%s" />' % dirname,
+                 '<action command="delete" search="glob" path="%s/*.txt" />' % dirname]
+        FileUtilities.scan_cache = FileUtilities.ScanCache()
+        try:
+            for _rep in range(2):
+                paths = [sorted(cmd.path for cmd in _action_str_to_commands(astr))
+                         for astr in astrs]
+                self.assertEqual(paths, [
+                    [os.path.join(dirname, 'a.log'), os.path.join(dirname, 'b.txt')],
+                    [os.path.join(dirname, 'a.log')],
+                    [os.path.join(dirname, 'b.txt')]])
+            self.assertEqual(FileUtilities.scan_cache.misses, 2)
+            self.assertEqual(FileUtilities.scan_cache.hits, 4)
+
+            # Deleting beneath the root forgets the walk.
+            FileUtilities.delete(os.path.join(dirname, 'a.log'))
+            paths = [cmd.path for cmd in _action_str_to_commands(astrs[0])]
+            self.assertEqual(paths, [os.path.join(dirname, 'b.txt')])
+            self.assertEqual(FileUtilities.scan_cache.misses, 3)
+        finally:
+            FileUtilities.scan_cache = None
+
     def test_walk_files(self):
         """Unit test for walk.files"""
         paths = {'posix': '/var', 'nt': '$WINDIR\\system32'}
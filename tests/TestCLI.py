@@ -66,10 +66,20 @@ class CLITestCase(common.BleachbitTestCase):
             o = args_to_operations(test[0], False)
             self.assertEqual(o, test[1])
 
+    def test_args_to_operations_registers_only_named(self):
+        """args_to_operations() registers only the named cleaners"""
+        args_to_operations(['adobe_reader.mru', 'system.tmp'], False)
+        self.assertEqual(sorted(backends), ['adobe_reader', 'system'])
+
     def test_cleaners_list(self):
         """Unit test for cleaners_list()"""
         for cleaner in cleaners_list():
             self.assertIsString(cleaner)
+        # the index lists the same options as the registered cleaners
+        list(register_cleaners())
+        registered = ['%s.%s' % (c_id, o_id) for c_id in sorted(backends)
+                      for (o_id, __name) in backends[c_id].get_options()]
+        self.assertEqual(list(cleaners_list()), registered)
 
     @common.skipIfWindows
     def test_encoding(self):
@@ -106,6 +106,68 @@ class CleanerTestCase(common.BleachbitTestCase):
         for key in sorted(backends):
             self.assertIsInstance(backends[key].auto_hide(), bool)
 
+    def test_auto_hide_probe(self):
+        """Unit test for probing in auto_hide() and its kept verdicts"""
+        import mock
+        dirname = self.mkdtemp(prefix='bleachbit-test-auto-hide')
+        cleaner = actions_to_cleaner([
+            '<action command="delete" search="walk.all" path="%s"/>' % dirname,
+            '<action command="delete" search="file" path="%s"/>' % os.path.join(dirname, 'a.log')])
+        cleaner.id = 'test_auto_hide_probe'
+        self.assertIsNone(cleaner.cached_auto_hide())
+
+        # empty, so hide, and keep the verdict
+        self.assertTrue(cleaner.auto_hide())
+        self.assertTrue(cleaner.cached_auto_hide())
+        with mock.patch('bleachbit.Action.FileActionProvider.probe') as mock_probe:
+            self.assertTrue(cleaner.auto_hide())
+        mock_probe.assert_not_called()
+
+        # a new file changes the verdict, and probing does not need sizes
+        self.write_file(os.path.join(dirname, 'a.log'))
+        self.assertIsNone(cleaner.cached_auto_hide())
+        with mock.patch('bleachbit.FileUtilities.getsize') as mock_getsize:
+            self.assertFalse(cleaner.auto_hide())
+        mock_getsize.assert_not_called()
+        self.assertFalse(cleaner.cached_auto_hide())
+
+        # probes in background threads report the cleaners to hide
+        empty = actions_to_cleaner(
+            ['<action command="delete" search="walk.all" path="%s"/>' %
+             self.mkdtemp(prefix='bleachbit-test-auto-hide-empty')])
+        empty.id = 'test_auto_hide_probe_empty'
+        hidden = []
+        probes = auto_hide_async([cleaner, empty], hidden.append)
+        probes.join()
+        self.assertEqual(hidden, [empty])
+        self.assertTrue(all(thread.daemon for thread in probes.threads))
+        # after cancel(), the probe in progress reports nothing and the
+        # other probes do not start
+        import threading
+        started = threading.Event()
+        release = threading.Event()
+        slow = mock.Mock()
+        slow.auto_hide.side_effect = lambda: started.set() or release.wait()
+        queued = mock.Mock()
+        probes = auto_hide_async([slow, queued], hidden.append, workers=1)
+        started.wait()
+        probes.cancel()
+        release.set()
+        probes.join()
+        queued.auto_hide.assert_not_called()
+        self.assertEqual(hidden, [empty])
+        auto_hide_verdicts.pop(cleaner)
+        auto_hide_verdicts.pop(empty)
+
+        # a cleaner built again has no verdict, even with the same ID
+        self.assertTrue(empty.auto_hide())
+        rebuilt = actions_to_cleaner(
+            ['<action command="delete" search="walk.all" path="%s"/>' % dirname])
+        rebuilt.id = empty.id
+        self.assertIsNone(rebuilt.cached_auto_hide())
+        self.assertFalse(rebuilt.auto_hide())
+        self.assertTrue(empty.cached_auto_hide())
+
     def test_create_simple_cleaner(self):
         """Unit test for method create_simple_cleaner"""
         dirname = self.mkdtemp(prefix='bleachbit-test-create-simple-cleaner')
@@ -196,10 +258,39 @@ class CleanerTestCase(common.BleachbitTestCase):
         os.path.lexists = _lexists
         os.walk = _oswalk
 
+    def test_is_running(self):
+        """Unit test for Cleaner.is_running() and ProcessSnapshot"""
+        exe = os.path.basename(os.path.realpath(sys.executable))
+        cleaner = Cleaner()
+        self.assertFalse(cleaner.is_running())
+        cleaner.add_running('exe', 'does-not-exist')
+        cleaner.add_running('pathname', os.path.join(self.tempdir, '*.lock'))
+        processes.refresh()
+        self.assertFalse(cleaner.is_running())
+        self.assertIn(os.getpid(), processes.pids)
+
+        # The snapshot is kept until the next refresh.
+        lock_fn = os.path.join(self.tempdir, 'running.lock')
+        common.touch_file(lock_fn)
+        self.assertFalse(cleaner.is_running())
+        processes.refresh()
+        self.assertTrue(cleaner.is_running())
+        os.remove(lock_fn)
+
+        if 'posix' == os.name:
+            cleaner = Cleaner()
+            cleaner.add_running('exe', exe)
+            self.assertTrue(cleaner.is_running())
+
     def test_register_cleaners(self):
         """Unit test for register_cleaners"""
         list(register_cleaners())
+        first = dict(backends)
         list(register_cleaners())
+        # unchanged cleaners are registered again as the same objects
+        self.assertEqual(sorted(backends), sorted(first))
+        for cleaner_id in backends:
+            self.assertIs(backends[cleaner_id], first[cleaner_id])
 
     @common.skipIfWindows
     def test_whitelist(self):
@@ -90,6 +90,121 @@ class CleanerMLTestCase(common.BleachbitTestCase):
         shutil.rmtree(bleachbit.personal_cleaners_dir)
         bleachbit.personal_cleaners_dir = pcd
 
+    def test_load_cleaners_cache(self):
+        """Unit test for the cache of parsed CleanerML"""
+        import mock
+        import xml.etree.ElementTree
+        xml_str = """
+<cleaner id="testcache">
+    <label>cleaner label</label>
+    <description>cleaner description</description>
+    <var name="basepath">
+        <value>{tempdir}</value>
+    </var>
+    <option id="option1">
+        <label>option1 label</label>
+        <description>option1 description</description>
+        <warning>option1 warning</warning>
+        <action command="delete" search="file" path="$$basepath$$/test.log"/>
+    </option>
+</cleaner>
+""".format(tempdir=self.tempdir)
+        cml_path = os.path.join(self.tempdir, 'test.xml')
+        self.write_file(cml_path, xml_str.encode())
+        cache_path = os.path.join(self.tempdir, 'cache.json')
+        test_log_path = os.path.join(self.tempdir, 'test.log')
+        common.touch_file(test_log_path)
+        parse = xml.etree.ElementTree.iterparse
+        backends = dict(Cleaner.backends)
+
+        def load():
+            Cleaner.backends.clear()
+            with mock.patch('bleachbit.CleanerML.list_cleanerml_files',
+                            return_value=[cml_path]), \
+                    mock.patch('bleachbit.cleanerml_cache_file', cache_path), \
+                    mock.patch('xml.etree.ElementTree.iterparse', side_effect=parse) as mock_parse:
+                list(load_cleaners())
+            cleaner = Cleaner.backends['testcache']
+            self.assertEqual(cleaner.get_warning('option1'), 'option1 warning')
+            results = [result for cmd in cleaner.get_commands('option1')
+                       for result in cmd.execute(False)]
+            self.assertEqual([r['path'] for r in results], [test_log_path])
+            return cleaner, mock_parse.call_count
+
+        # first load parses the XML and writes the cache
+        cleaner, parse_count = load()
+        self.assertEqual(parse_count, 1)
+        self.assertExists(cache_path)
+        self.assertEqual(cleaner.get_name(), 'cleaner label')
+
+        # unchanged file is loaded from the cache, and the cleaner
+        # registered before is kept
+        first_cleaner = cleaner
+        cleaner, parse_count = load()
+        self.assertEqual(parse_count, 0)
+        self.assertIs(cleaner, first_cleaner)
+        self.assertEqual(cleaner.get_name(), 'cleaner label')
+
+        # changed file is parsed again
+        self.write_file(cml_path, xml_str.replace(
+            'cleaner label', 'new cleaner label').encode())
+        cleaner, parse_count = load()
+        self.assertEqual(parse_count, 1)
+        self.assertIsNot(cleaner, first_cleaner)
+        self.assertEqual(cleaner.get_name(), 'new cleaner label')
+        self.assertIs(bleachbit.CleanerML.registered[cml_path][1], cleaner)
+
+        # cache from another version is ignored
+        with mock.patch('bleachbit.APP_VERSION', '0.0'):
+            cleaner, parse_count = load()
+        self.assertEqual(parse_count, 1)
+        Cleaner.backends.clear()
+        Cleaner.backends.update(backends)
+
+    def test_load_definitions_parallel(self):
+        """Unit test for parsing CleanerML in worker processes"""
+        import mock
+        invalid_path = os.path.join(self.tempdir, 'invalid.xml')
+        self.write_file(invalid_path, b'<xml><broken>')
+        pathnames = sorted(list_cleanerml_files()) + [invalid_path]
+        with mock.patch('bleachbit.CleanerML.list_cleanerml_files', return_value=pathnames), \
+                mock.patch('bleachbit.cleanerml_cache_file', None):
+            serial = list(load_definitions())
+            with mock.patch('os.cpu_count', return_value=4), \
+                    mock.patch('bleachbit.CleanerML.cleanerml_files_per_worker', 2), \
+                    mock.patch('bleachbit.cleanerml_workers', 4):
+                progress = []
+                parallel = list(load_definitions(progress.append))
+        self.assertEqual(parallel, serial)
+        self.assertEqual([p for (p, _d) in parallel], pathnames[:-1])
+        self.assertEqual(progress[0], 0.0)
+        self.assertEqual(progress, sorted(progress))
+
+    def test_load_definitions_broken_pool(self):
+        """Parsing falls back to this process without forked workers"""
+        import mock
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+        pathnames = sorted(list_cleanerml_files())
+        with mock.patch('os.cpu_count', return_value=4), \
+                mock.patch('bleachbit.CleanerML.cleanerml_files_per_worker', 2), \
+                mock.patch('bleachbit.cleanerml_workers', 4), \
+                mock.patch('multiprocessing.get_all_start_methods',
+                           return_value=['spawn']):
+            self.assertEqual((None, {}), parse_definitions_parallel(pathnames))
+        broken = Future()
+        broken.set_exception(BrokenProcessPool('worker died'))
+        executor = mock.Mock()
+        with mock.patch('bleachbit.CleanerML.list_cleanerml_files', return_value=pathnames), \
+                mock.patch('bleachbit.cleanerml_cache_file', None):
+            serial = list(load_definitions())
+            with mock.patch('bleachbit.CleanerML.parse_definitions_parallel',
+                            return_value=(executor, {p: broken for p in pathnames})):
+                parallel = list(load_definitions())
+        self.assertEqual(parallel, serial)
+        self.assertEqual([p for (p, _d) in parallel], pathnames)
+        executor.shutdown.assert_called_once_with(wait=False)
+
     def test_os_match(self):
         """Unit test for os_match"""
         xmlcleaner = CleanerML("doc/example_cleaner.xml")
@@ -115,6 +230,57 @@ class CleanerMLTestCase(common.BleachbitTestCase):
         """Unit test for pot_fragment()"""
         self.assertIsString(pot_fragment("Foo", 'bar.xml'))
 
+    def test_PathVars(self):
+        """Unit test for lazy expansion of multi-value variables"""
+        import mock
+        from bleachbit import FileUtilities
+        for name in ('a', 'b'):
+            os.mkdir(os.path.join(self.tempdir, name))
+        definition = {'id': 'testpathvars', 'label': 'label', 'description': None,
+                      'vars': [['base', os.path.join(self.tempdir, '?'), True],
+                               ['base', '/nonexistent', False]],
+                      'options': [{'id': 'option1', 'label': 'label',
+                                   'description': 'description', 'warning': None,
+                                   'actions': [{'command': 'delete', 'search': 'file',
+                                                'path': '$$base$$/%s.log' % name}
+                                               for name in ('one', 'two')]}],
+                      'running': [], 'localizations': []}
+        with mock.patch('bleachbit.CleanerML.expand_glob_join',
+                        side_effect=expand_glob_join) as mock_glob:
+            cleaner = build_cleaner(definition)
+            self.assertEqual(mock_glob.call_count, 0)
+            providers = [provider for (option_id, provider) in cleaner.actions
+                         if 'option1' == option_id]
+            expected = ['/nonexistent/one.log',
+                        os.path.join(self.tempdir, 'a', 'one.log'),
+                        os.path.join(self.tempdir, 'b', 'one.log')]
+            self.assertEqual(sorted(os.path.normpath(path) for path
+                                    in providers[0].expand_paths()), expected)
+            self.assertEqual(mock_glob.call_count, 1)
+            # outside a run, each lookup expands the globs again
+            os.mkdir(os.path.join(self.tempdir, 'c'))
+            self.assertIn(os.path.join(self.tempdir, 'c', 'two.log'),
+                          [os.path.normpath(path)
+                           for path in providers[1].expand_paths()])
+            self.assertEqual(mock_glob.call_count, 2)
+            # during a run, both actions share one expansion
+            FileUtilities.scan_cache = FileUtilities.ScanCache()
+            try:
+                providers[0].expand_paths()
+                providers[1].expand_paths()
+                self.assertEqual(mock_glob.call_count, 3)
+                # a new run expands the globs again
+                FileUtilities.scan_cache = FileUtilities.ScanCache()
+                providers[0].expand_paths()
+                providers[1].expand_paths()
+            finally:
+                FileUtilities.scan_cache = None
+            self.assertEqual(mock_glob.call_count, 4)
+            # expand_multi_var() looks up only the variables in the path
+            path_vars = providers[0].path_vars
+            self.assertEqual(sorted(path_vars), ['base'])
+            self.assertEqual(len(path_vars), 1)
+
     def test_var(self):
         """Test the <var> element"""
         xml_str = r"""
@@ -24,7 +24,8 @@ Test case for module DeepScan
 """
 
 from tests import common
-from bleachbit.DeepScan import DeepScan, Search, normalized_walk
+from bleachbit.DeepScan import CompiledSearch, DeepScan, MultiSearch, Search, \
+    consolidate_roots, literal_suffixes, normalized_walk
 
 import os
 import sys
@@ -140,6 +141,260 @@ class DeepScanTestCase(common.BleachbitTestCase):
     def test_shred(self):
         self._test_delete('shred')
 
+    def test_literal_suffixes(self):
+        """Unit test for literal_suffixes()"""
+        tests = (('^Thumbs\\.db$', ['Thumbs.db']),
+                 ('^.*\\.sw[nop]$', ['.swn', '.swo', '.swp']),
+                 ('[a-zA-Z]{1,4}~$', ['~']),
+                 ('ab+c$', ['c']),
+                 ('\\.bak', None),
+                 ('a|b$', None),
+                 ('foo\\$', None),
+                 ('\\d$', None),
+                 ('[^a]$', None))
+        for (regex, expected) in tests:
+            self.assertEqual(literal_suffixes(regex), expected, regex)
+
+    def test_MultiSearch(self):
+        """Unit test for class MultiSearch"""
+        searches = [Search(command='delete', regex='\\.[Bb][Aa][Kk]$'),
+                    Search(command='delete', regex='^Thumbs\\.db$'),
+                    Search(command='shred', regex='bak', nregex='^keep'),
+                    Search(command='delete', regex='^.*\\.sw[nop]$',
+                           wholeregex='/vim/'),
+                    Search(command='delete', regex='(a)\\1$')]
+        filenames = ('foo.bak', 'keep.bak', 'bak.txt', 'foo.BAK', 'Thumbs.db',
+                     'xThumbs.db', '.x.swp', 'aa', 'ab', 'foo.txt',
+                     'bak.bak', 'keep.txt.bak')
+        for dirpath in ('/home/user', '/home/vim/x'):
+            for n in range(1, len(searches) + 1):
+                multi = MultiSearch(searches[:n])
+                compiled = [CompiledSearch(s) for s in searches[:n]]
+                for filename in filenames:
+                    commands = set(c.command for c in compiled
+                                   if c.match(dirpath, filename))
+                    expected = None
+                    if commands:
+                        command = 'shred' if 'shred' in commands else 'delete'
+                        expected = (os.path.join(dirpath, filename), command)
+                    self.assertEqual(multi.match(dirpath, filename), expected,
+                                     (dirpath, filename, n))
+        # the suffix test is enough to reject most files
+        multi = MultiSearch(searches[:2])
+        self.assertIsNotNone(multi.suffixes)
+        self.assertIsNone(multi.match('/tmp', 'foo.txt'))
+        # the suffix test also understands fnmatch patterns
+        import fnmatch
+        multi = MultiSearch([Search(command='delete', regex=fnmatch.translate('*.tmp')),
+                             Search(command='delete', regex='^Thumbs\\.db$')])
+        self.assertEqual(sorted(x.lower() for x in multi.suffixes), ['.tmp', 'thumbs.db'])
+        self.assertEqual(multi.match('/tmp', 'a.tmp'), ('/tmp/a.tmp', 'delete'))
+        # a search without a basename regex disables the suffix test
+        multi = MultiSearch([Search(command='delete', wholeregex='/vim/.*')])
+        self.assertIsNone(multi.suffixes)
+        self.assertEqual(multi.match('/home/vim', 'a'), ('/home/vim/a', 'delete'))
+        self.assertIsNone(multi.match('/home/user', 'a'))
+
+    def test_consolidate_roots(self):
+        """Unit test for consolidate_roots()"""
+        home = os.path.abspath(os.path.expanduser('~'))
+        a = os.path.join(self.tempdir, 'a')
+        ab = os.path.join(self.tempdir, 'a b')
+        ax = os.path.join(self.tempdir, 'a', 'x')
+        searches = {'': [1], '~': [2], os.path.join('~', 'Documents'): [3],
+                    a: [4], ab: [5], ax + os.sep: [6]}
+        tops = consolidate_roots(searches)
+        self.assertEqual(tops[home], {home: [1, 2],
+                                      os.path.join(home, 'Documents'): [3]})
+        self.assertEqual(tops[a], {a: [4], ax: [6]})
+        self.assertEqual(tops[ab], {ab: [5]})
+        self.assertEqual(len(tops), 3)
+
+    def test_nested_roots(self):
+        """Deep scan of nested roots walks once and yields each file once"""
+        outer = os.path.join(self.tempdir, 'outer')
+        inner = os.path.join(outer, 'inner')
+        os.makedirs(inner)
+        f_outer = self.write_file(os.path.join(outer, 'a.bak'))
+        f_inner = self.write_file(os.path.join(inner, 'b.bak'))
+        f_tmp_outer = self.write_file(os.path.join(outer, 'c.tmp'))
+        f_tmp_inner = self.write_file(os.path.join(inner, 'd.tmp'))
+        searches = {outer: [Search(command='delete', regex='\\.bak$')],
+                    inner + os.sep: [Search(command='delete', regex='\\.bak$'),
+                                     Search(command='shred', regex='\\.tmp$')]}
+        import mock
+        with mock.patch('bleachbit.DeepScan.normalized_walk',
+                        wraps=normalized_walk) as mock_walk:
+            cmds = [cmd for cmd in DeepScan(searches, workers=1).scan()
+                    if cmd is not True]
+        mock_walk.assert_called_once_with(outer)
+        paths = sorted(cmd.path for cmd in cmds)
+        self.assertEqual(paths, sorted([f_outer, f_inner, f_tmp_inner]))
+        self.assertTrue([cmd for cmd in cmds if cmd.path == f_tmp_inner][0].shred)
+        self.assertNotIn(f_tmp_outer, paths)
+
+    @common.skipIfWindows
+    def test_symlink_root(self):
+        """Deep scan of a symlinked root yields paths under the link name"""
+        from bleachbit.Options import options
+        real = os.path.join(self.tempdir, 'real')
+        os.mkdir(real)
+        link = os.path.join(self.tempdir, 'link')
+        os.symlink(real, link)
+        for fn in ('keep.tmp', 'other.tmp'):
+            self.write_file(os.path.join(real, fn))
+        # the inner root is inside the link only through the symlink
+        tops = consolidate_roots({link: [1], os.path.join(real, 'sub'): [2]})
+        self.assertEqual(tops, {link: {link: [1],
+                                       os.path.join(link, 'sub'): [2]}})
+
+        old_whitelist = options.get_whitelist_paths()
+        options.set_whitelist_paths([('file', os.path.join(link, 'keep.tmp'))])
+        try:
+            for workers in (1, 2):
+                searches = {link: [Search(command='delete', regex='\\.tmp$')]}
+                cmds = [cmd for cmd in DeepScan(searches, workers=workers).scan()
+                        if cmd is not True]
+                self.assertEqual(sorted(cmd.path for cmd in cmds),
+                                 [os.path.join(link, 'keep.tmp'),
+                                  os.path.join(link, 'other.tmp')])
+                labels = {cmd.path: next(cmd.execute(False))['label']
+                          for cmd in cmds}
+                self.assertEqual('Skip', labels[os.path.join(link, 'keep.tmp')])
+                self.assertEqual('Delete', labels[os.path.join(link, 'other.tmp')])
+        finally:
+            options.set_whitelist_paths(old_whitelist)
+
+    def test_parallel(self):
+        """Parallel deep scan gives the same results in the same order"""
+        top = os.path.join(self.tempdir, 'parallel')
+        expected = []
+        for i in range(5):
+            for sub in ('', 'x', os.path.join('x', 'y')):
+                dirname = os.path.join(top, 'd%d' % i, sub)
+                os.makedirs(dirname, exist_ok=True)
+                for j in range(3):
+                    expected.append(self.write_file(os.path.join(dirname, 'f%d.bak' % j)))
+                self.write_file(os.path.join(dirname, 'keep.txt'))
+        expected.append(self.write_file(os.path.join(top, 'top.bak')))
+        if 'posix' == os.name:
+            # a symlink to a directory is not followed
+            os.symlink(os.path.join(top, 'd0'), os.path.join(top, 'link'))
+        searches = {top: [Search(command='delete', regex='\\.bak$')]}
+
+        def scan(workers, queue_size=64):
+            ds = DeepScan(searches, workers)
+            ds.queue_size = queue_size
+            return [cmd.path for cmd in ds.scan() if cmd is not True]
+        serial = scan(1)
+        self.assertEqual(sorted(serial), sorted(expected))
+        self.assertEqual(scan(4), serial)
+        self.assertEqual(scan(2, queue_size=1), serial)
+
+        # Stopping early does not hang or leave the workers blocked.
+        ds = DeepScan(searches, 4)
+        ds.queue_size = 1
+        scan_gen = ds.scan()
+        next(cmd for cmd in scan_gen if cmd is not True)
+        scan_gen.close()
+
+    def test_prune(self):
+        """Deep scan does not walk pruned directories"""
+        top = os.path.join(self.tempdir, 'prune')
+        for sub in ('.git', os.path.join('.git', 'objects'), 'node_modules',
+                    os.path.join('node_modules', 'inner'), 'src'):
+            os.makedirs(os.path.join(top, sub))
+            self.write_file(os.path.join(top, sub, 'x.bak'))
+            self.write_file(os.path.join(top, sub, 'x.tmp'))
+        inner = os.path.join(top, 'node_modules', 'inner')
+
+        def scan(searches, workers):
+            return sorted(cmd.path for cmd in DeepScan(searches, workers).scan()
+                          if cmd is not True)
+
+        def paths(*subdirs):
+            return sorted(os.path.join(top, path) for path in subdirs)
+
+        bak = Search(command='delete', regex='\\.bak$',
+                     prune='^(\\.git|node_modules)$')
+        tmp = Search(command='delete', regex='\\.tmp$', prune='^\\.git$')
+        inner_tmp = Search(command='delete', regex='\\.tmp$')
+        for workers in (1, 4):
+            # every search prunes the directories
+            import mock
+            with mock.patch('os.scandir', wraps=os.scandir) as mock_scandir:
+                self.assertEqual(scan({top: [bak]}, workers),
+                                 paths('src/x.bak'))
+            self.assertTrue(mock_scandir.called)
+            for call in mock_scandir.call_args_list:
+                self.assertNotIn('.git', str(call))
+                self.assertNotIn('node_modules', str(call))
+            # node_modules is pruned by one search, but not the other
+            self.assertEqual(scan({top: [bak, tmp]}, workers),
+                             paths('node_modules/inner/x.tmp', 'node_modules/x.tmp',
+                                   'src/x.bak', 'src/x.tmp'))
+            # a root inside a pruned directory is still scanned
+            self.assertEqual(scan({top: [bak], inner: [inner_tmp]}, workers),
+                             paths('node_modules/inner/x.tmp', 'src/x.bak'))
+
+    def test_WalkPlan(self):
+        """Unit test for class WalkPlan"""
+        import mock
+        import bleachbit.DeepScan
+        from bleachbit import FileUtilities
+        top = os.path.realpath(os.path.join(self.tempdir, 'plan'))
+        for sub in ('a', os.path.join('a', 'b'), 'c', 'node_modules'):
+            os.makedirs(os.path.join(top, sub))
+            self.write_file(os.path.join(top, sub, 'x.bak'))
+            self.write_file(os.path.join(top, sub, 'y.txt'))
+        # a walk inside a directory which the deep scan prunes
+        os.makedirs(os.path.join(top, 'node_modules', 'cache'))
+        self.write_file(os.path.join(top, 'node_modules', 'cache', 'z.bak'))
+        walks = [('walk.all', os.path.join(top, 'a')),
+                 ('walk.files', os.path.join(top, 'a', 'b') + os.sep),
+                 ('walk.top', os.path.join(top, 'node_modules', 'cache')),
+                 ('walk.all', os.path.join(self.tempdir, 'not-shared'))]
+        searches = {top: [Search(command='delete', regex='\\.bak$',
+                                 prune='^node_modules$')]}
+        expected = list(DeepScan(searches, 1).scan())
+
+        scan_cache = FileUtilities.ScanCache()
+        plan = bleachbit.DeepScan.WalkPlan(walks, searches, 2)
+        with mock.patch('bleachbit.FileUtilities.list_directory',
+                        wraps=FileUtilities.list_directory) as mock_list:
+            list(plan.run(scan_cache))
+        listed = [call[0][0] for call in mock_list.call_args_list]
+        # every directory is read once, and the pruned directory only
+        # as far as the walk needs
+        self.assertEqual(sorted(listed), sorted(set(listed)))
+        self.assertIn(os.path.join(top, 'node_modules', 'cache'), listed)
+        self.assertEqual(len(listed), 6)
+
+        # the walks are in the scan cache, the same as walking alone
+        for (search, path) in walks[:3]:
+            cached = scan_cache.get((search, path))
+            self.assertIsNotNone(cached, path)
+            walked = list(FileUtilities.children_in_directory(
+                path, 'walk.files' != search))
+            if 'walk.top' == search:
+                walked.append(path)
+            self.assertEqual(cached, walked)
+        self.assertIsNone(scan_cache.get(walks[3]))
+
+        # the deep scan uses the matches
+        self.assertEqual(list(plan.matches), [top])
+        os.remove(os.path.join(top, 'c', 'x.bak'))
+        try:
+            bleachbit.DeepScan.planned = plan.matches
+            with mock.patch('bleachbit.DeepScan.normalized_walk') as mock_walk:
+                cmds = list(DeepScan(searches, 1).scan())
+            mock_walk.assert_not_called()
+        finally:
+            bleachbit.DeepScan.planned = None
+        self.assertEqual([cmd.path for cmd in cmds if cmd is not True],
+                         [cmd.path for cmd in expected if cmd is not True
+                          and cmd.path != os.path.join(top, 'c', 'x.bak')])
+
     @unittest.skipUnless('darwin' == sys.platform, 'Not on Darwin')
     def test_normalized_walk_darwin(self):
         import mock
@@ -30,6 +30,8 @@ from bleachbit.Options import options
 from bleachbit import logger
 
 import json
+import re
+import shutil
 import sys
 import unittest
 
@@ -191,6 +193,13 @@ class FileUtilitiesTestCase(common.BleachbitTestCase):
             self.assertEqual(loopfilename, filename)
         for loopfilename in children_in_directory(dirname, False):
             self.assertEqual(loopfilename, filename)
+            # the walk caches the type and lstat() for later use
+            self.assertIsInstance(loopfilename, FileRecord)
+            self.assertTrue(loopfilename.is_file())
+            self.assertFalse(loopfilename.is_dir())
+            self.assertEqual(loopfilename.lstat().st_ino,
+                             os.lstat(filename).st_ino)
+            self.assertEqual(getsize(loopfilename), getsize(filename))
         os.remove(filename)
 
         # test subdirectory
@@ -198,13 +207,54 @@ class FileUtilitiesTestCase(common.BleachbitTestCase):
         os.mkdir(subdirname)
         for filename in children_in_directory(dirname, True):
             self.assertEqual(filename, subdirname)
+            self.assertTrue(filename.is_dir())
         for filename in children_in_directory(dirname, False):
             raise AssertionError(
                 'Found a file that shouldn\'t have been found: ' + filename)
         os.rmdir(subdirname)
 
+        # children come before their parent, so they can be deleted in order
+        subfilename = os.path.join(subdirname, 'subfile')
+        common.touch_file(subfilename)
+        children = list(children_in_directory(dirname, True))
+        self.assertEqual(children, [subfilename, subdirname])
+        for child in children:
+            delete(child)
+        self.assertNotExists(subdirname)
+
         os.rmdir(dirname)
 
+    def test_children_in_directory_parallel(self):
+        """Parallel walk gives the same results in the same order"""
+        dirname = self.mkdtemp(prefix='bleachbit-test-children-parallel')
+        for subdir in ('a', 'a/b', 'a/b/c', 'd', 'e', 'e/f'):
+            os.mkdir(os.path.join(dirname, subdir))
+            for i in range(3):
+                common.touch_file(os.path.join(dirname, subdir, str(i)))
+        serial = list(children_in_directory(dirname, True))
+        self.assertEqual(len(serial), 6 + 6 * 3)
+        for workers in (2, 8):
+            parallel = list(children_in_directory(dirname, True, workers))
+            self.assertEqual(serial, parallel)
+            self.assertEqual(getsizedir(dirname), getsizedir(dirname, workers))
+        # children come before their parent
+        self.assertLess(serial.index(os.path.join(dirname, 'a', 'b', 'c')),
+                        serial.index(os.path.join(dirname, 'a', 'b')))
+        # stopping early is clean
+        walker = children_in_directory(dirname, True, 4)
+        next(walker)
+        walker.close()
+        # missing directory
+        self.assertEqual(
+            [], list(children_in_directory(os.path.join(dirname, 'missing'), True, 4)))
+        # pruned subdirectories are neither listed nor walked
+        prune = re.compile('^[bd]$').search
+        expected = [path for path in serial
+                    if not re.search(r'/(a/b|d)(/|$)', path[len(dirname):])]
+        for workers in (1, 4):
+            self.assertEqual(
+                list(children_in_directory(dirname, True, workers, prune)), expected)
+
     def test_clean_ini(self):
         """Unit test for clean_ini()"""
         print("testing test_clean_ini() with shred = False")
@@ -225,6 +275,48 @@ class FileUtilitiesTestCase(common.BleachbitTestCase):
         options.set('shred', True, commit=False)
         test_json_helper(self, clean_json)
 
+    def test_compile_regex(self):
+        """Unit test for compile_regex() and class LiteralRegex"""
+        import fnmatch
+        patterns = [r'\.[Bb][Aa][Kk]$', r'^Thumbs\.db$', r'^.*\.sw[nop]$',
+                    r'[a-zA-Z]{1,4}~$', r'bak$', r'^foo', r'foo', r'^(a|bc)$',
+                    r'\.(jpg|png)$', r'^a|b$', r'(?s:.*a|b)\Z', r'\$$', r'a\\$',
+                    r'^x.*', r'\.*$', r'^log\.[0-9]$', r'(?i)abc', r'.*', r'a.b',
+                    r'^.*foo']
+        patterns += [fnmatch.translate(pattern) for pattern in
+                     ('*.tmp', 'Thumbs.db', '~*', '*.[bB]ak', '*.??_', '*')]
+        names = ['x.bak', 'X.BAK', 'bak', 'Thumbs.db', 'xThumbs.db', 'thumbs.db',
+                 '.x.swp', 'abc~', '~x', 'foo', 'afoo', 'foob', 'a', 'bc', 'abc',
+                 'b', '$', 'a$', 'a\\', 'x', 'xx.', '..', 'log.1', 'ABC', 'a.b',
+                 'x.bak\n', 'x\n.bak', 'a\nfoo', 'a.tmp', 'ä.bak', 'K.BAK',
+                 '.TMP', '']
+        for flags in (0, re.IGNORECASE):
+            for pattern in patterns:
+                regex = re.compile(pattern, flags)
+                compiled = compile_regex(pattern, flags)
+                self.assertIs(compiled, compile_regex(pattern, flags))
+                literals = regex_literals(pattern)
+                lowered = [compiled]
+                if literals is not None:
+                    lowered.append(LiteralRegex(regex, *literals))
+                for name in names:
+                    for c in lowered:
+                        self.assertEqual(bool(c.search(name)), bool(regex.search(name)),
+                                         (pattern, flags, name, c))
+        self.assertEqual(regex_literals(r'^.*\.sw[nop]$'),
+                         (frozenset(('.swn', '.swo', '.swp')), False, True))
+        self.assertEqual(regex_literals(fnmatch.translate('~*')),
+                         (frozenset('~'), False, False))
+        self.assertIsNone(regex_literals(r'^a|b$'))
+        # exact names and leading .* are tested without the regex engine
+        self.assertIsInstance(compile_regex(r'^(Thumbs\.db|desktop\.ini)$'), LiteralRegex)
+        self.assertIsInstance(compile_regex(fnmatch.translate('*.tmp')), LiteralRegex)
+        self.assertNotIsInstance(compile_regex(r'\.bak$'), LiteralRegex)
+        # the fallback for Python before 3.7
+        for name in names:
+            self.assertEqual(is_ascii_encodable(name),
+                             all(ord(c) < 128 for c in name), name)
+
     def test_delete(self):
         """Unit test for method delete()"""
         print("testing delete() with shred = False")
@@ -396,6 +488,23 @@ class FileUtilitiesTestCase(common.BleachbitTestCase):
             delete(fn, shred=shred)
             self.assertNotExists(fn)
 
+    @common.skipIfWindows
+    def test_delete_replaced(self):
+        """Unit test for delete() with a file replaced after its walk"""
+        dirname = self.mkdtemp(prefix='bleachbit-test-delete-replaced')
+        outside = self.write_file(os.path.join(self.mkdtemp(), 'keep'), b'data')
+        fn = self.write_file(os.path.join(dirname, 'file'), b'secret')
+        records = list(children_in_directory(dirname, False))
+        self.assertEqual(records, [fn])
+        # Command.Delete asks the size before deleting.
+        self.assertEqual(getsize(records[0]), getsize(fn))
+        os.remove(fn)
+        os.symlink(outside, fn)
+        delete(records[0], shred=True)
+        self.assertNotLExists(fn)
+        with open(outside, 'rb') as f:
+            self.assertEqual(f.read(), b'data')
+
     @common.skipUnlessWindows
     def test_delete_hidden(self):
         """Unit test for delete() with hidden file"""
@@ -832,6 +941,38 @@ class FileUtilitiesTestCase(common.BleachbitTestCase):
 
         options.set_whitelist_paths(old_whitelist)
 
+    def test_whitelist_matcher(self):
+        """Unit test for PathMatcher and its cache in get_whitelist()"""
+        sep = os.sep
+        folder = sep + sep.join(('home', 'folder'))
+        matcher = PathMatcher([('file', sep + sep.join(('home', 'foo'))),
+                               ('folder', folder)],
+                              regexes=('^/tmp/ksocket-', '^/tmp/pulse-[^/]+/pid$'))
+        self.assertTrue(matcher)
+        self.assertTrue(matcher.match(folder))
+        self.assertTrue(matcher.match(folder + sep))
+        self.assertTrue(matcher.match(sep.join((folder, 'sub', 'file'))))
+        self.assertFalse(matcher.match(folder + '2'))
+        self.assertTrue(matcher.match('/tmp/ksocket-foo/secret-cookie'))
+        self.assertTrue(matcher.match('/tmp/pulse-foo/pid'))
+        self.assertFalse(matcher.match('/tmp/pulse-foo/pid2'))
+        self.assertFalse(matcher.match('/var/tmp/ksocket-foo'))
+        self.assertFalse(PathMatcher())
+        self.assertFalse(PathMatcher().match(folder))
+
+        insensitive = PathMatcher([('folder', folder)], case_sensitive=False)
+        self.assertTrue(insensitive.match(folder.upper() + sep + 'FILE'))
+
+        # The compiled whitelist is reused until the whitelist changes.
+        old_whitelist = options.get_whitelist_paths()
+        options.set_whitelist_paths([('folder', folder)])
+        self.assertIs(get_whitelist(), get_whitelist())
+        self.assertTrue(whitelisted(folder))
+        options.set_whitelist_paths([])
+        self.assertFalse(get_whitelist())
+        self.assertFalse(whitelisted(folder))
+        options.set_whitelist_paths(old_whitelist)
+
     def test_whitelisted_speed(self):
         """Benchmark the speed of whitelisted()
 
@@ -879,6 +1020,208 @@ class FileUtilitiesTestCase(common.BleachbitTestCase):
         # clean up
         os.remove(filename)
 
+    @common.skipIfWindows
+    def test_wipe_contents_symlink(self):
+        """Unit test for wipe_contents() not following a symlink"""
+        target = self.write_file(os.path.join(self.mkdtemp(), 'keep'), b'data')
+        link = os.path.join(self.mkdtemp(), 'link')
+        os.symlink(target, link)
+        self.assertRaises(OSError, wipe_contents, link)
+        with open(target, 'rb') as f:
+            self.assertEqual(f.read(), b'data')
+
+    @unittest.skipUnless(delete_tree_supported, 'requires dir_fd support')
+    def test_delete_tree(self):
+        """Unit test for delete_tree()"""
+        outside = os.path.join(self.tempdir, 'bleachbit-test-tree-outside')
+        os.mkdir(outside)
+        outside_fn = self.write_file(os.path.join(outside, 'keep'), b'x')
+        for shred in (False, True):
+            top = os.path.join(self.tempdir, 'bleachbit-test-tree')
+            os.makedirs(os.path.join(top, 'a', 'b'))
+            os.mkdir(os.path.join(top, 'c'))
+            for dirname in ('', 'a', os.path.join('a', 'b')):
+                self.write_file(os.path.join(top, dirname, 'file'), b'secret')
+            os.symlink(outside, os.path.join(top, 'c', 'link'))
+            kept = os.path.join(top, 'a', 'file')
+
+            # preview
+            results = list(delete_tree(top, really_delete=False))
+            paths = [path for (path, _st, _whitelisted) in results]
+            self.assertEqual(len(paths), 7)
+            self.assertLess(paths.index(os.path.join(top, 'a', 'b', 'file')),
+                            paths.index(os.path.join(top, 'a', 'b')))
+            self.assertLess(paths.index(os.path.join(top, 'a', 'b')),
+                            paths.index(os.path.join(top, 'a')))
+            for path in paths:
+                self.assertLExists(path)
+
+            # delete, but keep one file
+            results = list(delete_tree(top, shred=shred,
+                                       whitelisted=lambda path: path == kept))
+            self.assertEqual([path for (path, _st, whitelisted) in results if whitelisted],
+                             [kept])
+            self.assertEqual(os.listdir(top), ['a'])
+            self.assertEqual(os.listdir(os.path.join(top, 'a')), ['file'])
+            self.assertExists(outside_fn)
+
+            # delete the rest and the top directory
+            results = list(delete_tree(top, include_top=True, shred=shred))
+            self.assertEqual([path for (path, _st, _whitelisted) in results],
+                             [kept, os.path.join(top, 'a'), top])
+            self.assertNotExists(top)
+        self.assertExists(outside_fn)
+
+    @common.skipIfWindows
+    def test_delete_tree_read_only(self):
+        """Unit test for delete_tree() shredding a read-only file"""
+        import mock
+        top = os.path.join(self.tempdir, 'bleachbit-test-tree-read-only')
+        os.mkdir(top)
+        filename = self.write_file(os.path.join(top, 'file'), b'secret')
+        os.chmod(filename, 0o444)
+        real_open = os.open
+
+        def open_as_user(path, flags, *args, dir_fd=None, **kwargs):
+            # Root may write to any file, so deny it as for other users.
+            if flags & os.O_WRONLY and \
+                    not os.stat(path, dir_fd=dir_fd).st_mode & stat.S_IWUSR:
+                raise OSError(errno.EACCES, 'Permission denied', path)
+            return real_open(path, flags, *args, dir_fd=dir_fd, **kwargs)
+        with mock.patch('os.open', side_effect=open_as_user), \
+                mock.patch('bleachbit.FileUtilities.overwrite_fd',
+                           wraps=overwrite_fd) as mock_overwrite:
+            results = list(delete_tree(top, include_top=True, shred=True))
+        self.assertEqual([path for (path, _st, _whitelisted) in results],
+                         [filename, top])
+        mock_overwrite.assert_called_once()
+        self.assertNotExists(top)
+
+    def test_ScanCache(self):
+        """Unit test for class ScanCache"""
+        calls = []
+
+        def func(path):
+            calls.append(path)
+            return [os.path.join(path, str(i)) for i in range(3)]
+
+        home = os.path.expanduser('~')
+        cache = ScanCache(max_entries=2)
+        self.assertEqual(cache.root(os.path.join(home, '*', 'x')), home)
+        self.assertEqual(cache.root(home + os.sep), home)
+        for path in ('a', 'b', 'a', 'c', 'b'):
+            key = ('walk.files', os.path.join(home, path))
+            self.assertEqual(list(cache.cached(key, func)),
+                             func(key[1]))
+        # b was evicted when c was added, because a was used more recently.
+        self.assertEqual([os.path.basename(path) for path in calls],
+                         ['a', 'a', 'b', 'b', 'a', 'c', 'c', 'b', 'b'])
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+
+        # An incomplete walk is not kept.
+        key = ('walk.files', os.path.join(home, 'd'))
+        next(cache.cached(key, func))
+        self.assertIsNone(cache.get(key))
+
+        # Deleting a parent or a child forgets the walk.
+        key_b = ('walk.files', os.path.join(home, 'b'))
+        self.assertIsNotNone(cache.get(key_b))
+        cache.invalidate(os.path.join(home, 'b', 'x'))
+        self.assertIsNone(cache.get(key_b))
+        key_c = ('walk.files', os.path.join(home, 'c'))
+        cache.invalidate(os.path.join(home, 'bb'))
+        self.assertIsNotNone(cache.get(key_c))
+        cache.invalidate(home)
+        self.assertIsNone(cache.get(key_c))
+
+    @common.skipIfWindows
+    def test_ScanCache_lexists_iglob(self):
+        """Unit test for ScanCache.lexists() and ScanCache.iglob()"""
+        top = os.path.join(self.tempdir, 'bleachbit-test-scan-cache-glob')
+        for profile in ('Default', 'Profile 1', '.hidden'):
+            os.makedirs(os.path.join(top, profile, 'Cache'))
+            for fn in ('History', 'Cookies', '.lock'):
+                common.touch_file(os.path.join(top, profile, fn))
+        common.touch_file(os.path.join(top, 'Local State'))
+        cache = ScanCache()
+        patterns = ['*', '.*', '*/History', '*/*', '*/.*', '*/[CH]*',
+                    '*/Cache', '*/', 'Default/Cook?es', 'missing/*', '*/*/*']
+        for pattern in patterns:
+            pathname = os.path.join(top, pattern)
+            self.assertEqual(sorted(cache.iglob(pathname)),
+                             sorted(glob.iglob(pathname)), pattern)
+        for fn in ('Default/History', 'Default/.lock', 'Default/nope',
+                   'missing/History', 'Local State'):
+            path = os.path.join(top, fn)
+            self.assertEqual(cache.lexists(path), os.path.lexists(path), fn)
+
+        # Deleting updates the listing.
+        history = os.path.join(top, 'Default', 'History')
+        os.remove(history)
+        self.assertTrue(cache.lexists(history))
+        cache.invalidate(history)
+        self.assertFalse(cache.lexists(history))
+        shutil.rmtree(os.path.join(top, 'Profile 1'))
+        cache.invalidate(os.path.join(top, 'Profile 1'), tree=True)
+        self.assertEqual(list(cache.iglob(os.path.join(top, '*', 'History'))), [])
+
+    @common.skipIfWindows
+    def test_ShredBatch(self):
+        """Unit test for class ShredBatch"""
+        import bleachbit.FileUtilities
+        dirname = os.path.join(self.tempdir, 'bleachbit-test-shred-batch')
+        os.mkdir(dirname)
+        filenames = [os.path.join(dirname, 'file%d' % i) for i in range(4)]
+        for filename in filenames:
+            self.write_file(filename, b'secret' * 1000)
+        batch = ShredBatch(max_files=3)
+        bleachbit.FileUtilities.shred_batch = batch
+        try:
+            for filename in filenames:
+                delete(filename, shred=True)
+            # The first three were removed together, and the last waits.
+            for filename in filenames[:3]:
+                self.assertNotExists(filename)
+            with open(filenames[3], 'rb') as f:
+                self.assertEqual(set(f.read()), {0})
+            # The directory waits for the file in it.
+            delete(dirname, shred=True)
+            self.assertExists(dirname)
+            self.assertEqual(batch.flush(), 0)
+            self.assertNotExists(dirname)
+            self.assertEqual(batch.flush(), 0)
+        finally:
+            bleachbit.FileUtilities.shred_batch = None
+
+    def test_overwrite_fd(self):
+        """Unit test for overwrite_fd() and wipe_contents_progress()"""
+        contents = b'abcdefghij' * 12345
+        filename = self.write_file('bleachbit-test-overwrite', contents)
+        for patterns, expected in (((WIPE_ONES,), b'\xff'),
+                                   ((WIPE_RANDOM, WIPE_ZEROS), b'\x00')):
+            fd = os.open(filename, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+            # Use a small block size to overwrite with several writes.
+            progress = list(overwrite_fd(
+                fd, len(contents), patterns, block_size=4096))
+            os.close(fd)
+            self.assertEqual(progress[-1], len(contents) * len(patterns))
+            self.assertEqual(progress, sorted(progress))
+            with open(filename, 'rb') as f:
+                self.assertEqual(f.read(), expected * len(contents))
+
+        # The random buffer is reused.
+        self.assertEqual(wipe_buffer(WIPE_RANDOM, 4096).tobytes(),
+                         wipe_buffer(WIPE_RANDOM, 4096).tobytes())
+
+        # Overwrite without truncating.
+        list(wipe_contents_progress(filename, truncate=False))
+        with open(filename, 'rb') as f:
+            data = f.read()
+        self.assertGreaterEqual(len(data), len(contents))
+        self.assertEqual(data, b'\x00' * len(data))
+        list(wipe_contents_progress(filename))
+        self.assertEqual(os.path.getsize(filename), 0)
+
     def wipe_name_helper(self, filename):
         """Helper for test_wipe_name()"""
 
@@ -944,7 +1287,15 @@ class FileUtilitiesTestCase(common.BleachbitTestCase):
             pass
 
     def test_wipe_path_fast(self):
-        next(wipe_path(self.tempdir, True))
+        before = sorted(os.listdir(self.tempdir))
+        gen = wipe_path(self.tempdir, True)
+        (phase, done_percent, remaining_seconds) = next(gen)
+        self.assertEqual(phase, 1)
+        self.assertGreater(done_percent, 0)
+        self.assertIsInstance(remaining_seconds, int)
+        # Stopping early removes the temporary files.
+        gen.close()
+        self.assertEqual(sorted(os.listdir(self.tempdir)), before)
 
     def test_vacuum_sqlite3(self):
         """Unit test for method vacuum_sqlite3()"""
@@ -990,6 +1341,19 @@ class FileUtilitiesTestCase(common.BleachbitTestCase):
                          time.time() - openfiles.last_scan_time,
                          openfiles.files))
 
+        # The file is found by inode, also under another name.
+        linkname = filename + '-link'
+        os.symlink(filename, linkname)
+        self.assertTrue(openfiles.is_open(linkname))
+        os.unlink(linkname)
+        for record in children_in_directory(self.tempdir):
+            if record == filename:
+                self.assertTrue(openfiles.is_open(record))
+
+        # Rescanning reuses the descriptors already seen.
+        openfiles.scan()
+        self.assertTrue(openfiles.is_open(filename))
+
         f.close()
         openfiles.scan()
         self.assertFalse(openfiles.is_open(filename))
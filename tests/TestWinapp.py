@@ -27,7 +27,10 @@ import sys
 import tempfile
 import unittest
 
+import mock
+
 from tests import common
+from bleachbit import Winapp as WinappModule
 from bleachbit.Winapp import Winapp, detectos, detect_file, section2option
 from bleachbit.Windows import detect_registry_key, parse_windows_build
 from bleachbit import logger
@@ -413,6 +416,101 @@ class WinappTestCase(common.BleachbitTestCase):
             # cleanup
             shutil.rmtree(dirname, True)
 
+    def test_cache(self):
+        """Test building cleaners from the cached definition"""
+        # the parent of DetectFile= is probed, so keep it apart from the
+        # other files of the test
+        app_dir = os.path.join(self.mkdtemp(), 'app')
+        ini_fn = self.write_file('winapp2.ini', (
+            '[Some App *]\n'
+            'LangSecRef=3021\n'
+            'Detect=HKCU\\Software\\SomeApp\n'
+            'DetectFile=%(d)s\n'
+            'Warning=Careful & "quoted"\n'
+            'FileKey1=%(d)s|a&b"c.log\n'
+            'FileKey2=%(d)s|*.tmp|RECURSE\n'
+            'RegKey1=HKCU\\Software\\SomeApp|Name\n'
+            % {'d': app_dir}).encode())
+        registry = {}
+
+        def read(cache):
+            with mock.patch('bleachbit.Windows.detect_registry_key',
+                            side_effect=lambda key: registry.get(key, False)):
+                return WinappModule.read_winapp(
+                    ini_fn, WinappModule.file_digest(ini_fn), cache)
+
+        def actions(inicleaner):
+            return [(type(provider).__name__, getattr(provider, 'raw_path', None),
+                     getattr(provider, 'keyname', None))
+                    for cleaner in inicleaner.get_cleaners()
+                    for (__option_id, provider) in cleaner.actions]
+
+        cache = {}
+        # neither the registry key nor the file is found
+        inicleaner, parsed = read(cache)
+        self.assertTrue(parsed)
+        self.assertEqual([], actions(inicleaner))
+        self.assertFalse(read(cache)[1])
+
+        # the file appears
+        os.mkdir(app_dir)
+        inicleaner, parsed = read(cache)
+        self.assertTrue(parsed)
+        expected = [('Delete', os.path.join(app_dir, 'a&b"c.log'), None),
+                    ('Delete', app_dir, None),
+                    ('Winreg', None, 'HKCU\\Software\\SomeApp')]
+        self.assertEqual(expected, actions(inicleaner))
+        cleaner = next(inicleaner.get_cleaners())
+        self.assertEqual('Careful & "quoted"', cleaner.get_warning('some_app'))
+        self.assertEqual('Some App ', dict(cleaner.get_options())['some_app'])
+
+        # the cached definition builds the same cleaners, also after
+        # saving and loading the cache
+        with mock.patch('bleachbit.winapp2_cache_file',
+                        os.path.join(self.tempdir, 'winapp2_cache.json')):
+            WinappModule.save_cache(cache)
+            cache = WinappModule.load_cache()
+        with mock.patch('bleachbit.RawConfigParser') as mock_parser:
+            inicleaner, parsed = read(cache)
+        self.assertFalse(parsed)
+        mock_parser.assert_not_called()
+        self.assertEqual(expected, actions(inicleaner))
+        self.assertEqual('Careful & "quoted"',
+                         next(inicleaner.get_cleaners()).get_warning('some_app'))
+
+        # the registry key appears, which was checked before the file
+        registry['HKCU\\Software\\SomeApp'] = True
+        self.assertTrue(read(cache)[1])
+        self.assertFalse(read(cache)[1])
+
+        # the file changes
+        with open(ini_fn, 'a') as f:
+            f.write('FileKey3=%s|*.bak\n' % app_dir)
+        inicleaner, parsed = read(cache)
+        self.assertTrue(parsed)
+        self.assertEqual(4, len(actions(inicleaner)))
+
+    def test_cache_environment(self):
+        """The cached definition expands variables for the current user"""
+        var = '%BLEACHBIT_TEST_WINAPP%' if 'nt' == os.name else '${BLEACHBIT_TEST_WINAPP}'
+        ini_fn = self.write_file('winapp2_environment.ini', (
+            '[Some App]\n'
+            'LangSecRef=3021\n'
+            'FileKey1=%(v)s|*.log\n'
+            'ExcludeKey1=FILE|%(v)s|keep.log\n' % {'v': var}).encode())
+        cache = {}
+        for (user, parsed) in (('a', True), ('b', False)):
+            user_dir = os.path.join(self.tempdir, user)
+            with mock.patch.dict(os.environ, {'BLEACHBIT_TEST_WINAPP': user_dir}):
+                inicleaner, was_parsed = WinappModule.read_winapp(
+                    ini_fn, WinappModule.file_digest(ini_fn), cache)
+            self.assertEqual(parsed, was_parsed)
+            providers = [provider for cleaner in inicleaner.get_cleaners()
+                         for (__option_id, provider) in cleaner.actions]
+            self.assertEqual([os.path.join(user_dir, '*.log')],
+                             [provider.raw_path for provider in providers])
+            self.assertIn(user_dir, providers[0].nwholeregex)
+
     def test_section2option(self):
         """Test for section2option()"""
         tests = (('  FOO2  ', 'foo2'),
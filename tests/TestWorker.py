@@ -316,6 +316,183 @@ class WorkerTestCase(common.BleachbitTestCase):
         # clean up
         bleachbit.DeepScan.DeepScan = SaveDeepScan
 
+    def test_shred_batch(self):
+        """Shred a directory tree with group sync"""
+        from bleachbit.Options import options
+        dirname = self.mkdtemp(prefix='bleachbit-test-worker-shred')
+        subdir = os.path.join(dirname, 'sub')
+        os.mkdir(subdir)
+        filenames = [os.path.join(d, 'file%d' % i)
+                     for d in (dirname, subdir) for i in range(3)]
+        for filename in filenames:
+            self.write_file(filename, b'secret' * 1000)
+        astr = '<action command="delete" search="walk.all" path="%s"/>' % dirname
+        backends['test'] = TestCleaner.action_to_cleaner(astr)
+        old_shred = options.get('shred')
+        options.set('shred', True, commit=False)
+        try:
+            worker = Worker(CLI.CliCallback(), True, {'test': ['option1']})
+            run = worker.run()
+            while next(run):
+                pass
+        finally:
+            options.set('shred', old_shred, commit=False)
+            del backends['test']
+        self.assertIsNone(FileUtilities.shred_batch)
+        for filename in filenames:
+            self.assertNotExists(filename)
+        self.assertNotExists(subdir)
+        self.assertEqual(os.listdir(dirname), [])
+        self.assertEqual(worker.total_errors, 0)
+        self.assertEqual(worker.total_deleted, 7)
+
+    def test_shred_batch_overlap(self):
+        """A file waiting in the shred batch is not found again"""
+        from bleachbit.Options import options
+        dirname = self.mkdtemp(prefix='bleachbit-test-worker-shred')
+        filenames = [self.write_file(os.path.join(dirname, 'file%d' % i), b'secret')
+                     for i in range(3)]
+        astr = '<action command="delete" search="walk.files" path="%s"/>' % dirname
+        backends['test'] = TestCleaner.action_to_cleaner(astr)
+        backends['test2'] = TestCleaner.action_to_cleaner(astr)
+        old_shred = options.get('shred')
+        options.set('shred', True, commit=False)
+        try:
+            worker = Worker(CLI.CliCallback(), True,
+                            {'test': ['option1'], 'test2': ['option1']})
+            run = worker.run()
+            while next(run):
+                pass
+        finally:
+            options.set('shred', old_shred, commit=False)
+            del backends['test']
+            del backends['test2']
+        for filename in filenames:
+            self.assertNotExists(filename)
+        self.assertEqual(worker.total_errors, 0)
+        self.assertEqual(worker.total_deleted, 3)
+
+    def test_shred_batch_close(self):
+        """Closing a run removes the files already queued for shredding"""
+        import itertools
+        import mock
+        from bleachbit.Options import options
+        dirname = self.mkdtemp(prefix='bleachbit-test-worker-shred')
+        filenames = [self.write_file(os.path.join(dirname, 'file%d' % i), b'secret')
+                     for i in range(3)]
+        astr = '<action command="delete" search="walk.files" path="%s"/>' % dirname
+        backends['test'] = TestCleaner.action_to_cleaner(astr)
+        old_shred = options.get('shred')
+        options.set('shred', True, commit=False)
+        try:
+            worker = Worker(CLI.CliCallback(), True, {'test': ['option1']})
+            run = worker.run()
+            # yield after every command
+            with mock.patch('time.time', side_effect=itertools.count()):
+                while worker.total_deleted < 2:
+                    next(run)
+            self.assertIsNotNone(FileUtilities.shred_batch)
+            queued = [path for (path, _is_dir, _shred)
+                      in FileUtilities.shred_batch.paths]
+            self.assertEqual(2, len(queued))
+            for filename in queued:
+                self.assertExists(filename)
+            run.close()
+        finally:
+            options.set('shred', old_shred, commit=False)
+            del backends['test']
+        self.assertIsNone(FileUtilities.shred_batch)
+        self.assertIsNone(FileUtilities.scan_cache)
+        for filename in queued:
+            self.assertNotExists(filename)
+        self.assertEqual(1, len([fn for fn in filenames if os.path.exists(fn)]))
+
+    def test_plan_walks(self):
+        """Walk searches and deep scans share one walk of their tree"""
+        import mock
+        from bleachbit import DeepScan
+        from bleachbit.Options import options
+        dirname = os.path.realpath(self.mkdtemp(prefix='bleachbit-test-worker-plan'))
+        subdir = os.path.join(dirname, 'sub')
+        os.mkdir(subdir)
+        in_sub = [self.write_file(os.path.join(subdir, fn)) for fn in ('a', 'b.bak')]
+        bak = self.write_file(os.path.join(dirname, 'c.bak'))
+        keep = self.write_file(os.path.join(dirname, 'keep'))
+        astrs = ['<action command="delete" search="walk.files" path="%s"/>' % subdir,
+                 '<action command="delete" search="deep" path="%s" regex="\\.bak$"/>' % dirname]
+        backends['test'] = TestCleaner.actions_to_cleaner(astrs)
+        old_shred = options.get('shred')
+        options.set('shred', False, commit=False)
+        try:
+            for really_delete in (False, True):
+                worker = Worker(CLI.CliCallback(), really_delete,
+                                {'test': ['option1', 'option2']})
+                with mock.patch('bleachbit.DeepScan.normalized_walk') as mock_walk:
+                    run = worker.run()
+                    while next(run):
+                        pass
+                mock_walk.assert_not_called()
+                self.assertIsNone(DeepScan.planned)
+        finally:
+            options.set('shred', old_shred, commit=False)
+            del backends['test']
+        for filename in in_sub + [bak]:
+            self.assertNotExists(filename)
+        self.assertExists(keep)
+        self.assertEqual(worker.total_errors, 0)
+        # sub/b.bak is deleted by the walk, so the deep scan skips it
+        self.assertEqual(worker.total_deleted, 3)
+
+    def test_plan_walks_shred(self):
+        """A planned deep scan skips files waiting to be shredded"""
+        from bleachbit.Options import options
+        dirname = os.path.realpath(self.mkdtemp(prefix='bleachbit-test-worker-plan'))
+        filename = self.write_file(os.path.join(dirname, 'a.bak'))
+        astrs = ['<action command="delete" search="walk.files" path="%s"/>' % dirname,
+                 '<action command="delete" search="deep" path="%s" regex="\\.bak$"/>' % dirname]
+        backends['test'] = TestCleaner.actions_to_cleaner(astrs)
+        old_shred = options.get('shred')
+        options.set('shred', True, commit=False)
+        try:
+            worker = Worker(CLI.CliCallback(), True,
+                            {'test': ['option1', 'option2']})
+            run = worker.run()
+            while next(run):
+                pass
+        finally:
+            options.set('shred', old_shred, commit=False)
+            del backends['test']
+        self.assertNotExists(filename)
+        self.assertEqual(worker.total_errors, 0)
+        self.assertEqual(worker.total_deleted, 1)
+
+    def test_plan_walks_error(self):
+        """A cleaner which cannot be planned does not stop the others"""
+        import mock
+        from bleachbit.Options import options
+        dirname = self.mkdtemp(prefix='bleachbit-test-worker-plan')
+        filename = self.write_file(os.path.join(dirname, 'a'))
+        astr = '<action command="delete" search="walk.files" path="%s"/>' % dirname
+        backends['test'] = TestCleaner.action_to_cleaner(astr)
+        backends['test2'] = TestCleaner.action_to_cleaner(astr)
+        old_shred = options.get('shred')
+        options.set('shred', False, commit=False)
+        try:
+            worker = Worker(CLI.CliCallback(), True,
+                            {'test': ['option1'], 'test2': ['option1']})
+            with mock.patch.object(backends['test'], 'get_walks',
+                                   side_effect=RuntimeError('broken')):
+                run = worker.run()
+                while next(run):
+                    pass
+        finally:
+            options.set('shred', old_shred, commit=False)
+            del backends['test']
+            del backends['test2']
+        self.assertNotExists(filename)
+        self.assertEqual(worker.total_errors, 0)
+        self.assertEqual(worker.total_deleted, 1)
+
     def test_multiple_options(self):
         """Test one cleaner with two options"""
         ui = CLI.CliCallback()